@@ -1,4 +1,7 @@
 
+import asyncio
+import threading
+
 from flask import Flask
 from flask_cors import CORS
 from config import config
@@ -7,8 +10,41 @@ from flask_caching import Cache
 # Create cache instance at module level
 cache = Cache(config={'CACHE_TYPE': 'SimpleCache'})
 
+_views_loop = None
+_views_loop_lock = threading.Lock()
+
+
+class App(Flask):
+    """Flask whose async views share one event loop thread
+
+    Flask's default hands every call to asgiref, which under a WSGI server
+    starts a new thread and event loop per request. Here every request
+    thread hands its view to a single loop running in a background thread
+    and waits for the result; the task starts with a copy of the request
+    thread's context, so the request and its pinned knowledge base carry
+    over. The ASGI adapter awaits async views on the server's loop and
+    never comes through here.
+    """
+
+    def async_to_sync(self, func):
+        def run(*args, **kwargs):
+            return asyncio.run_coroutine_threadsafe(func(*args, **kwargs), views_loop()).result()
+        return run
+
+
+def views_loop():
+    """The event loop async views run on under a WSGI server, started on first use"""
+    global _views_loop
+    with _views_loop_lock:
+        if _views_loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name='async-views', daemon=True).start()
+            _views_loop = loop
+    return _views_loop
+
+
 def create_app(config_name='default'):
-    app = Flask(__name__)
+    app = App(__name__)
     app.config.from_object(config[config_name])
     
     # Initialize cache with app
@@ -0,0 +1,174 @@
+import asyncio
+import inspect
+import io
+import os
+import sys
+
+from asgiref.sync import ThreadSensitiveContext
+from asgiref.wsgi import WsgiToAsgi
+from flask import request
+from werkzeug.exceptions import HTTPException
+
+from app import create_app
+
+
+class ClientDisconnected(OSError):
+    """Raised into the WSGI response loop once the client has gone away"""
+
+
+class ASGIApp(WsgiToAsgi):
+    """The Flask app for ASGI servers such as uvicorn
+
+    Async views (the conversation, quick assessment and symptom search
+    endpoints) are awaited on the server's event loop inside Flask's usual
+    request handling, so a request waiting on the model holds no thread and
+    one process can keep thousands of conversations waiting. Every other
+    request goes through asgiref's WSGI adapter as under gunicorn, at most
+    wsgi_threads at a time, each on its own thread. Once a WSGI request's
+    body is read the client connection is watched, and a streamed response
+    stops at its next chunk after a disconnect instead of running to the
+    end. Lifespan shutdown stops the app's background services before the
+    server exits.
+    """
+
+    def __init__(self, wsgi_application, wsgi_threads=64):
+        super().__init__(wsgi_application)
+        self._wsgi_slots = asyncio.Semaphore(wsgi_threads)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self._lifespan(receive, send)
+        if scope["type"] != "http":
+            return await super().__call__(scope, receive, send)
+        if self._routes_to_async_view(scope):
+            return await self._call_async_view(scope, receive, send)
+
+        disconnected = asyncio.Event()
+        watcher = None
+
+        async def watch():
+            while (await receive())["type"] != "http.disconnect":
+                pass
+            disconnected.set()
+
+        async def read_body():
+            nonlocal watcher
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                disconnected.set()
+            elif not message.get("more_body"):
+                watcher = asyncio.create_task(watch())
+            return message
+
+        async def send_unless_disconnected(message):
+            if disconnected.is_set():
+                raise ClientDisconnected()
+            await send(message)
+
+        try:
+            # A thread-sensitive context per request gives each its own
+            # thread; asgiref's default runs them all on one
+            async with self._wsgi_slots, ThreadSensitiveContext():
+                await super().__call__(scope, read_body, send_unless_disconnected)
+        except ClientDisconnected:
+            pass
+        finally:
+            if watcher is not None:
+                watcher.cancel()
+
+    def _routes_to_async_view(self, scope):
+        # Flask answers CORS preflight requests without calling the view
+        if scope["method"] == "OPTIONS":
+            return False
+        adapter = self.wsgi_application.url_map.bind("localhost", script_name=scope.get("root_path") or None)
+        try:
+            endpoint, _ = adapter.match(scope["path"], method=scope["method"])
+        except HTTPException:
+            return False
+        return inspect.iscoroutinefunction(self.wsgi_application.view_functions.get(endpoint))
+
+    async def _call_async_view(self, scope, receive, send):
+        """Flask's request handling with the view awaited on this loop rather than on a thread"""
+        body = []
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            body.append(message.get("body", b""))
+            if not message.get("more_body"):
+                break
+
+        app = self.wsgi_application
+        with app.request_context(wsgi_environ(scope, b"".join(body))):
+            try:
+                try:
+                    rv = app.preprocess_request()
+                    if rv is None:
+                        rv = await app.view_functions[request.endpoint](**request.view_args)
+                except Exception as e:
+                    rv = app.handle_user_exception(e)
+                response = app.finalize_request(rv)
+            except Exception as e:
+                response = app.handle_exception(e)
+
+        await send({
+            "type": "http.response.start",
+            "status": response.status_code,
+            "headers": [(name.lower().encode("latin1"), value.encode("latin1")) for name, value in response.headers.items()]
+        })
+        await send({"type": "http.response.body", "body": b"" if scope["method"] == "HEAD" else response.get_data()})
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                from app import routes
+                await asyncio.to_thread(routes.shutdown)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+
+def wsgi_environ(scope, body):
+    """The WSGI environ for an ASGI HTTP scope and its complete request body"""
+    server = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf8").decode("latin1"),
+        "PATH_INFO": scope["path"].encode("utf8").decode("latin1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("ascii"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1] if server[1] is not None else 80),
+        "SERVER_PROTOCOL": "HTTP/%s" % scope.get("http_version", "1.1"),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        # The whole body is here, so it can be read without a Content-Length
+        "wsgi.input_terminated": True,
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    if scope.get("client"):
+        environ["REMOTE_ADDR"] = scope["client"][0]
+    for name, value in scope.get("headers", []):
+        name = name.decode("latin1")
+        if name == "content-length":
+            key = "CONTENT_LENGTH"
+        elif name == "content-type":
+            key = "CONTENT_TYPE"
+        else:
+            key = "HTTP_" + name.upper().replace("-", "_")
+        value = value.decode("latin1")
+        environ[key] = environ[key] + "," + value if key in environ else value
+    return environ
+
+
+def create_asgi_app(config_name='default'):
+    """Create the Flask app wrapped for the ASGI serving mode"""
+    return ASGIApp(
+        create_app(config_name),
+        wsgi_threads=int(os.environ.get('ASGI_WSGI_THREADS', 64))
+    )
@@ -1,31 +1,171 @@
-from flask import Blueprint, request, jsonify, current_app, make_response
+from flask import Blueprint, request, jsonify, current_app, make_response, Response, stream_with_context
+import asyncio
+import atexit
+import contextvars
+import os
 import uuid
+import time
 import datetime
 import hashlib
 import json
+from concurrent.futures import ThreadPoolExecutor
 from app import cache  # Import cache from app module
 from app.services.assessment import AssessmentService
 from app.services.ai import AIService
+from app.services.local_report import LocalReportEngine
+from app.services.cache import create_assessment_cache
+from app.services.session_store import create_session_store
+from app.services.batch import create_batch_assessor
+from app.services.intake import IntakeMachine, PROMPTS
+from app.services.prefetch import create_report_prefetcher
+from app.services.history import create_conversation_log
+from app.services.assessment_store import create_saved_assessment_store
+from app.services.specialists import create_specialist_matcher, DEFAULT_PATH as SPECIALISTS_PATH
+from app.services.singleflight import create_single_flight
+from app.services.prompt_builder import create_prompt_builder
+from app.services.reloader import create_knowledge_base_reloader
+from app.services.metrics import registry, DEFAULT_BUCKETS, CONTENT_TYPE as METRICS_CONTENT_TYPE
 
 main = Blueprint('main', __name__)
 
-# Initialize services
-assessment_service = AssessmentService()
-ai_service = AIService()
+# Initialize services; the knowledge base is rebuilt and swapped in when app/data changes
+assessment_service = create_knowledge_base_reloader(AssessmentService, AssessmentService.data_paths())
+ai_service = AIService(
+    local_reports=LocalReportEngine(assessment_service),
+    prompt_builder=create_prompt_builder(assessment_service)
+)
+# Report keys carry the knowledge base fingerprint, so a reload needs no clearing
+assessment_cache = create_assessment_cache()
 
-# Store active sessions (in production, use Redis or a database)
-sessions = {}
+# Session, cache and knowledge-base calls made from async views run here, off the event loop
+blocking_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get('BLOCKING_THREADS', 32)), thread_name_prefix='blocking'
+)
+intake = IntakeMachine(executor=blocking_executor)
+
+# Symptom -> specialty rules from app/data/specialists.json, recompiled when the file changes
+specialist_matcher = create_knowledge_base_reloader(create_specialist_matcher, [SPECIALISTS_PATH])
+
+# Reports started before the user reaches the results step (None when disabled)
+prefetcher = create_report_prefetcher()
+
+# Concurrent requests for the same report share one model call (None when disabled)
+coalescer = create_single_flight()
+
+# Answer assumed for previous_treatment when prefetching one question early
+SPECULATIVE_TREATMENT = "No treatment tried"
+
+# Active sessions; backend chosen by SESSION_STORE_BACKEND (memory, sqlite, redis)
+sessions = create_session_store()
+
+# Compact per-session transcripts; older turns spill to CONVERSATION_SPILL_DIR
+conversation_log = create_conversation_log(PROMPTS)
+
+# Saved assessments, written behind the request in batched SQLite commits
+saved_assessments = create_saved_assessment_store()
+
+# Report fields that differ between saves of the same report
+PER_SAVE_REPORT_FIELDS = ("report_id", "report_date", "generated_at")
+
+# Reports are shared between patients, so the model and local reports are
+# given this in place of the name; _personalize_report adds the real one
+REPORT_SUBJECT = "the patient"
+
+# Seconds a ?sync=1 save waits for its commit
+SAVE_SYNC_TIMEOUT = 10.0
+
+def shutdown():
+    """Stop the background services and commit queued saves; run on ASGI lifespan shutdown and at exit"""
+    assessment_service.close()
+    specialist_matcher.close()
+    saved_assessments.close()
+    blocking_executor.shutdown(wait=False)
+
+atexit.register(shutdown)
 
 # Performance monitoring
+REQUEST_SECONDS = registry.histogram(
+    "http_request_duration_seconds", "Request handling time by endpoint", ("endpoint", "method")
+)
+REQUESTS = registry.counter("http_requests_total", "Requests by endpoint and status", ("endpoint", "method", "status"))
+INTAKE_STEP_SECONDS = registry.histogram(
+    "intake_step_duration_seconds", "Time to process one conversation turn by the state it answered", ("state",),
+    buckets=(0.0001, 0.00025, 0.0005) + DEFAULT_BUCKETS
+)
+
+registry.gauge("assessment_cache_hits_total", "Report cache hits", lambda: assessment_cache.hits, kind="counter")
+registry.gauge("assessment_cache_misses_total", "Report cache misses", lambda: assessment_cache.misses, kind="counter")
+registry.gauge("assessment_cache_hit_ratio", "Report cache hit ratio since start", lambda: assessment_cache.stats()["hit_ratio"])
+registry.gauge("assessment_cache_entries", "Reports held in the cache", lambda: assessment_cache.stats()["size"])
+registry.gauge("sessions_active", "Sessions held by the session store", lambda: sessions.size())
+registry.gauge(
+    "report_prefetch_jobs_total", "Report prefetch jobs by outcome",
+    lambda: {(k,): v for k, v in prefetcher.stats().items() if k != "pending"} if prefetcher is not None else None,
+    ("outcome",), kind="counter"
+)
+registry.gauge(
+    "report_prefetch_pending", "Prefetched reports still generating",
+    lambda: prefetcher.stats()["pending"] if prefetcher is not None else None
+)
+registry.gauge(
+    "gemini_breaker_state", "Circuit breaker state (1 for the current state)",
+    lambda: {(state,): int(ai_service.guard.breaker.state == state) for state in ("closed", "open", "half_open")},
+    ("state",)
+)
+registry.gauge(
+    "assessment_coalesced_requests_total", "Report requests by single-flight outcome",
+    lambda: {(k,): v for k, v in coalescer.stats().items() if k != "in_flight"} if coalescer is not None else None,
+    ("outcome",), kind="counter"
+)
+registry.gauge(
+    "saved_assessments_total", "Saved assessments by write outcome",
+    lambda: {(k,): v for k, v in saved_assessments.stats().items() if k in ("saved", "deduplicated", "rejected", "retries", "failed")},
+    ("outcome",), kind="counter"
+)
+registry.gauge("saved_assessments_pending", "Saved assessments waiting for the next commit", lambda: saved_assessments.stats()["pending"])
+registry.gauge(
+    "saved_assessments_unrecovered", "Saved assessments whose commit failed, kept in the recovery file",
+    lambda: saved_assessments.stats()["unrecovered"]
+)
+registry.gauge("knowledge_base_version", "Knowledge base version being served, 1 until the first reload", lambda: assessment_service.version)
+registry.gauge(
+    "knowledge_base_reloads_total", "Knowledge base reloads by outcome",
+    lambda: {("ok",): assessment_service.reloads, ("failed",): assessment_service.failures},
+    ("outcome",), kind="counter"
+)
+registry.gauge("gemini_breaker_opened_total", "Times the circuit breaker opened", lambda: ai_service.guard.breaker.opened, kind="counter")
+registry.gauge(
+    "gemini_rejected_total", "Model calls shed, by the guard component that refused them",
+    lambda: {("breaker",): ai_service.guard.breaker.rejected, ("concurrency",): ai_service.guard.limiter.rejected},
+    ("by",), kind="counter"
+)
+registry.gauge("gemini_concurrency_limit", "Adaptive limit on concurrent model calls", lambda: ai_service.guard.limiter.limit)
+registry.gauge("gemini_in_flight", "Model calls in progress", lambda: ai_service.guard.limiter.stats()["in_flight"])
+registry.gauge("gemini_retries_total", "Model call retries", lambda: ai_service.guard.budget.retries, kind="counter")
+registry.gauge("prompt_lines_dropped_total", "Prompt lines dropped to fit the token budget", lambda: ai_service.prompt_builder.dropped_lines, kind="counter")
+
 @main.before_request
 def before_request():
-    request.start_time = datetime.datetime.now()
+    request.start_time = time.perf_counter()
+    # The whole request sees one knowledge-base version, even across a reload
+    request.knowledge_base_token = assessment_service.pin()
+
+@main.teardown_request
+def teardown_request(exception=None):
+    # Streamed responses tear the request down a second time
+    token = getattr(request, 'knowledge_base_token', None)
+    if token is not None:
+        request.knowledge_base_token = None
+        assessment_service.unpin(token)
 
 @main.after_request
 def after_request(response):
     if hasattr(request, 'start_time'):
-        elapsed = datetime.datetime.now() - request.start_time
-        current_app.logger.info(f"Request to {request.path} took {elapsed.total_seconds():.2f}s")
+        elapsed = time.perf_counter() - request.start_time
+        endpoint = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        REQUEST_SECONDS.observe(elapsed, endpoint=endpoint, method=request.method)
+        REQUESTS.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+        current_app.logger.info(f"Request to {request.path} took {elapsed:.2f}s")
     
     # Add cache headers for appropriate endpoints
     if request.path.startswith('/api/symptoms/search'):
@@ -41,26 +181,44 @@ def index():
         "version": "1.0.0",
         "endpoints": {
             "health_check": "/api/health",
+            "metrics": "/metrics",
             "start_assessment": "/api/assessment/start",
             "process_input": "/api/assessment/next",
             "search_symptoms": "/api/symptoms/search",
             "quick_assessment": "/api/assessment/quick",
-            "start_new": "/api/assessment/start_new"
+            "stream_assessment": "/api/assessment/stream",
+            "batch_assessment": "/api/assessment/batch",
+            "start_new": "/api/assessment/start_new",
+            "saved_assessment": "/api/assessments/<assessment_id>"
         }
     })
 
+@main.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus metrics in the text exposition format"""
+    return Response(registry.render(), content_type=METRICS_CONTENT_TYPE)
+
 @main.route('/api/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
-    return jsonify({"status": "healthy"})
+    return jsonify({
+        "status": "healthy",
+        "assessment_cache": assessment_cache.stats(),
+        "prefetch": prefetcher.stats() if prefetcher is not None else None,
+        "coalescing": coalescer.stats() if coalescer is not None else None,
+        "saved_assessments": saved_assessments.stats(),
+        "knowledge_base": {
+            **assessment_service.stats(),
+            "snapshot": assessment_service.knowledge_base.stats() if assessment_service.knowledge_base is not None else None,
+            "specialists": specialist_matcher.stats()
+        },
+        "model": {"mode": ai_service.mode, "available": ai_service.use_model(), **ai_service.guard.stats()},
+        "prompt": ai_service.prompt_builder.stats()
+    })
 
-@main.route('/api/assessment/start', methods=['POST'])
-def start_assessment():
-    """Start a new symptom assessment"""
-    session_id = str(uuid.uuid4())
-    
-    # Initialize session with more detailed structure
-    sessions[session_id] = {
+def new_session():
+    """Build the initial record for a new assessment session"""
+    return {
         "current_state": "introduction",
         "previous_state": None,
         "state_history": [],
@@ -75,545 +233,288 @@ def start_assessment():
         "symptoms": [],
         "symptom_details": {},
         "progress": 0,
-        "conversation_history": [],
+        "conversation_history": conversation_log.new(),
         "current_flow": "main",  # Track which conversation flow we're in
         "flow_position": 0,      # Position within the current flow
         "pending_questions": [],  # Queue of follow-up questions
         "symptom_specific_flow": None  # Track symptom-specific flow
     }
+
+@main.route('/api/assessment/start', methods=['POST'])
+def start_assessment():
+    """Start a new symptom assessment"""
+    session_id = str(uuid.uuid4())
+    
+    # Initialize session with more detailed structure
+    sessions.save(session_id, new_session())
     
     return jsonify({
         "session_id": session_id,
-        "message": "Hi, I'm your health assistant. I'll ask you several detailed questions about your symptoms to provide a comprehensive assessment. This is not a substitute for professional medical advice, but I can help guide you. Shall we begin?",
-        "options": ["Yes, let's start", "What information will you collect?"],
-        "progress": 0
+        **PROMPTS["introduction"].render()
     })
 
 @main.route('/api/assessment/start_new', methods=['POST'])
 def start_new_assessment():
-    """Start a new assessment while preserving the previous session ID"""
-    data = request.json
+    """Start a new assessment and discard the previous session"""
+    data = request.json or {}
     old_session_id = data.get('session_id')
     
     # Generate a new session ID
     new_session_id = str(uuid.uuid4())
     
     # Initialize a new session
-    sessions[new_session_id] = {
-        "current_state": "introduction",
-        "previous_state": None,
-        "state_history": [],
-        "gathered_info": {
-            "assessment_date": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "medical_history": {},
-            "current_medications": [],
-            "allergies": [],
-            "family_history": {},
-            "lifestyle_factors": {}
-        },
-        "symptoms": [],
-        "symptom_details": {},
-        "progress": 0,
-        "conversation_history": [],
-        "current_flow": "main",
-        "flow_position": 0,
-        "pending_questions": [],
-        "symptom_specific_flow": None
-    }
+    sessions.save(new_session_id, new_session())
     
-    # If there was a previous session, we can optionally archive it or transfer some data
-    if old_session_id and old_session_id in sessions:
-        # Optionally preserve some data from the old session if needed
-        # For example: sessions[new_session_id]["user_preferences"] = sessions[old_session_id].get("user_preferences", {})
-        
-        # For privacy reasons, we might want to eventually clean up old sessions
-        # This could be done asynchronously in a production environment
-        # sessions.pop(old_session_id, None)
-        pass
+    # For privacy reasons, the previous conversation is not kept around
+    if old_session_id:
+        sessions.delete(old_session_id)
+        conversation_log.discard(old_session_id)
     
     return jsonify({
         "session_id": new_session_id,
-        "message": "Starting a new health assessment. I'll ask you several detailed questions about your symptoms to provide a comprehensive assessment. This is not a substitute for professional medical advice, but I can help guide you. Shall we begin?",
-        "options": ["Yes, let's start", "What information will you collect?"],
-        "progress": 0
+        **PROMPTS["start_new"].render()
     })
 
 @main.route('/api/assessment/next', methods=['POST'])
-def process_input():
-    """Process user input and return next step with enhanced flow management"""
+async def process_input():
+    """Process user input and return next step with enhanced flow management
+    
+    Session I/O and the turn itself run on the blocking executor in one hop;
+    only the results step comes back to await the model.
+    """
     data = request.json
     session_id = data.get('session_id')
     user_input = data.get('input')
     
-    if not session_id or session_id not in sessions:
+    turn = await run_blocking(take_turn, session_id, user_input)
+    if turn is None:
         return jsonify({"error": "Invalid session"}), 400
     
-    session = sessions[session_id]
-    current_state = session["current_state"]
+    session, state, response, started = turn
+    if response is None:
+        response = await intake.advance_async(session, user_input)
+        response = await run_blocking(finish_turn, session_id, session, state, response, started)
+    return jsonify(response)
+
+async def run_blocking(fn, *args):
+    """Await fn(*args) on the blocking executor, keeping the request's context (pinned knowledge base)"""
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(blocking_executor, context.run, fn, *args)
+
+def take_turn(session_id, user_input):
+    """Run one turn unless its state awaits the model
     
-    # Store conversation history
-    session["conversation_history"].append({
-        "role": "user",
-        "content": user_input,
-        "timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    })
+    Returns (session, state, response, started) with response None when the
+    state has an async handler, or None for an unknown session.
+    """
+    session = begin_turn(session_id, user_input)
+    if session is None:
+        return None
     
-    # Save previous state for potential backtracking
-    session["previous_state"] = current_state
-    session["state_history"].append(current_state)
+    started = time.perf_counter()
+    state = session["current_state"]
     
     # Check if we're in a symptom-specific flow
-    if session["symptom_specific_flow"] and session["current_flow"] == "symptom_specific":
-        return handle_symptom_specific_flow(session, user_input)
-    
-    # Process based on current state in main flow
-    if current_state == "introduction":
-        if user_input == "What information will you collect?":
-            response = {
-                "message": "I'll ask about your personal details (name, age, sex), medical history, current symptoms, their severity and duration, and lifestyle factors. This helps me provide a more accurate assessment. All information is kept confidential. Would you like to proceed?",
-                "options": ["Yes, let's start", "No, maybe later"],
-                "progress": 0
-            }
-        else:
-            session["current_state"] = "name"
-            response = {
-                "message": "Great! First, what's your name? This helps me personalize our conversation.",
-                "input_type": "text",
-                "progress": 5
-            }
-    
-    elif current_state == "name":
-        session["gathered_info"]["name"] = user_input
-        session["current_state"] = "age"
-        response = {
-            "message": f"Nice to meet you, {user_input}. How old are you? Your age helps me understand which conditions might be more relevant to you.",
-            "input_type": "number",
-            "progress": 8
-        }
-    
-    elif current_state == "age":
-        try:
-            age = int(user_input)
-            if age < 0 or age > 120:
-                return jsonify({
-                    "message": "Please enter a valid age between 0 and 120.",
-                    "input_type": "number",
-                    "progress": 8
-                })
-        except ValueError:
-            return jsonify({
-                "message": "Please enter a valid number for your age.",
-                "input_type": "number",
-                "progress": 8
-            })
-        
-        session["gathered_info"]["age"] = age
-        session["current_state"] = "biological_sex"
-        
-        response = {
-            "message": "What is your biological sex? This is important as certain medical conditions affect biological sexes differently.",
-            "options": ["Female", "Male", "Intersex"],
-            "info_button": {
-                "title": "Why is this important?",
-                "content": "Biological sex affects how symptoms present and which conditions are more likely. For example, heart attack symptoms often differ between males and females."
-            },
-            "progress": 12
-        }
-    
-    elif current_state == "biological_sex":
-        session["gathered_info"]["biological_sex"] = user_input
-        
-        # Branching logic based on biological sex and age
-        if user_input.lower() == "female" and 12 <= session["gathered_info"].get("age", 0) <= 55:
-            session["current_state"] = "pregnancy"
-            response = {
-                "message": "Are you currently pregnant or is there a possibility you might be pregnant?",
-                "options": ["Yes", "No", "Possibly", "I'm not sure"],
-                "progress": 16
-            }
-        else:
-            session["current_state"] = "height_weight"
-            response = {
-                "message": "What is your height and weight? This helps assess your body mass index (BMI), which can be relevant for certain conditions.",
-                "input_type": "text",
-                "placeholder": "e.g., 5'10\", 160 lbs or 178 cm, 73 kg",
-                "progress": 16
-            }
-    
-    elif current_state == "pregnancy":
-        session["gathered_info"]["pregnancy_status"] = user_input
-        session["current_state"] = "height_weight"
-        response = {
-            "message": "What is your height and weight? This helps assess your body mass index (BMI), which can be relevant for certain conditions.",
-            "input_type": "text",
-            "placeholder": "e.g., 5'10\", 160 lbs or 178 cm, 73 kg",
-            "progress": 20
-        }
-    
-    elif current_state == "height_weight":
-        session["gathered_info"]["height_weight"] = user_input
-        session["current_state"] = "medical_history_intro"
-        response = {
-            "message": "Now I'll ask about your medical history. This information helps provide context for your current symptoms. Do you have any diagnosed medical conditions?",
-            "options": ["Yes", "No"],
-            "progress": 24
-        }
-    
-    elif current_state == "medical_history_intro":
-        if user_input.lower() == "yes":
-            session["current_state"] = "medical_history_conditions"
-            response = {
-                "message": "Please select any conditions you've been diagnosed with:",
-                "options": [
-                    "Diabetes", "High blood pressure", "Heart disease", "Asthma", 
-                    "COPD", "Cancer", "Thyroid disorder", "Autoimmune disease",
-                    "Kidney disease", "Liver disease", "Mental health condition",
-                    "Neurological disorder", "Other condition"
-                ],
-                "multiple_select": True,
-                "progress": 28
-            }
-        else:
-            session["current_state"] = "medications"
-            response = {
-                "message": "Are you currently taking any medications, including prescription, over-the-counter, supplements, or herbal remedies?",
-                "options": ["Yes", "No"],
-                "progress": 32
-            }
-    
-    elif current_state == "medical_history_conditions":
-        session["gathered_info"]["medical_history"]["conditions"] = user_input
-        
-        # If "Other condition" is selected, ask for details
-        if "Other condition" in user_input:
-            session["current_state"] = "medical_history_other"
-            response = {
-                "message": "You mentioned having another condition. Could you please specify what it is?",
-                "input_type": "text",
-                "progress": 32
-            }
-        else:
-            session["current_state"] = "medications"
-            response = {
-                "message": "Are you currently taking any medications, including prescription, over-the-counter, supplements, or herbal remedies?",
-                "options": ["Yes", "No"],
-                "progress": 32
-            }
-    
-    elif current_state == "medical_history_other":
-        session["gathered_info"]["medical_history"]["other_condition"] = user_input
-        session["current_state"] = "medications"
-        response = {
-            "message": "Are you currently taking any medications, including prescription, over-the-counter, supplements, or herbal remedies?",
-            "options": ["Yes", "No"],
-            "progress": 32
-        }
-    
-    elif current_state == "medications":
-        if user_input.lower() == "yes":
-            session["current_state"] = "medications_list"
-            response = {
-                "message": "Please list the medications you're taking. Include the name, dosage if known, and how often you take them.",
-                "input_type": "text",
-                "placeholder": "e.g., Lisinopril 10mg daily, Vitamin D 1000IU daily",
-                "progress": 36
-            }
-        else:
-            session["gathered_info"]["medications"] = "None"
-            session["current_state"] = "allergies"
-            response = {
-                "message": "Do you have any allergies to medications, foods, or environmental factors?",
-                "options": ["Yes", "No"],
-                "progress": 40
-            }
-    
-    elif current_state == "medications_list":
-        session["gathered_info"]["medications"] = user_input
-        session["current_state"] = "allergies"
-        response = {
-            "message": "Do you have any allergies to medications, foods, or environmental factors?",
-            "options": ["Yes", "No"],
-            "progress": 40
-        }
-    
-    elif current_state == "allergies":
-        if user_input.lower() == "yes":
-            session["current_state"] = "allergies_list"
-            response = {
-                "message": "Please list your allergies and any reactions you experience:",
-                "input_type": "text",
-                "placeholder": "e.g., Penicillin (rash), Peanuts (anaphylaxis)",
-                "progress": 44
-            }
-        else:
-            session["gathered_info"]["allergies"] = "None"
-            session["current_state"] = "family_history"
-            response = {
-                "message": "Do any medical conditions run in your family? Family history can be relevant for many health issues.",
-                "options": ["Yes", "No", "I don't know"],
-                "progress": 48
-            }
-    
-    elif current_state == "allergies_list":
-        session["gathered_info"]["allergies"] = user_input
-        session["current_state"] = "family_history"
-        response = {
-            "message": "Do any medical conditions run in your family? Family history can be relevant for many health issues.",
-            "options": ["Yes", "No", "I don't know"],
-            "progress": 48
-        }
-    
-    elif current_state == "family_history":
-        if user_input.lower() == "yes":
-            session["current_state"] = "family_history_details"
-            response = {
-                "message": "Please select any conditions that run in your immediate family (parents, siblings, children):",
-                "options": [
-                    "Heart disease", "Diabetes", "Cancer", "High blood pressure", 
-                    "Stroke", "Mental health conditions", "Autoimmune disorders",
-                    "Other condition"
-                ],
-                "multiple_select": True,
-                "progress": 52
-            }
-        else:
-            session["gathered_info"]["family_history"] = user_input
-            session["current_state"] = "lifestyle_smoking"
-            response = {
-                "message": "Do you smoke tobacco or use e-cigarettes/vaping products?",
-                "options": ["Currently smoke", "Used to smoke", "Never smoked", "Use e-cigarettes/vape"],
-                "progress": 56
-            }
-    
-    elif current_state == "family_history_details":
-        session["gathered_info"]["family_history"] = user_input
-        session["current_state"] = "lifestyle_smoking"
-        response = {
-            "message": "Do you smoke tobacco or use e-cigarettes/vaping products?",
-            "options": ["Currently smoke", "Used to smoke", "Never smoked", "Use e-cigarettes/vape"],
-            "progress": 56
-        }
-    
-    elif current_state == "lifestyle_smoking":
-        session["gathered_info"]["lifestyle_factors"]["smoking"] = user_input
-        session["current_state"] = "lifestyle_alcohol"
-        response = {
-            "message": "How often do you consume alcoholic beverages?",
-            "options": ["Never", "Occasionally", "Weekly", "Several times per week", "Daily"],
-            "progress": 60
-        }
+    if in_symptom_specific_flow(session):
+        return session, state, symptom_specific_turn(session_id, session, user_input, started), started
+    if state in intake.async_handlers:
+        return session, state, None, started
+    
+    # Main flow: one table lookup per turn
+    response = intake.advance(session, user_input)
+    return session, state, finish_turn(session_id, session, state, response, started), started
+
+def begin_turn(session_id, user_input):
+    """Load the session and record the user's message; None for an unknown session"""
+    session = sessions.get(session_id)
+    if session is None:
+        return None
     
-    elif current_state == "lifestyle_alcohol":
-        session["gathered_info"]["lifestyle_factors"]["alcohol"] = user_input
-        session["current_state"] = "lifestyle_exercise"
-        response = {
-            "message": "How would you describe your physical activity level?",
-            "options": ["Sedentary (little to no exercise)", "Light (1-3 days/week)", "Moderate (3-5 days/week)", "Active (6-7 days/week)", "Very active (multiple times daily)"],
-            "progress": 64
-        }
+    # Store conversation history
+    conversation_log.append(session_id, session["conversation_history"], "user", user_input)
+    return session
+
+def in_symptom_specific_flow(session):
+    return bool(session["symptom_specific_flow"]) and session["current_flow"] == "symptom_specific"
+
+def symptom_specific_turn(session_id, session, user_input, started):
+    """Answer one symptom-specific question and save the session"""
+    intake.record(session, session["current_state"])
+    response = handle_symptom_specific_flow(session_id, session, user_input)
+    sessions.save(session_id, session)
+    INTAKE_STEP_SECONDS.observe(time.perf_counter() - started, state="symptom_specific")
+    return response
+
+def finish_turn(session_id, session, state, response, started):
+    """Record the bot response for a main-flow turn and save the session"""
+    # Store bot response in conversation history
+    conversation_log.append(session_id, session["conversation_history"], "assistant", response.get("message", ""))
     
-    elif current_state == "lifestyle_exercise":
-        session["gathered_info"]["lifestyle_factors"]["exercise"] = user_input
-        session["current_state"] = "lifestyle_diet"
-        response = {
-            "message": "How would you describe your diet?",
-            "options": ["Balanced diet", "Vegetarian", "Vegan", "Keto/low-carb", "High protein", "Restricted due to allergies/conditions", "Irregular eating patterns"],
-            "progress": 68
-        }
+    sessions.save(session_id, session)
+    INTAKE_STEP_SECONDS.observe(time.perf_counter() - started, state=state)
+    return response
+
+@intake.handler("symptom_entry")
+def handle_symptom_entry(session, user_input):
+    """Record the main symptom and ask the first question of its flow"""
+    # Add the symptom to the list
+    primary_symptom = user_input
+    session["symptoms"].append(primary_symptom)
     
-    elif current_state == "lifestyle_diet":
-        session["gathered_info"]["lifestyle_factors"]["diet"] = user_input
-        session["current_state"] = "lifestyle_stress"
-        response = {
-            "message": "How would you rate your current stress level?",
-            "options": ["Low", "Moderate", "High", "Very high"],
-            "progress": 72
-        }
+    # Canonicalize once; later turns reuse the id instead of re-matching text
+    session["primary_symptom_id"] = assessment_service.canonical_symptom_id(primary_symptom)
     
-    elif current_state == "lifestyle_stress":
-        session["gathered_info"]["lifestyle_factors"]["stress"] = user_input
-        session["current_state"] = "lifestyle_sleep"
-        response = {
-            "message": "How many hours of sleep do you typically get per night?",
-            "options": ["Less than 5 hours", "5-6 hours", "7-8 hours", "More than 8 hours", "Irregular sleep pattern"],
-            "progress": 76
-        }
+    # Transition to symptom-specific flow
+    session["current_flow"] = "symptom_specific"
+    session["symptom_specific_flow"] = primary_symptom.lower()
     
-    elif current_state == "lifestyle_sleep":
-        session["gathered_info"]["lifestyle_factors"]["sleep"] = user_input
-        session["current_state"] = "symptom_entry"
-        response = {
-            "message": "Now, let's focus on why you're seeking help today. What's the main symptom that's bothering you?",
-            "input_type": "symptom_search",
-            "placeholder": "e.g., headache, cough, stomach pain",
-            "progress": 80
-        }
+    # Get the first question for this symptom, tracking asked questions per session
+    session["question_tracking"] = assessment_service.new_question_tracking()
+    question = assessment_service.get_first_question(primary_symptom, session["question_tracking"])
     
-    elif current_state == "symptom_entry":
-        # Add the symptom to the list
-        primary_symptom = user_input
-        session["symptoms"].append(primary_symptom)
-        
-        # Transition to symptom-specific flow
-        session["current_flow"] = "symptom_specific"
-        session["symptom_specific_flow"] = primary_symptom.lower()
-        
-        # Get the first question for this symptom
-        question = assessment_service.get_first_question(primary_symptom)
-        
-        # Store current question for reference
-        session["current_question"] = question
-        
-        # Update state to reflect we're in a symptom-specific flow
-        session["current_state"] = f"{session['symptom_specific_flow']}_assessment"
-        
-        # Generate response based on the question
-        response = {
-            "message": question["text"],
-            "options": question["options"] if "options" in question else None,
-            "input_type": question.get("input_type", "options"),
-            "multiple_select": question.get("multiple_select", False),
-            "progress": 84
-        }
+    # Store current question for reference; the stack lets go_back replay it
+    session["current_question"] = question
+    session["question_history"] = [question]
     
-    # Add handling for additional symptoms state
-    elif current_state == "additional_symptoms":
-        # Check if user selected "None of these"
-        if user_input == "None of these":
-            # No additional symptoms, proceed to impact assessment
-            session["current_state"] = "symptom_impact"
-            response = {
-                "message": f"How much are your symptoms affecting your daily activities?",
-                "options": [
-                    "Not at all", 
-                    "Slightly limiting", 
-                    "Moderately limiting", 
-                    "Severely limiting", 
-                    "Completely unable to perform normal activities"
-                ],
-                "progress": 94
-            }
-        elif user_input == "Other symptoms":
-            # User wants to enter custom symptoms
-            session["current_state"] = "other_symptoms"
-            response = {
-                "message": "Please describe any other symptoms you're experiencing:",
-                "input_type": "text",
-                "progress": 94
-            }
-        else:
-            # User selected one or more symptoms from the list
-            # Add these symptoms to the list
-            if isinstance(user_input, list):
-                session["symptoms"].extend(user_input)
-            else:
-                # Handle comma-separated string of symptoms
-                additional_symptoms = [s.strip() for s in user_input.split(',')]
-                session["symptoms"].extend(additional_symptoms)
-            
-            # Proceed to impact assessment
-            session["current_state"] = "symptom_impact"
-            response = {
-                "message": f"How much are your symptoms affecting your daily activities?",
-                "options": [
-                    "Not at all", 
-                    "Slightly limiting", 
-                    "Moderately limiting", 
-                    "Severely limiting", 
-                    "Completely unable to perform normal activities"
-                ],
-                "progress": 94
-            }
-    
-    elif current_state == "other_symptoms":
-        # Process custom symptoms entered by the user
-        other_symptoms = [s.strip() for s in user_input.split(',')]
-        session["symptoms"].extend(other_symptoms)
-        
-        # Move to impact assessment
-        session["current_state"] = "symptom_impact"
-        response = {
-            "message": f"How much are your symptoms affecting your daily activities?",
-            "options": [
-                "Not at all", 
-                "Slightly limiting", 
-                "Moderately limiting", 
-                "Severely limiting", 
-                "Completely unable to perform normal activities"
-            ],
-            "progress": 94
-        }
-    
-    elif current_state == "symptom_impact":
-        session["symptom_details"]["impact"] = user_input
-        session["current_state"] = "previous_treatment"
-        
-        response = {
-            "message": "Have you tried any treatments or remedies for these symptoms?",
-            "options": ["No treatment tried", "Over-the-counter medication", "Prescription medication", "Home remedies", "Rest/lifestyle changes", "Other"],
-            "multiple_select": True,
-            "progress": 98
-        }
+    # Update state to reflect we're in a symptom-specific flow
+    session["current_state"] = f"{session['symptom_specific_flow']}_assessment"
     
-    elif current_state == "previous_treatment":
-        session["symptom_details"]["previous_treatment"] = user_input
-        session["current_state"] = "results"
-        
-        response = {
-            "message": "Thank you for providing all this information. I now have enough details to generate your health assessment report.",
-            "options": ["View my assessment report"],
-            "progress": 99
+    return symptom_question_prompt(question, 84)
+
+@intake.rewinder("symptom_entry")
+def rewind_symptom_entry(session):
+    """Forget the main symptom and everything asked about it"""
+    session["symptoms"] = []
+    session["symptom_details"] = {}
+    session["current_flow"] = "main"
+    session["symptom_specific_flow"] = None
+    session["primary_symptom_id"] = None
+    for key in ("question_tracking", "question_history", "current_question", "last_question_text", "last_answered_question_id"):
+        session.pop(key, None)
+
+@intake.prompt_builder("additional_symptoms")
+def additional_symptoms_prompt(session):
+    """Ask about symptoms that commonly accompany the main one"""
+    related_symptoms = assessment_service.get_related_symptoms(
+        session["symptom_specific_flow"], session.get("primary_symptom_id")
+    )
+    return {
+        "message": "Are you experiencing any other symptoms along with your main concern?",
+        "options": related_symptoms + ["None of these", "Other symptoms"],
+        "multiple_select": True,
+        "progress": 92
+    }
+
+@intake.handler("results")
+def handle_results(session, user_input):
+    """Generate the assessment report for the gathered information"""
+    # Generate assessment (served from the result cache when possible)
+    results = generate_report(**session_report_args(session))
+    return results_response(session, results)
+
+@intake.async_handler("results")
+async def handle_results_async(session, user_input):
+    """handle_results() for the async view, awaiting the model"""
+    results = await generate_report_async(**session_report_args(session))
+    return results_response(session, results)
+
+def session_report_args(session):
+    """generate_report() arguments for the information gathered in a session"""
+    return {
+        "name": session["gathered_info"].get("name", ""),
+        "age": session["gathered_info"].get("age"),
+        "biological_sex": session["gathered_info"].get("biological_sex"),
+        "symptoms": session["symptoms"],
+        "answers": {
+            **session["gathered_info"],
+            **session["symptom_details"]
         }
-    
-    elif current_state == "results":
-        # Generate assessment
-        results = ai_service.generate_assessment(
-            name=session["gathered_info"].get("name", ""),
-            age=session["gathered_info"].get("age"),
-            biological_sex=session["gathered_info"].get("biological_sex"),
-            symptoms=session["symptoms"],
-            answers={
-                **session["gathered_info"],
-                **session["symptom_details"]
-            }
+    }
+
+def results_response(session, results):
+    """Final response of the conversation carrying the finished report"""
+    # Add specialist recommendations and timestamp
+    add_report_extras(results, session["symptoms"])
+    
+    if prefetcher is not None and session.get("prefetch_key"):
+        prefetcher.release(session.pop("prefetch_key"))
+    
+    # Kept so a saved assessment includes its report
+    session["report"] = results
+    
+    # Add a start new assessment option
+    return {
+        "message": f"Here's your comprehensive health assessment, {session['gathered_info'].get('name', '')}.",
+        "report": results,
+        "progress": 100,
+        "show_start_new": True  # Flag to show start new assessment button
+    }
+
+@intake.on_enter("previous_treatment")
+def speculate_report(session):
+    """Start the report early, assuming the most common treatment answer"""
+    prefetch_report(session, {"previous_treatment": SPECULATIVE_TREATMENT})
+
+@intake.on_enter("results")
+def prefetch_exact_report(session):
+    """Start the report while the user reads the last prompt; reuses a correct guess"""
+    prefetch_report(session)
+
+def prefetch_report(session, assumed_details=None):
+    """Generate the session's report in the background, replacing a stale prefetch"""
+    # Without the model the report is local and cheap; nothing to get ahead of
+    if prefetcher is None or not ai_service.use_model():
+        return
+    
+    info = session["gathered_info"]
+    age = info.get("age")
+    biological_sex = info.get("biological_sex")
+    symptoms = list(session["symptoms"])
+    answers = {**info, **session["symptom_details"], **(assumed_details or {})}
+    cache_key = _report_cache_key(age, biological_sex, symptoms, answers)
+    
+    previous_key = session.get("prefetch_key")
+    if previous_key == cache_key:
+        return
+    if previous_key:
+        # The remaining answers changed the request; drop the speculative job
+        prefetcher.release(previous_key)
+        session["prefetch_key"] = None
+    if assessment_cache.get(cache_key) is not None:
+        return
+    
+    def submit():
+        future = ai_service.prefetch_assessment(
+            REPORT_SUBJECT, age, biological_sex, symptoms, answers,
+            candidates=assessment_service.rank_conditions(symptoms)
         )
-        
-        # Add specialist recommendations based on symptoms
-        specialists = get_recommended_specialists(session["symptoms"])
-        if specialists:
-            results["specialists"] = specialists
-        
-        # Add timestamp to results
-        results["generated_at"] = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        
-        # Add a start new assessment option
-        response = {
-            "message": f"Here's your comprehensive health assessment, {session['gathered_info'].get('name', '')}.",
-            "report": results,
-            "progress": 100,
-            "show_start_new": True  # Flag to show start new assessment button
-        }
-    
-    else:
-        # Default fallback
-        response = {
-            "message": "I'm not sure how to proceed. Let's start over.",
-            "options": ["Start over"],
-            "progress": 0
-        }
-    
-    # Store bot response in conversation history
-    session["conversation_history"].append({
-        "role": "assistant",
-        "content": response.get("message", ""),
-        "timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    })
+        if future is not None:
+            future.add_done_callback(lambda f: _cache_prefetched_report(cache_key, f))
+        return future
     
-    return jsonify(response)
+    if prefetcher.start(cache_key, submit):
+        session["prefetch_key"] = cache_key
+
+def _cache_prefetched_report(cache_key, future):
+    """Store a finished prefetch where generate_report will find it"""
+    if future.cancelled() or future.exception() is not None:
+        return
+    report = future.result()
+    if not report.get("is_fallback"):
+        assessment_cache.set(cache_key, _anonymize_report(report, REPORT_SUBJECT))
+
+def symptom_question_prompt(question, progress):
+    """Response asking a symptom-specific question"""
+    return {
+        "message": question["text"],
+        "options": question.get("options"),
+        "input_type": question.get("input_type", "options"),
+        "multiple_select": question.get("multiple_select", False),
+        "progress": progress
+    }
 
-def handle_symptom_specific_flow(session, user_input):
+def handle_symptom_specific_flow(session_id, session, user_input):
     """Handle symptom-specific conversation flows"""
-    current_state = session["current_state"]
     primary_symptom = session["symptom_specific_flow"]
     
     # Store the answer to the current question
@@ -627,133 +528,201 @@ def handle_symptom_specific_flow(session, user_input):
     # Get the next question based on the symptom and previous answers
     next_question = assessment_service.get_next_question(
         primary_symptom, 
-        session["symptom_details"]
+        session["symptom_details"],
+        session.setdefault("question_tracking", assessment_service.new_question_tracking())
     )
     
-    # If we have more questions, continue the symptom-specific flow
-    if next_question:
-        # Check if this is the same as the last question to prevent repetition
-        if "last_question_text" in session and session.get("last_question_text") == next_question["text"]:
-            # Skip to additional symptoms if we're repeating questions
-            session["current_flow"] = "main"
-            session["current_state"] = "additional_symptoms"
-            
-            # Get related symptoms based on the primary symptom
-            related_symptoms = assessment_service.get_related_symptoms(primary_symptom)
-            
-            response = {
-                "message": "Are you experiencing any other symptoms along with your main concern?",
-                "options": related_symptoms + ["None of these", "Other symptoms"],
-                "multiple_select": True,
-                "progress": 92
-            }
-        else:
-            # Store the current question for reference
-            session["current_question"] = next_question
-            # Store the question text to check for repetition next time
-            session["last_question_text"] = next_question["text"]
-            
-            response = {
-                "message": next_question["text"],
-                "options": next_question.get("options"),
-                "input_type": next_question.get("input_type", "options"),
-                "multiple_select": next_question.get("multiple_select", False),
-                "progress": min(95, 84 + len(session["symptom_details"]) * 2)  # Increment progress
-            }
+    # Stop when the flow is done or would repeat the last question
+    if next_question and session.get("last_question_text") != next_question["text"]:
+        # Store the current question for reference
+        session["current_question"] = next_question
+        session.setdefault("question_history", []).append(next_question)
+        # Store the question text to check for repetition next time
+        session["last_question_text"] = next_question["text"]
+        
+        response = symptom_question_prompt(
+            next_question,
+            min(95, 84 + len(session["symptom_details"]) * 2)  # Increment progress
+        )
     else:
         # If no more symptom-specific questions, ask about additional symptoms
         session["current_flow"] = "main"  # Return to main flow
         session["current_state"] = "additional_symptoms"
-        
-        # Get related symptoms based on the primary symptom
-        related_symptoms = assessment_service.get_related_symptoms(primary_symptom)
-        
-        response = {
-            "message": "Are you experiencing any other symptoms along with your main concern?",
-            "options": related_symptoms + ["None of these", "Other symptoms"],
-            "multiple_select": True,
-            "progress": 92
-        }
+        response = intake.prompt("additional_symptoms", session)
     
     # Store bot response in conversation history
-    session["conversation_history"].append({
-        "role": "assistant",
-        "content": response.get("message", ""),
-        "timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    })
+    conversation_log.append(session_id, session["conversation_history"], "assistant", response.get("message", ""))
     
-    return jsonify(response)
+    return response
+
+def rewind_symptom_question(session, state):
+    """Re-ask the last answered symptom-specific question"""
+    history = session.get("question_history") or []
+    if session["current_flow"] == "symptom_specific" and len(history) > 1:
+        # Drop the unanswered question currently on screen
+        assessment_service.forget_question(session["question_tracking"], history.pop())
+    if not history:
+        return None
+    
+    question = history[-1]
+    session["symptom_details"].pop(question.get("id", "unknown"), None)
+    session["current_question"] = question
+    session["last_question_text"] = question["text"]
+    session["current_flow"] = "symptom_specific"
+    session["current_state"] = state
+    tracking = session.get("question_tracking")
+    if tracking is not None:
+        tracking.pop("flow_done", None)
+        if tracking.get("flow"):
+            tracking["node"] = question.get("id")
+    
+    return symptom_question_prompt(question, min(95, 84 + len(session["symptom_details"]) * 2))
 
 @main.route('/api/assessment/back', methods=['POST'])
 def go_back_in_conversation():
-    """Allow users to go back to a previous question"""
+    """Go back to the previous question and ask it again"""
     data = request.json
     session_id = data.get('session_id')
     
-    if not session_id or session_id not in sessions:
+    session = sessions.get(session_id)
+    if session is None:
         return jsonify({"error": "Invalid session"}), 400
     
-    session = sessions[session_id]
-    
     # Check if we have a previous state to go back to
-    if not session["state_history"] or len(session["state_history"]) <= 1:
+    if not session["state_history"]:
         return jsonify({
             "message": "Cannot go back further. You're at the beginning of the conversation.",
             "error": "no_previous_state"
         }), 400
     
-    # Remove the current state from history
-    session["state_history"].pop()
-    
-    # Set the current state to the previous one
-    previous_state = session["state_history"][-1]
-    session["current_state"] = previous_state
-    
-    # Generate appropriate response based on the previous state
-    # This would need to be implemented based on your state machine
+    if session["state_history"][-1] in intake:
+        response = intake.go_back(session)
+    else:
+        # A symptom-specific question; those live in the question flow, not the table
+        state = session["state_history"].pop()
+        session["previous_state"] = session["state_history"][-1] if session["state_history"] else None
+        response = rewind_symptom_question(session, state)
+        if response is None:
+            return jsonify({
+                "message": "Cannot go back further. You're at the beginning of the conversation.",
+                "error": "no_previous_state"
+            }), 400
     
-    return jsonify({
-        "message": "Let's go back to the previous question.",
-        "new_state": previous_state
-    })
+    response["new_state"] = session["current_state"]
+    conversation_log.append(session_id, session["conversation_history"], "assistant", response.get("message", ""))
+    sessions.save(session_id, session)
+    return jsonify(response)
 
 @main.route('/api/assessment/quick', methods=['POST'])
-def quick_assessment():
+async def quick_assessment():
     """Generate a quick assessment for common symptom patterns"""
-    data = request.json
+    args = quick_report_args(request.json)
+    if args is None:
+        return jsonify({"error": "Missing required parameters"}), 400
+    
+    # Generate a simplified assessment (served from the result cache when possible)
+    quick_results = await generate_report_async(**args)
+    return jsonify(quick_response(quick_results, args["symptoms"]))
+
+def quick_report_args(data):
+    """generate_report() arguments for a quick assessment request, or None when incomplete"""
     symptoms = data.get('symptoms', [])
     age = data.get('age')
     biological_sex = data.get('biological_sex')
     
     if not symptoms or not age or not biological_sex:
-        return jsonify({"error": "Missing required parameters"}), 400
-    
-    # Generate a simplified assessment without caching for now
-    quick_results = ai_service.generate_assessment(
-        name="",
-        age=age,
-        biological_sex=biological_sex,
-        symptoms=symptoms,
-        answers={}
-    )
+        return None
+    return {"name": "", "age": age, "biological_sex": biological_sex, "symptoms": symptoms, "answers": {}}
+
+def quick_response(quick_results, symptoms):
+    """Response carrying a quick assessment report"""
+    # Add specialist recommendations and timestamp
+    add_report_extras(quick_results, symptoms)
     
-    # Add specialist recommendations
+    return {
+        "message": "Here's a quick assessment based on your symptoms.",
+        "report": quick_results,
+        "show_start_new": True  # Flag to show start new assessment button
+    }
+
+def add_report_extras(results, symptoms):
+    """Add specialist recommendations and the generation time to a report"""
     specialists = get_recommended_specialists(symptoms)
     if specialists:
-        quick_results["specialists"] = specialists
+        results["specialists"] = specialists
+    results["generated_at"] = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+@main.route('/api/assessment/batch', methods=['POST'])
+def batch_assessment():
+    """Assess a JSONL stream of cases and stream JSONL results back"""
+    lines = request.get_data(as_text=True).splitlines()
+    runner = create_batch_assessor(assess_batch_case, batch_case_key, validate_batch_case)
     
-    # Add timestamp
-    quick_results["generated_at"] = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    def results():
+        for result in runner.run(lines):
+            yield json.dumps(result, separators=(',', ':')) + "\n"
     
-    return jsonify({
-        "message": "Here's a quick assessment based on your symptoms.",
-        "report": quick_results,
-        "show_start_new": True  # Flag to show start new assessment button
-    })
+    return Response(stream_with_context(results()), mimetype='application/x-ndjson')
+
+@main.route('/api/assessment/stream', methods=['GET'])
+def stream_assessment():
+    """Stream the assessment report for a session as server-sent events"""
+    session_id = request.args.get('session_id')
+    session = sessions.get(session_id)
+    if session is None:
+        return jsonify({"error": "Invalid session"}), 400
+    if not session["symptoms"]:
+        return jsonify({"error": "No symptoms recorded for this session"}), 400
+    
+    name = session["gathered_info"].get("name", "")
+    age = session["gathered_info"].get("age")
+    biological_sex = session["gathered_info"].get("biological_sex")
+    symptoms = list(session["symptoms"])
+    answers = {**session["gathered_info"], **session["symptom_details"]}
+    cache_key = _report_cache_key(age, biological_sex, symptoms, answers)
+    
+    def events():
+        cached = assessment_cache.get(cache_key)
+        if cached is not None:
+            stream = ai_service.report_events(_personalize_report(cached, name))
+        else:
+            stream = ai_service.stream_assessment(
+                REPORT_SUBJECT, age, biological_sex, symptoms, answers,
+                candidates=assessment_service.rank_conditions(symptoms)
+            )
+        
+        for event in stream:
+            if event["event"] == "section" and event["section"] == "summary" and isinstance(event["data"], str):
+                event = {**event, "data": event["data"].replace(f"Assessment for {REPORT_SUBJECT}", f"Assessment for {name}")}
+            elif event["event"] == "report":
+                report = event["data"]
+                if cached is None:
+                    report = _anonymize_report(report, REPORT_SUBJECT)
+                    if not report.get("is_fallback"):
+                        assessment_cache.set(cache_key, report)
+                    report = _personalize_report(report, name)
+                report = dict(report)
+                specialists = get_recommended_specialists(symptoms)
+                if specialists:
+                    report["specialists"] = specialists
+                report["generated_at"] = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                event = {"event": "report", "data": report}
+            yield _format_sse(event)
+    
+    return Response(
+        stream_with_context(events()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+def _format_sse(event):
+    """Encode an event dict as a server-sent events frame"""
+    payload = {k: v for k, v in event.items() if k != "event"}
+    return f"event: {event['event']}\ndata: {json.dumps(payload)}\n\n"
 
 @main.route('/api/symptoms/search', methods=['GET'])
-def search_symptoms():
-    """Search for symptoms based on query"""
+async def search_symptoms():
+    """Search for symptoms based on query; the index is in memory, so the lookup runs on the loop"""
     query = request.args.get('q', '')
     results = assessment_service.search_symptoms(query)
     
@@ -763,15 +732,21 @@ def search_symptoms():
 
 @main.route('/api/assessment/save', methods=['POST'])
 def save_assessment():
-    """Save the current assessment for later reference"""
+    """Save the current assessment for later reference
+    
+    The save is queued for the next group commit and answered with
+    "committed": false; it is readable at once from this process and on
+    disk once the writer commits it. With ?sync=1 the response waits for
+    the commit instead (500 if it failed, "committed": false if it is still
+    queued after SAVE_SYNC_TIMEOUT seconds).
+    """
     data = request.json
     session_id = data.get('session_id')
     
-    if not session_id or session_id not in sessions:
+    session = sessions.get(session_id)
+    if session is None:
         return jsonify({"error": "Invalid session"}), 400
     
-    session = sessions[session_id]
-    
     # Generate a unique ID for the saved assessment
     saved_id = str(uuid.uuid4())
     
@@ -787,141 +762,260 @@ def save_assessment():
         "symptoms": session["symptoms"],
         "symptom_details": session["symptom_details"],
         "gathered_info": session["gathered_info"],
-        "conversation_history": session["conversation_history"]
+        "conversation_history": conversation_log.transcript(session_id, session["conversation_history"])
     }
     
-    # In a real application, you would save this to a database
-    # For now, we'll just return the ID
+    # Identical reports share one stored body; the per-save fields stay with the assessment
+    body = None
+    report = session.get("report")
+    if report:
+        body = _anonymize_report(
+            {k: v for k, v in report.items() if k not in PER_SAVE_REPORT_FIELDS},
+            session["gathered_info"].get("name", "")
+        )
+        assessment_data["report_fields"] = {k: report[k] for k in PER_SAVE_REPORT_FIELDS if k in report}
+    
+    if not saved_assessments.save(saved_id, assessment_data, body):
+        return jsonify({"error": "Too many assessments are being saved, please try again shortly"}), 503
+    
+    committed = False
+    if request.args.get('sync') in ('1', 'true'):
+        committed = saved_assessments.wait(saved_id, timeout=SAVE_SYNC_TIMEOUT)
+        if committed is False:
+            return jsonify({"error": "The assessment could not be stored", "assessment_id": saved_id}), 500
+        committed = bool(committed)
     
     return jsonify({
         "message": "Assessment saved successfully",
-        "assessment_id": saved_id
+        "assessment_id": saved_id,
+        "committed": committed
     })
 
+@main.route('/api/assessments/<uuid:assessment_id>', methods=['GET'])
+def get_saved_assessment(assessment_id):
+    """Return a saved assessment by its id
+    
+    Served under its own prefix so it cannot shadow the /api/assessment/*
+    actions, which answer GET with 405.
+    """
+    saved = saved_assessments.get(str(assessment_id))
+    if saved is None:
+        return jsonify({"error": "Assessment not found"}), 404
+    
+    assessment_data, body = saved
+    report_fields = assessment_data.pop("report_fields", {})
+    if body is not None:
+        name = assessment_data["gathered_info"].get("name", "")
+        assessment_data["report"] = {**_restore_report(body, name), **report_fields}
+    return jsonify(assessment_data)
+
 def get_recommended_specialists(symptoms):
     """Get recommended specialists based on symptoms"""
-    # Map of symptoms to medical specialties
-    symptom_to_specialty = {
-        "headache": ["Neurologist", "Primary Care Physician"],
-        "migraine": ["Neurologist", "Primary Care Physician"],
-        "fever": ["Primary Care Physician", "Infectious Disease Specialist"],
-        "cough": ["Pulmonologist", "Primary Care Physician"],
-        "chest pain": ["Cardiologist", "Emergency Medicine"],
-        "shortness of breath": ["Pulmonologist", "Cardiologist"],
-        "abdominal pain": ["Gastroenterologist", "Primary Care Physician"],
-        "stomach pain": ["Gastroenterologist", "Primary Care Physician"],
-        "joint pain": ["Rheumatologist", "Orthopedic Surgeon"],
-        "back pain": ["Orthopedic Surgeon", "Neurologist", "Physical Therapist"],
-        "rash": ["Dermatologist", "Allergist"],
-        "sore throat": ["Otolaryngologist", "Primary Care Physician"],
-        "runny nose": ["Allergist", "Otolaryngologist"],
-        "dizziness": ["Neurologist", "Otolaryngologist", "Cardiologist"],
-        "fatigue": ["Primary Care Physician", "Endocrinologist", "Rheumatologist"],
-        "nausea": ["Gastroenterologist", "Primary Care Physician"],
-        "vomiting": ["Gastroenterologist", "Emergency Medicine"],
-        "diarrhea": ["Gastroenterologist", "Primary Care Physician", "Infectious Disease Specialist"],
-        "constipation": ["Gastroenterologist", "Primary Care Physician"],
-        "blood in stool": ["Gastroenterologist", "Colorectal Surgeon"],
-        "urinary problems": ["Urologist", "Nephrologist"],
-        "skin issues": ["Dermatologist"],
-        "eye problems": ["Ophthalmologist"],
-        "ear pain": ["Otolaryngologist"],
-        "hearing loss": ["Audiologist", "Otolaryngologist"],
-        "vision changes": ["Ophthalmologist", "Neurologist"],
-        "numbness": ["Neurologist"],
-        "tingling": ["Neurologist"],
-        "weakness": ["Neurologist", "Rheumatologist"],
-        "hair loss": ["Dermatologist", "Endocrinologist"],
-        "weight loss": ["Primary Care Physician", "Endocrinologist", "Gastroenterologist"],
-        "weight gain": ["Primary Care Physician", "Endocrinologist"],
-        "anxiety": ["Psychiatrist", "Psychologist"],
-        "depression": ["Psychiatrist", "Psychologist"],
-        "sleep problems": ["Sleep Specialist", "Neurologist", "Psychiatrist"],
-        "memory issues": ["Neurologist", "Geriatrician", "Psychiatrist"],
-        "breathing difficulty": ["Pulmonologist", "Cardiologist", "Allergist"],
-        "heart palpitations": ["Cardiologist"],
-        "swelling": ["Primary Care Physician", "Cardiologist", "Rheumatologist"],
-        "joint swelling": ["Rheumatologist", "Orthopedic Surgeon"],
-        "muscle pain": ["Rheumatologist", "Orthopedic Surgeon", "Physical Therapist"],
-        "watery eyes": ["Ophthalmologist", "Allergist"],
-        "sneezing": ["Allergist", "Otolaryngologist", "Primary Care Physician"]
-    }
+    return specialist_matcher.recommend(symptoms)
+
+def generate_report(name, age, biological_sex, symptoms, answers, rate_limiter=None):
+    """Generate an assessment report, reusing cached results for identical presentations"""
+    cache_key = _report_cache_key(age, biological_sex, symptoms, answers)
+    
+    cached = _cached_report(cache_key, name)
+    if cached is not None:
+        return cached
+    
+    # A report prefetched earlier in the conversation may be about to land
+    if prefetcher is not None:
+        prefetched = _prefetched_report(prefetcher.wait(cache_key, timeout=ai_service.timeout), name)
+        if prefetched is not None:
+            return prefetched
+    
+    def generate():
+        # Only calls that reach the model count against the limiter
+        if rate_limiter is not None and ai_service.use_model():
+            rate_limiter.acquire()
+        
+        results = ai_service.generate_assessment(
+            name=REPORT_SUBJECT,
+            age=age,
+            biological_sex=biological_sex,
+            symptoms=symptoms,
+            answers=answers,
+            candidates=assessment_service.rank_conditions(symptoms)
+        )
+        return _remember_report(cache_key, results)
     
-    recommended_specialists = {}
+    # Identical requests already waiting on the model share its answer
+    if coalescer is None:
+        report = generate()
+    else:
+        fallback = _fallback_report(age, biological_sex, symptoms, answers)
+        report = coalescer.do(cache_key, generate, fallback, timeout=ai_service.timeout)
+    return _personalize_report(report, name)
+
+async def generate_report_async(name, age, biological_sex, symptoms, answers):
+    """generate_report() for async views: cache I/O and ranking run on a worker thread"""
+    cache_key = _report_cache_key(age, biological_sex, symptoms, answers)
+    
+    cached = await run_blocking(_cached_report, cache_key, name)
+    if cached is not None:
+        return cached
+    
+    if prefetcher is not None:
+        prefetched = _prefetched_report(await prefetcher.wait_async(cache_key, timeout=ai_service.timeout), name)
+        if prefetched is not None:
+            return prefetched
+    
+    async def generate():
+        candidates = await run_blocking(assessment_service.rank_conditions, symptoms)
+        results = await ai_service.generate_assessment_async(
+            name=REPORT_SUBJECT,
+            age=age,
+            biological_sex=biological_sex,
+            symptoms=symptoms,
+            answers=answers,
+            candidates=candidates
+        )
+        return await run_blocking(_remember_report, cache_key, results)
     
-    for symptom in symptoms:
-        symptom_lower = symptom.lower()
-        
-        # Check for exact matches
-        for key, specialists in symptom_to_specialty.items():
-            if key in symptom_lower or symptom_lower in key:
-                for specialist in specialists:
-                    if specialist in recommended_specialists:
-                        recommended_specialists[specialist] += 1
-                    else:
-                        recommended_specialists[specialist] = 1
-    
-    # Sort specialists by relevance (number of matching symptoms)
-    sorted_specialists = sorted(
-        recommended_specialists.items(), 
-        key=lambda x: x[1], 
-        reverse=True
+    if coalescer is None:
+        report = await generate()
+    else:
+        fallback = _fallback_report(age, biological_sex, symptoms, answers)
+        report = await coalescer.do_async(cache_key, generate, fallback, timeout=ai_service.timeout)
+    return _personalize_report(report, name)
+
+def _cached_report(cache_key, name):
+    cached = assessment_cache.get(cache_key)
+    if cached is None:
+        return None
+    return _personalize_report(cached, name)
+
+def _prefetched_report(report, name):
+    """A finished prefetch for name, or None when there was none worth serving"""
+    if report is None or report.get("is_fallback"):
+        return None
+    return _personalize_report(_anonymize_report(report, REPORT_SUBJECT), name)
+
+def _remember_report(cache_key, results):
+    """Cache a report worth reusing and return its anonymized form for sharing"""
+    report = _anonymize_report(results, REPORT_SUBJECT)
+    # Canned fallback reports are not worth remembering
+    if not results.get("is_fallback"):
+        assessment_cache.set(cache_key, report)
+    return report
+
+def _fallback_report(age, biological_sex, symptoms, answers):
+    """Local report, anonymized like a shared one, for a caller the coalescer could not give a shared result"""
+    return lambda reason: _anonymize_report(
+        ai_service.fallback_assessment(REPORT_SUBJECT, age, biological_sex, symptoms, answers, reason=reason),
+        REPORT_SUBJECT
     )
-    
-    # Return top 3 specialists with descriptions
-    specialist_descriptions = {
-        "Primary Care Physician": "For general health concerns and initial evaluation",
-        "Neurologist": "Specializes in disorders of the brain and nervous system",
-        "Cardiologist": "Specializes in heart conditions",
-        "Pulmonologist": "Specializes in lung and respiratory conditions",
-        "Gastroenterologist": "Specializes in digestive system disorders",
-        "Dermatologist": "Specializes in skin conditions",
-        "Rheumatologist": "Specializes in autoimmune and inflammatory conditions",
-        "Orthopedic Surgeon": "Specializes in bone and joint conditions",
-        "Otolaryngologist": "Specializes in ear, nose, and throat conditions",
-        "Allergist": "Specializes in allergies and immune system disorders",
-        "Endocrinologist": "Specializes in hormone-related conditions",
-        "Infectious Disease Specialist": "Specializes in infections and related conditions",
-        "Emergency Medicine": "For urgent and emergency medical conditions",
-        "Psychiatrist": "Specializes in mental health conditions with medication management",
-        "Psychologist": "Specializes in mental health therapy and counseling",
-        "Ophthalmologist": "Specializes in eye diseases and conditions",
-        "Urologist": "Specializes in urinary tract and male reproductive system",
-        "Nephrologist": "Specializes in kidney diseases",
-        "Colorectal Surgeon": "Specializes in conditions affecting the colon and rectum",
-        "Audiologist": "Specializes in hearing disorders",
-        "Sleep Specialist": "Specializes in sleep disorders and sleep medicine",
-        "Geriatrician": "Specializes in healthcare for older adults",
-        "Physical Therapist": "Specializes in physical rehabilitation and pain management"
+
+def validate_batch_case(case):
+    """Return an error message for a batch case missing required fields, else None"""
+    symptoms = case.get('symptoms')
+    if not symptoms or not isinstance(symptoms, list):
+        return "Missing or invalid symptoms"
+    if not all(isinstance(symptom, str) and symptom.strip() for symptom in symptoms):
+        return "symptoms must be non-empty strings"
+    if not case.get('age') or not case.get('biological_sex'):
+        return "Missing required parameters"
+    if not isinstance(case.get('answers', {}), dict):
+        return "answers must be an object"
+    return None
+
+def batch_case_key(case):
+    """Cases with the same report cache key and name produce the same report"""
+    return (
+        case.get('name', ''),
+        _report_cache_key(case['age'], case['biological_sex'], case['symptoms'], case.get('answers', {}))
+    )
+
+def assess_batch_case(case, rate_limiter=None):
+    """Generate the report for one batch case"""
+    report = generate_report(
+        name=case.get('name', ''),
+        age=case['age'],
+        biological_sex=case['biological_sex'],
+        symptoms=case['symptoms'],
+        answers=case.get('answers', {}),
+        rate_limiter=rate_limiter
+    )
+    specialists = get_recommended_specialists(case['symptoms'])
+    if specialists:
+        report["specialists"] = specialists
+    return report
+
+def _report_cache_key(age, biological_sex, symptoms, answers):
+    """Cache key covering everything sent to the model except identity fields, per knowledge base version"""
+    key_details = {
+        k: v for k, v in answers.items()
+        if k not in ("name", "age", "biological_sex", "assessment_date")
     }
-    
-    result = []
-    for specialist, count in sorted_specialists[:3]:
-        result.append({
-            "name": specialist,
-            "description": specialist_descriptions.get(specialist, "Medical specialist"),
-            "relevance_score": count
-        })
-    
-    return result
+    return generate_assessment_cache_key(
+        age, biological_sex, symptoms, key_details, knowledge_base=assessment_service.fingerprint
+    )
+
+def _anonymize_report(report, name):
+    """Replace the name in a report's summary with the placeholder before caching or saving
+    
+    The summary's opening is the only place a name appears: reports are
+    generated for REPORT_SUBJECT and the patient's name is put there afterwards.
+    """
+    report = dict(report)
+    summary = report.get("summary")
+    if isinstance(summary, str):
+        report["summary"] = summary.replace(f"Assessment for {name}", "Assessment for {patient}")
+    return report
+
+def _personalize_report(report, name):
+    """Fill the patient placeholder of a cached report and give it fresh metadata"""
+    report = json.loads(json.dumps(report))
+    summary = report.get("summary")
+    if isinstance(summary, str):
+        report["summary"] = summary.replace("Assessment for {patient}", f"Assessment for {name}")
+    now = datetime.datetime.now()
+    report["report_date"] = now.strftime("%B %d, %Y")
+    report["report_id"] = f"HA-{now.strftime('%Y%m%d%H%M%S')}"
+    return report
+
+def _restore_report(report, name):
+    """Fill the patient placeholder of a stored report, keeping its metadata"""
+    summary = report.get("summary")
+    if isinstance(summary, str):
+        report["summary"] = summary.replace("Assessment for {patient}", f"Assessment for {name}")
+    return report
+
+def _age_key(age):
+    """The age as the prompt states it, normalized for cache keys"""
+    try:
+        return str(int(age))
+    except (TypeError, ValueError):
+        return str(age or "unknown").strip().lower()
+
+def _canonical_symptom_id(symptom):
+    """Map free-text symptom names to catalog ids where possible"""
+    return assessment_service.canonical_symptom_id(symptom) or " ".join(symptom.lower().split())
 
-def generate_assessment_cache_key(age, biological_sex, symptoms, symptom_details=None):
+def generate_assessment_cache_key(age, biological_sex, symptoms, symptom_details=None, knowledge_base=None):
     """Generate a cache key for assessment results"""
-    # Sort symptoms to ensure consistent key generation
-    sorted_symptoms = sorted(symptoms)
+    # Canonicalize and sort symptoms to ensure consistent key generation
+    sorted_symptoms = sorted({_canonical_symptom_id(s) for s in symptoms if s})
     
     # Create a base key with essential parameters
     key_parts = [
-        f"age:{age}",
-        f"sex:{biological_sex}",
+        f"age:{_age_key(age)}",
+        f"sex:{(biological_sex or '').strip().lower()}",
         f"symptoms:{','.join(sorted_symptoms)}"
     ]
+    if knowledge_base:
+        key_parts.append(f"kb:{knowledge_base}")
     
     # Add symptom details if available
     if symptom_details:
         for k, v in sorted(symptom_details.items()):
             if isinstance(v, list):
-                v = ','.join(sorted(v))
+                v = ','.join(sorted(str(item) for item in v))
+            elif isinstance(v, dict):
+                v = json.dumps(v, sort_keys=True)
             key_parts.append(f"{k}:{v}")
     
     # Join all parts and create a hash
@@ -1,132 +1,433 @@
 import os
 import re
+import time
+import asyncio
+import queue
 import datetime
+import threading
+import json
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 import google.generativeai as genai
+from app.services.resilience import create_model_guard
+from app.services.metrics import registry
+from app.services.prompt_builder import PromptBuilder, estimate_tokens
+from app.services.report_parser import REPORT_SCHEMA, IncrementalReportParser, build_sections, section_value
+
+MODEL_SECONDS = registry.histogram(
+    "gemini_request_duration_seconds", "Gemini call duration including retries", ("kind", "outcome")
+)
+# Per-prompt sizes around the default 1500-token budget; _sum keeps the running total
+PROMPT_TOKENS = registry.histogram(
+    "gemini_prompt_tokens", "Estimated tokens per prompt sent to Gemini",
+    buckets=(250, 500, 750, 1000, 1250, 1500, 2000, 3000, 5000)
+)
+OUTPUT_TOKENS = registry.counter("gemini_output_tokens_total", "Estimated tokens in Gemini responses", ("kind",))
+FALLBACK_REPORTS = registry.counter(
+    "assessment_fallback_reports_total", "Reports served without the model, by reason", ("reason",)
+)
+PARSED_REPORTS = registry.counter("assessment_parsed_reports_total", "Model responses by parser used", ("parser",))
 
 class AIService:
     """Service for AI-powered health assessments with enhanced symptom interpretation"""
     
-    def __init__(self):
-        """Initialize the AI service with the Gemini API"""
-        api_key = os.environ.get('GEMINI_API_KEY')
-        if api_key:
-            genai.configure(api_key=api_key)
+    # Report sections in the order the prompt asks for them
+    REPORT_SECTIONS = [
+        "summary", "symptom_analysis", "possible_conditions", "warning_signs",
+        "next_steps", "self_care", "prevention"
+    ]
+    
+    def __init__(self, local_reports=None, prompt_builder=None):
+        """Initialize the AI service with the Gemini API
+        
+        local_reports, when given, builds offline reports from the conditions
+        knowledge base; it serves every request in ASSESSMENT_MODE=local and
+        replaces the generic fallback otherwise. prompt_builder compacts the
+        intake into a prompt within its token budget.
+        """
+        self.local_reports = local_reports
+        self.prompt_builder = prompt_builder or PromptBuilder()
+        self.mode = os.environ.get('ASSESSMENT_MODE', 'llm').lower()
+        
+        # Configure generation parameters for faster response
+        self.generation_config = {
+            "temperature": 0.3,  # Lower temperature for more focused outputs
+            "top_p": 0.8,        # More deterministic responses
+            "top_k": 40,         # Limit token selection for faster generation
+            "max_output_tokens": int(os.environ.get('GEMINI_MAX_OUTPUT_TOKENS', 1024))  # Limit output size for faster generation
+        }
+        
+        # Reports are requested as JSON matching REPORT_SCHEMA; "text" keeps the headed-sections format
+        self.output_format = os.environ.get('ASSESSMENT_OUTPUT', 'json').lower()
+        if self.output_format == 'json' and 'response_mime_type' in getattr(genai.types.GenerationConfig, '__annotations__', {}):
+            self.generation_config["response_mime_type"] = "application/json"
+        
         self.model = None
+        api_key = os.environ.get('GEMINI_API_KEY')
+        if not api_key:
+            # Without a key every call would fail after a credentials lookup
+            print("GEMINI_API_KEY is not set; assessments will use local reports")
+        elif self.mode != 'local':
+            try:
+                genai.configure(api_key=api_key)
+                # Using gemini-1.5-flash for faster generation
+                self.model = genai.GenerativeModel('gemini-1.5-flash')
+            except Exception as e:
+                print(f"Error initializing Gemini model: {e}")
+        
+        # Model calls run on a bounded pool so slow responses cannot pin request threads
+        self.timeout = float(os.environ.get('GEMINI_TIMEOUT_SECONDS', 30))
+        max_concurrency = int(os.environ.get('GEMINI_MAX_CONCURRENCY', 8))
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_concurrency,
+            thread_name_prefix='gemini'
+        )
+        
+        # Breaker, retry budget and adaptive limit: a model brownout sheds to local reports
+        self.guard = create_model_guard(max_concurrency, self.timeout)
+    
+    def _shed_reason(self):
+        """Why a request that was not admitted to the model is served locally"""
+        if self.mode == 'local':
+            return "local_mode"
+        return "shed" if self.use_model() else "unavailable"
+    
+    def use_model(self):
+        """Whether reports should come from the model rather than the local engine"""
+        return self.model is not None and self.mode != 'local'
+    
+    def fallback_assessment(self, name, age, biological_sex, symptoms, answers, reason):
+        """Serve a report without calling the model, counted under reason"""
+        return self._generate_fallback_assessment(name, symptoms, age, biological_sex, answers, reason=reason)
+    
+    def generate_assessment(self, name, age, biological_sex, symptoms, answers, timeout=None, candidates=None):
+        """Generate a health assessment, waiting at most timeout seconds for the model"""
+        timeout = timeout or self.timeout
+        future = self.submit_assessment(name, age, biological_sex, symptoms, answers, candidates)
         try:
-            # Using gemini-1.5-flash for faster generation
-            self.model = genai.GenerativeModel('gemini-1.5-flash')
-            # Configure generation parameters for faster response
-            self.generation_config = {
-                "temperature": 0.3,  # Lower temperature for more focused outputs
-                "top_p": 0.8,        # More deterministic responses
-                "top_k": 40,         # Limit token selection for faster generation
-                "max_output_tokens": 1024  # Limit output size for faster generation
-            }
-        except Exception as e:
-            print(f"Error initializing Gemini model: {e}")
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            print(f"Gemini assessment exceeded {timeout:.2f}s deadline, using fallback")
+            return self._generate_fallback_assessment(name, symptoms, age, biological_sex, answers, reason="timeout")
     
-    def generate_assessment(self, name, age, biological_sex, symptoms, answers):
-        """Generate a health assessment based on symptoms and answers"""
-        if not self.model:
-            return self._generate_fallback_assessment(name, symptoms)
+    def submit_assessment(self, name, age, biological_sex, symptoms, answers, candidates=None):
+        """Start generating an assessment on the model thread pool and return its future"""
+        if not self.use_model() or not self.guard.admit():
+            future = Future()
+            future.set_result(self._generate_fallback_assessment(name, symptoms, age, biological_sex, answers, reason=self._shed_reason()))
+            return future
+        future = self._executor.submit(
+            self._generate_assessment_now, name, age, biological_sex, symptoms, answers, candidates
+        )
+        # A job cancelled before it ran never releases its admitted slot itself
+        future.add_done_callback(lambda f: self.guard.abandon() if f.cancelled() else None)
+        return future
+    
+    def prefetch_assessment(self, name, age, biological_sex, symptoms, answers, candidates=None):
+        """submit_assessment() for a report wanted ahead of time; None when the model has no spare capacity
+
+        Such calls are admitted as background work and are never answered
+        with a local report, which the caller would only throw away.
+        """
+        if not self.use_model() or not self.guard.admit(background=True):
+            return None
+        future = self._executor.submit(
+            self._generate_assessment_now, name, age, biological_sex, symptoms, answers, candidates
+        )
+        future.add_done_callback(lambda f: self.guard.abandon() if f.cancelled() else None)
+        return future
+    
+    async def generate_assessment_async(self, name, age, biological_sex, symptoms, answers, timeout=None, candidates=None):
+        """Generate a health assessment from an async view
         
+        Admission, retries and the deadline match generate_assessment. The
+        Gemini request itself runs on the model thread pool, as the sync
+        path's does, and the view awaits it without holding a thread; the
+        library's async client stays bound to the first loop it is used on,
+        and views run on more than one (the server's under ASGI, the app's
+        shared loop under WSGI).
+        """
+        timeout = timeout or self.timeout
+        if not self.use_model() or not self.guard.admit():
+            return self._generate_fallback_assessment(name, symptoms, age, biological_sex, answers, reason=self._shed_reason())
         try:
-            # Format the gathered info for the AI
-            symptoms_str = ", ".join(symptoms)
-            
-            # Format answers into a readable string with better organization
-            medical_history = []
-            lifestyle_factors = []
-            symptom_details = []
-            medications = []
-            
-            for k, v in answers.items():
-                if k not in ['name', 'age', 'biological_sex']:
-                    if k.startswith('medical_history'):
-                        medical_history.append(f"- {k.replace('medical_history_', '')}: {v}")
-                    elif k.startswith('lifestyle'):
-                        lifestyle_factors.append(f"- {k.replace('lifestyle_factors_', '')}: {v}")
-                    elif k in ['medications', 'allergies']:
-                        medications.append(f"- {k}: {v}")
-                    else:
-                        symptom_details.append(f"- {k}: {v}")
-            
-            # Create organized sections for the prompt
-            medical_history_str = "\n".join(medical_history) if medical_history else "None reported"
-            lifestyle_str = "\n".join(lifestyle_factors) if lifestyle_factors else "None reported"
-            medications_str = "\n".join(medications) if medications else "None reported"
-            symptom_details_str = "\n".join(symptom_details) if symptom_details else "No additional details"
-            
-            # Get current date for the report
-            current_date = datetime.datetime.now().strftime("%B %d, %Y")
-            
-            # Enhanced prompt for more structured assessment with urgency levels and condition likelihoods
-            prompt = f"""
-            You are an expert medical assistant creating a comprehensive health assessment report. Follow this structured format exactly:
-
-            PATIENT: {name}, {age} years old, {biological_sex}
-            DATE: {current_date}
-            SYMPTOMS: {symptoms_str}
-            
-            Based on this information and the details below, generate a structured clinical report:
-            
-            SYMPTOM DETAILS:
-            {symptom_details_str}
-            
-            MEDICAL HISTORY:
-            {medical_history_str}
-            
-            MEDICATIONS AND ALLERGIES:
-            {medications_str}
-            
-            LIFESTYLE FACTORS:
-            {lifestyle_str}
-            
-            FORMAT YOUR RESPONSE WITH THESE EXACT SECTIONS:
-            
-            1. SUMMARY: Begin with "Assessment for {name}:" followed by a concise paragraph (3-4 sentences) analyzing likely causes of symptoms based on patient profile. Focus on clinical relevance.
-            
-            2. SYMPTOM ANALYSIS: List each reported symptom with its characteristics (duration, severity, pattern). Format as "Symptom: Duration, Severity, Pattern, Associated factors".
-            
-            3. POSSIBLE CONDITIONS: List exactly 3-5 conditions in order of likelihood with percentage estimates. For each condition include:
-               - Condition name
-               - Likelihood percentage (e.g., 70%)
-               - Urgency level (Requires immediate attention, Requires prompt attention, Routine care recommended, Self-care appropriate)
-               - Brief explanation of why this matches symptoms (one sentence)
-               - Key symptoms supporting this diagnosis
-            
-            4. WARNING SIGNS: List 4-6 specific symptoms that would require immediate medical attention.
-            
-            5. RECOMMENDED NEXT STEPS: Provide clear guidance with specific timeframes (e.g., "within 24 hours," "within 1 week") and urgency levels.
-            
-            6. SELF-CARE: Provide 4-6 practical, evidence-based recommendations with specific details.
-            
-            7. PREVENTION: List 4-6 targeted measures to prevent recurrence or worsening.
-            
-            Use plain, direct language. Avoid medical jargon when possible. Do not use markdown formatting.
-            """
-            
-            # Generate content with optimized parameters
-            response = self.model.generate_content(
-                prompt,
-                generation_config=self.generation_config
+            return await asyncio.wait_for(
+                self._generate_assessment_now_async(name, age, biological_sex, symptoms, answers, candidates),
+                timeout
             )
+        except asyncio.TimeoutError:
+            print(f"Gemini assessment exceeded {timeout:.2f}s deadline, using fallback")
+            return self._generate_fallback_assessment(name, symptoms, age, biological_sex, answers, reason="timeout")
+    
+    def stream_assessment(self, name, age, biological_sex, symptoms, answers, timeout=None, candidates=None):
+        """Yield report sections as soon as the streamed model output completes them
+        
+        Events are dicts: {"event": "section", "section": ..., "data": ...} for each
+        finished section, then a final {"event": "report", "data": sections}.
+        Closing the generator cancels the underlying model stream.
+        """
+        if not self.use_model() or not self.guard.admit():
+            yield from self.report_events(self._generate_fallback_assessment(name, symptoms, age, biological_sex, answers, reason=self._shed_reason()))
+            return
+        
+        prompt, current_date = self._build_prompt(name, age, biological_sex, symptoms, answers, candidates)
+        chunks = queue.Queue()
+        cancelled = threading.Event()
+        
+        def produce():
+            started = time.monotonic()
+            received = 0
+            try:
+                response = self.model.generate_content(
+                    prompt,
+                    generation_config=self.generation_config,
+                    stream=True
+                )
+                for chunk in response:
+                    if cancelled.is_set():
+                        break
+                    received += len(chunk.text)
+                    chunks.put(("text", chunk.text))
+                else:
+                    chunks.put(("done", None))
+            except Exception as e:
+                self.guard.finish(False, started)
+                MODEL_SECONDS.observe(time.monotonic() - started, kind="stream", outcome="error")
+                chunks.put(("error", e))
+            else:
+                self.guard.finish(True, started)
+                MODEL_SECONDS.observe(time.monotonic() - started, kind="stream", outcome="success")
+            OUTPUT_TOKENS.inc((received + 3) // 4, kind="stream")
+        
+        timeout = timeout or self.timeout
+        self._executor.submit(produce)
+        deadline = time.monotonic() + timeout
+        text = ""
+        pending = ""
+        current_section = "summary"
+        emitted = set()
+        parser = IncrementalReportParser() if self.output_format == 'json' else None
+        structured = parser is not None
+        
+        try:
+            while True:
+                remaining = deadline - time.monotonic()
+                try:
+                    kind, payload = chunks.get(timeout=max(remaining, 0))
+                except queue.Empty:
+                    print(f"Gemini stream exceeded {timeout:.2f}s deadline, using fallback")
+                    yield from self.report_events(self._generate_fallback_assessment(name, symptoms, age, biological_sex, answers, reason="timeout"), skip=emitted)
+                    return
+                
+                if kind == "error":
+                    print(f"Error streaming assessment: {payload}")
+                    yield from self.report_events(self._generate_fallback_assessment(name, symptoms, age, biological_sex, answers, reason="error"), skip=emitted)
+                    return
+                
+                if kind == "done":
+                    text += pending
+                    sections = self._parse_report(text, parser)
+                    self._add_report_metadata(sections, current_date)
+                    yield from self.report_events(sections, skip=emitted)
+                    return
+                
+                if structured:
+                    text += payload
+                    try:
+                        members = parser.feed(payload)
+                    except ValueError as e:
+                        # Keep what was parsed; the remaining sections get defaults at the end
+                        print(f"Malformed JSON in streamed report: {e}")
+                        structured = False
+                        members = []
+                    for key, value in members:
+                        if key in self.REPORT_SECTIONS and key not in emitted:
+                            emitted.add(key)
+                            yield {"event": "section", "section": key, "data": section_value(key, value)}
+                    continue
+                if parser is not None:
+                    text += payload
+                    continue
+                
+                pending += payload
+                *lines, pending = pending.split('\n')
+                for line in lines:
+                    text += line + '\n'
+                    header = self._detect_section(self._clean_line(line.strip()))
+                    if header and header != current_section:
+                        # A new header closes the previous section
+                        if current_section not in emitted:
+                            parsed = self._parse_assessment_into_sections(text)
+                            emitted.add(current_section)
+                            yield {"event": "section", "section": current_section, "data": parsed[current_section]}
+                        current_section = header
+        finally:
+            cancelled.set()
+    
+    def report_events(self, sections, skip=()):
+        """Yield the section events not yet sent, followed by the full report"""
+        for section in self.REPORT_SECTIONS:
+            if section not in skip and section in sections:
+                yield {"event": "section", "section": section, "data": sections[section]}
+        yield {"event": "report", "data": sections}
+    
+    def _generate_assessment_now(self, name, age, biological_sex, symptoms, answers, candidates=None):
+        """Generate a health assessment based on symptoms and answers"""
+        try:
+            prompt, current_date = self._build_prompt(name, age, biological_sex, symptoms, answers, candidates)
+        except Exception as e:
+            self.guard.abandon()
+            print(f"Error building assessment prompt: {e}")
+            return self._generate_fallback_assessment(name, symptoms, age, biological_sex, answers, reason="error")
+        
+        started = time.monotonic()
+        try:
+            # Generate content with optimized parameters; runs in the slot admitted by submit_assessment
+            try:
+                response = self.guard.call(lambda: self.model.generate_content(
+                    prompt,
+                    generation_config=self.generation_config
+                ))
+            except Exception:
+                MODEL_SECONDS.observe(time.monotonic() - started, kind="sync", outcome="error")
+                raise
+            MODEL_SECONDS.observe(time.monotonic() - started, kind="sync", outcome="success")
             
-            # Process the response into a structured format
-            assessment_text = response.text
-            
-            # Parse the text into enhanced sections
-            sections = self._parse_assessment_into_sections(assessment_text)
-            
-            # Add metadata to the report
-            sections["report_date"] = current_date
-            sections["report_id"] = f"HA-{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}"
+            # Parse the response into enhanced sections
+            return self._report_from_response(response, current_date, "sync")
             
-            return sections
+        except Exception as e:
+            print(f"Error generating assessment: {e}")
+            return self._generate_fallback_assessment(name, symptoms, age, biological_sex, answers, reason="error")
+    
+    async def _generate_assessment_now_async(self, name, age, biological_sex, symptoms, answers, candidates=None):
+        """Async counterpart of _generate_assessment_now, run in a slot admitted by generate_assessment_async"""
+        try:
+            prompt, current_date = self._build_prompt(name, age, biological_sex, symptoms, answers, candidates)
+        except Exception as e:
+            self.guard.abandon()
+            print(f"Error building assessment prompt: {e}")
+            return self._generate_fallback_assessment(name, symptoms, age, biological_sex, answers, reason="error")
+        
+        started = time.monotonic()
+        try:
+            try:
+                response = await self.guard.call_async(lambda: self.model.generate_content(
+                    prompt,
+                    generation_config=self.generation_config
+                ), self._executor)
+            except asyncio.CancelledError:
+                MODEL_SECONDS.observe(time.monotonic() - started, kind="async", outcome="timeout")
+                raise
+            except Exception:
+                MODEL_SECONDS.observe(time.monotonic() - started, kind="async", outcome="error")
+                raise
+            MODEL_SECONDS.observe(time.monotonic() - started, kind="async", outcome="success")
+            return self._report_from_response(response, current_date, "async")
             
         except Exception as e:
             print(f"Error generating assessment: {e}")
-            return self._generate_fallback_assessment(name, symptoms)
+            return self._generate_fallback_assessment(name, symptoms, age, biological_sex, answers, reason="error")
+    
+    def _report_from_response(self, response, current_date, kind):
+        """Parse a complete model response into report sections"""
+        assessment_text = response.text
+        OUTPUT_TOKENS.inc(estimate_tokens(assessment_text), kind=kind)
+        sections = self._parse_report(assessment_text)
+        self._add_report_metadata(sections, current_date)
+        return sections
+    
+    def _parse_report(self, text, parser=None):
+        """Parse a complete model response, using the line parser when no JSON report is found
+        
+        parser is the IncrementalReportParser that already consumed text while
+        streaming. Sections of a truncated or malformed JSON report that did
+        parse are kept and the rest get defaults, rather than discarding the
+        response.
+        """
+        if self.output_format == 'json':
+            if parser is None:
+                parser = IncrementalReportParser()
+                try:
+                    parser.feed(text)
+                except ValueError as e:
+                    print(f"Malformed JSON in report: {e}")
+            if parser.values:
+                if not parser.done:
+                    print(f"Incomplete JSON report, keeping {len(parser.values)} parsed sections")
+                PARSED_REPORTS.inc(parser="json" if parser.done else "json_partial")
+                return self._complete_sections(build_sections(parser.values))
+        PARSED_REPORTS.inc(parser="text")
+        return self._parse_assessment_into_sections(text)
+    
+    def _complete_sections(self, sections):
+        """Fill empty next steps, prevention, warning sign and self-care sections with defaults"""
+        if not sections["next_steps"]:
+            sections["next_steps"] = self._generate_fallback_section("next_steps")
+        if not sections["prevention"]:
+            sections["prevention"] = self._generate_basic_prevention(sections["possible_conditions"])
+        for section in ["warning_signs", "self_care"]:
+            if not sections[section]:
+                sections[section] = self._generate_fallback_section(section, symptoms=sections["possible_conditions"])
+        return sections
+    
+    def _add_report_metadata(self, sections, current_date):
+        """Add report date and id to parsed sections"""
+        sections["report_date"] = current_date
+        sections["report_id"] = f"HA-{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}"
+    
+    def _build_prompt(self, name, age, biological_sex, symptoms, answers, candidates=None):
+        """Build the assessment prompt and return it with the report date"""
+        # Get current date for the report
+        current_date = datetime.datetime.now().strftime("%B %d, %Y")
+        
+        prompt, tokens = self.prompt_builder.build(
+            name, age, biological_sex, symptoms, answers, candidates,
+            self._format_instructions(name), current_date
+        )
+        PROMPT_TOKENS.observe(tokens)
+        return prompt, current_date
+    
+    def _format_instructions(self, name):
+        """Describe the report layout the model must follow for the configured output format"""
+        if self.output_format == 'json':
+            schema_str = json.dumps(REPORT_SCHEMA, separators=(',', ':'))
+            instructions = f"""FORMAT YOUR RESPONSE AS ONE JSON OBJECT matching this JSON schema, with the members in this order:
+        {schema_str}
+        
+        - summary: Begin with "Assessment for {name}:" followed by a concise paragraph (3-4 sentences) analyzing likely causes of symptoms based on patient profile. Focus on clinical relevance.
+        - symptom_analysis: One string per reported symptom, formatted as "Symptom: Duration, Severity, Pattern, Associated factors".
+        - possible_conditions: Exactly 3-5 conditions in order of likelihood. likelihood is a percentage estimate (e.g., 70), urgency is one of immediate, prompt, routine or self-care, explanation is one sentence on why this matches the symptoms, and supporting_symptoms lists the key symptoms supporting this diagnosis.
+        - warning_signs: 4-6 specific symptoms that would require immediate medical attention.
+        - next_steps: Clear guidance with specific timeframes (e.g., "within 24 hours," "within 1 week") and urgency levels.
+        - self_care: 4-6 practical, evidence-based recommendations with specific details.
+        - prevention: 4-6 targeted measures to prevent recurrence or worsening.
+        
+        Output only the JSON object, without code fences or any text before or after it."""
+        else:
+            instructions = f"""FORMAT YOUR RESPONSE WITH THESE EXACT SECTIONS:
+        
+        1. SUMMARY: Begin with "Assessment for {name}:" followed by a concise paragraph (3-4 sentences) analyzing likely causes of symptoms based on patient profile. Focus on clinical relevance.
+        
+        2. SYMPTOM ANALYSIS: List each reported symptom with its characteristics (duration, severity, pattern). Format as "Symptom: Duration, Severity, Pattern, Associated factors".
+        
+        3. POSSIBLE CONDITIONS: List exactly 3-5 conditions in order of likelihood with percentage estimates. For each condition include:
+           - Condition name
+           - Likelihood percentage (e.g., 70%)
+           - Urgency level (Requires immediate attention, Requires prompt attention, Routine care recommended, Self-care appropriate)
+           - Brief explanation of why this matches symptoms (one sentence)
+           - Key symptoms supporting this diagnosis
+        
+        4. WARNING SIGNS: List 4-6 specific symptoms that would require immediate medical attention.
+        
+        5. RECOMMENDED NEXT STEPS: Provide clear guidance with specific timeframes (e.g., "within 24 hours," "within 1 week") and urgency levels.
+        
+        6. SELF-CARE: Provide 4-6 practical, evidence-based recommendations with specific details.
+        
+        7. PREVENTION: List 4-6 targeted measures to prevent recurrence or worsening."""
+        
+        # Source indentation would only cost prompt tokens
+        return re.sub(r'\n {8}', '\n', instructions)
     
     def _parse_assessment_into_sections(self, text):
         """Parse the assessment text into structured sections with enhanced organization"""
@@ -154,32 +455,12 @@ class AIService:
                 continue
             
             # Clean up markdown formatting
-            line = re.sub(r'\*\*(.*?)\*\*', r'\1', line)  # Remove bold markers
-            line = re.sub(r'\*(.*?)\*', r'\1', line)      # Remove italic markers
-            line = re.sub(r'^\d+\.\s+', '', line)         # Remove numbered list markers
+            line = self._clean_line(line)
             
             # Check for section headers
-            lower_line = line.lower()
-            if "summary" in lower_line and len(line) < 30:
-                current_section = "summary"
-                continue
-            elif "symptom analysis" in lower_line:
-                current_section = "symptom_analysis"
-                continue
-            elif "possible conditions" in lower_line or "conditions" in lower_line and "possible" in lower_line:
-                current_section = "possible_conditions"
-                continue
-            elif "warning signs" in lower_line or "red flags" in lower_line:
-                current_section = "warning_signs"
-                continue
-            elif "next steps" in lower_line or "recommended" in lower_line and "steps" in lower_line:
-                current_section = "next_steps"
-                continue
-            elif "self-care" in lower_line or "self care" in lower_line:
-                current_section = "self_care"
-                continue
-            elif "prevention" in lower_line or "preventive" in lower_line:
-                current_section = "prevention"
+            header = self._detect_section(line)
+            if header:
+                current_section = header
                 continue
             
             # Process content based on section
@@ -255,16 +536,37 @@ class AIService:
         if supporting_symptoms:
             sections["supporting_symptoms"] = supporting_symptoms
         
-        # If prevention section is empty, generate a basic one
-        if not sections["prevention"]:
-            sections["prevention"] = self._generate_basic_prevention(sections["possible_conditions"])
-        
         # Ensure we have at least some content in each section
-        for section in ["warning_signs", "self_care"]:
-            if not sections[section]:
-                sections[section] = self._generate_fallback_section(section, symptoms=sections["possible_conditions"])
-        
-        return sections
+        return self._complete_sections(sections)
+    
+    def _clean_line(self, line):
+        """Strip markdown emphasis and list numbering from a report line"""
+        line = re.sub(r'\*\*(.*?)\*\*', r'\1', line)  # Remove bold markers
+        line = re.sub(r'\*(.*?)\*', r'\1', line)      # Remove italic markers
+        line = re.sub(r'^\d+\.\s+', '', line)         # Remove numbered list markers
+        return line
+    
+    def _detect_section(self, line):
+        """Return the report section a header line opens, or None for content lines"""
+        # List items mention urgency levels like "self-care appropriate"; they are never headers
+        if line.startswith(("- ", "• ", "* ")):
+            return None
+        lower_line = line.lower()
+        if "summary" in lower_line and len(line) < 30:
+            return "summary"
+        elif "symptom analysis" in lower_line:
+            return "symptom_analysis"
+        elif "possible conditions" in lower_line or "conditions" in lower_line and "possible" in lower_line:
+            return "possible_conditions"
+        elif "warning signs" in lower_line or "red flags" in lower_line:
+            return "warning_signs"
+        elif "next steps" in lower_line or "recommended" in lower_line and "steps" in lower_line:
+            return "next_steps"
+        elif "self-care" in lower_line or "self care" in lower_line:
+            return "self_care"
+        elif "prevention" in lower_line or "preventive" in lower_line:
+            return "prevention"
+        return None
     
     def _generate_basic_prevention(self, conditions):
         """Generate basic prevention measures based on conditions"""
@@ -329,16 +631,33 @@ class AIService:
                 "Use a cool compress if experiencing localized pain or inflammation",
                 "Monitor your symptoms and keep a log of any changes"
             ]
+        elif section_type == "next_steps":
+            return "Schedule an appointment with your primary care physician within the next 7 days to discuss your symptoms. If your symptoms worsen significantly before your appointment, consider seeking urgent care services."
         return []
     
-    def _generate_fallback_assessment(self, name, symptoms):
+    def _generate_fallback_assessment(self, name, symptoms, age=None, biological_sex=None, answers=None, reason="unavailable"):
         """Generate a comprehensive fallback assessment when AI is unavailable"""
+        FALLBACK_REPORTS.inc(reason=reason)
+        if self.local_reports is not None:
+            sections = None
+            try:
+                sections = self.local_reports.build(name, age, biological_sex, symptoms, answers)
+            except Exception as e:
+                print(f"Error building local assessment: {e}")
+            if sections:
+                self._complete_sections(sections)
+                self._add_report_metadata(sections, datetime.datetime.now().strftime("%B %d, %Y"))
+                sections["is_fallback"] = True
+                sections["source"] = "local"
+                return sections
+        
         main_symptom = symptoms[0] if symptoms else "your symptoms"
         current_date = datetime.datetime.now().strftime("%B %d, %Y")
         
         return {
             "report_date": current_date,
             "report_id": f"HA-{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}",
+            "is_fallback": True,
             "summary": f"Assessment for {name}: Based on your report of {main_symptom}, we recommend consulting with a healthcare professional for a proper diagnosis. Your symptoms could be related to several possible conditions that require professional evaluation.",
             "symptom_analysis": [
                 f"{main_symptom}: Duration unknown, Severity unknown, Pattern unknown"
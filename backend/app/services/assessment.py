@@ -1,20 +1,70 @@
 import json
 import os
 import re
-from difflib import SequenceMatcher
+import hashlib
+from collections import defaultdict
 from datetime import datetime
+from app.services.search_index import SymptomSearchIndex
+from app.services.condition_index import ConditionIndex
+from app.services.scoring import DifferentialScorer
+from app.services.canonical import SymptomCanonicalizer, canonical_text, similarity_score
+from app.services.question_flow import QuestionFlowGraph
+from app.services.knowledge_base import create_knowledge_base_snapshot
 
 class AssessmentService:
     """Service for handling symptom assessment logic with enhanced analysis capabilities"""
     
+    # Answer-id prefixes of the adaptive (flow-less) questions
+    ADAPTIVE_TOPICS = (
+        'duration', 'severity', 'pattern', 'trigger',
+        'additional_symptoms', 'impact', 'relief', 'worsening'
+    )
+    
+    # Urgency levels, most urgent first, whose symptoms count as red flags
+    RED_FLAG_URGENCY = ("immediate", "prompt")
+    
+    # Everything _build_knowledge_base derives from the data files
+    KNOWLEDGE_BASE_ATTRIBUTES = (
+        'symptoms', 'conditions', 'questions', 'body_regions', 'symptom_relationships',
+        '_symptom_name_to_id_map', '_symptom_id_to_obj_map', '_symptom_to_question_flow',
+        '_search_index', '_canonicalizer', '_condition_index', '_scorer', '_red_flag_keys',
+        'question_flows', 'fingerprint'
+    )
+    
+    # Knowledge base sources under app/data
+    DATA_FILES = (
+        'symptoms.json', 'conditions.json', 'questions.json',
+        'body_regions.json', 'symptom_relationships.json'
+    )
+    
     def __init__(self):
         """Initialize the assessment service with medical data"""
+        # Compiled structures come from the binary snapshot, rebuilt when a source changes
+        self.knowledge_base = create_knowledge_base_snapshot(self.data_paths())
+        if self.knowledge_base is None:
+            state = self._build_knowledge_base()
+        else:
+            state = self.knowledge_base.load(self, self._build_knowledge_base)
+        self.__dict__.update(state)
+        
+        # Validation problems of the question-flow graph are reported once at load
+        for problem in self.question_flows.problems:
+            print(f"Warning: question flow {problem}")
+    
+    def _build_knowledge_base(self):
+        """Load the JSON sources and build every derived structure; returns them by attribute name"""
         self.symptoms = self._load_json_data('symptoms.json')
         self.conditions = self._load_json_data('conditions.json')
         self.questions = self._load_json_data('questions.json')
         self.body_regions = self._load_json_data('body_regions.json')
         self.symptom_relationships = self._load_json_data('symptom_relationships.json')
         
+        # Same data, same fingerprint, in every worker; keys results derived from this version
+        sources = (self.symptoms, self.conditions, self.questions, self.body_regions, self.symptom_relationships)
+        self.fingerprint = hashlib.sha256(
+            json.dumps(sources, sort_keys=True, separators=(',', ':')).encode('utf-8')
+        ).hexdigest()[:16]
+        
         # Cache for frequently accessed data
         self._symptom_name_to_id_map = {s['name'].lower(): s['id'] for s in self.symptoms if 'name' in s and 'id' in s}
         self._symptom_id_to_obj_map = {s['id']: s for s in self.symptoms if 'id' in s}
@@ -22,92 +72,56 @@ class AssessmentService:
         for symptom_key, flow in self.questions.items():
             if 'symptom_name' in flow:
                 self._symptom_to_question_flow[flow['symptom_name'].lower()] = symptom_key
-        
-        self._last_question = None
-        self._asked_questions_texts = set()
-        self._asked_questions_ids = set()
+        self._search_index = SymptomSearchIndex(self.symptoms)
+        
+        # Free text is fuzzy-matched once per distinct string and memoized
+        self._canonicalizer = SymptomCanonicalizer()
+        self._canonicalizer.register(
+            'symptoms',
+            [(s['name'], s['id']) for s in self.symptoms if 'name' in s and 'id' in s],
+            threshold=0.8,  # Higher threshold for name matching
+            aliases=[(syn, s['id']) for s in self.symptoms if 'id' in s for syn in s.get('synonyms', [])]
+        )
+        self._canonicalizer.register(
+            'flows',
+            [(flow['symptom_name'], key) for key, flow in self.questions.items() if 'symptom_name' in flow],
+            threshold=0.7
+        )
+        
+        # Symptom -> condition index and co-occurrence ranking over canonical keys
+        self._condition_index = ConditionIndex(self.conditions, self._condition_symptom_key, self._condition_symptom_label)
+        self._scorer = DifferentialScorer(self._condition_index, self._symptom_key)
+        self._red_flag_keys = self._emergency_symptom_keys()
+        
+        # Compiled question-flow graph
+        self.question_flows = self._load_question_flows('questions.json')
+        return {name: getattr(self, name) for name in self.KNOWLEDGE_BASE_ATTRIBUTES}
 
+    def current(self):
+        """The service version to use for a whole operation; a KnowledgeBaseReloader returns its pinned version"""
+        return self
+    
     def search_symptoms(self, query):
-        query = query.lower()
-        exact_matches = []
-        contains_matches = []
-        similar_matches = []
-        synonym_matches = []
-        
-        normalized_query = re.sub(r'[^\w\s]', '', query).strip()
-        query_words = set(normalized_query.split())
-        
-        for symptom in self.symptoms:
-            symptom_name = symptom['name'].lower()
-            normalized_name = re.sub(r'[^\w\s]', '', symptom_name).strip()
-            symptom_words = set(normalized_name.split())
-            
-            if normalized_query == normalized_name:
-                exact_matches.append(symptom)
-                continue
-            if normalized_query in normalized_name:
-                contains_matches.append(symptom)
-                continue
-            if 'synonyms' in symptom:
-                for synonym in symptom['synonyms']:
-                    normalized_synonym = re.sub(r'[^\w\s]', '', synonym.lower()).strip()
-                    if normalized_query in normalized_synonym or normalized_synonym in normalized_query:
-                        synonym_matches.append(symptom)
-                        break
-                if symptom in synonym_matches:
-                    continue
-            word_overlap = len(query_words.intersection(symptom_words))
-            if word_overlap > 0:
-                symptom['_word_overlap'] = word_overlap / max(len(query_words), len(symptom_words))
-                contains_matches.append(symptom)
-                continue
-            similarity = self._similarity_score(normalized_query, normalized_name)
-            if similarity > 0.7:
-                symptom['_similarity'] = similarity
-                similar_matches.append(symptom)
-        
-        contains_matches.sort(key=lambda x: x.get('_word_overlap', 0), reverse=True)
-        similar_matches.sort(key=lambda x: x.get('_similarity', 0), reverse=True)
-        
-        results = exact_matches + contains_matches + synonym_matches + similar_matches
-        
-        unique_results = []
-        seen_ids = set()
-        for item in results:
-            if item['id'] not in seen_ids:
-                seen_ids.add(item['id'])
-                item.pop('_similarity', None)
-                item.pop('_word_overlap', None)
-                unique_results.append(item)
-        
-        return unique_results[:15]
+        """Search the symptom catalog using the prebuilt search index"""
+        return self._search_index.search(query or '')
 
-    def _similarity_score(self, a, b):
-        if not a or not b:
-            return 0
-        direct_ratio = SequenceMatcher(None, a, b).ratio()
-        a_words = set(a.split())
-        b_words = set(b.split())
-        if not a_words or not b_words:
-            return direct_ratio
-        intersection = len(a_words.intersection(b_words))
-        union = len(a_words.union(b_words))
-        jaccard = intersection / union if union > 0 else 0
-        prefix_matches = 0
-        for a_word in a_words:
-            for b_word in b_words:
-                min_length = min(len(a_word), len(b_word))
-                if min_length >= 3:
-                    prefix_length = min(min_length, 5)
-                    if a_word[:prefix_length] == b_word[:prefix_length]:
-                        prefix_matches += 1
-                        break
-        prefix_score = prefix_matches / max(len(a_words), len(b_words)) if max(len(a_words), len(b_words)) > 0 else 0
-        return (direct_ratio * 0.6) + (jaccard * 0.3) + (prefix_score * 0.1)
+    @classmethod
+    def data_paths(cls):
+        """Paths of the JSON sources the knowledge base is built from"""
+        return [cls._data_path(name) for name in cls.DATA_FILES]
+
+    @staticmethod
+    def _data_path(filename):
+        return os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', filename)
+
+    def _load_question_flows(self, filename):
+        file_path = self._data_path(filename)
+        if not os.path.exists(file_path):
+            return QuestionFlowGraph({})
+        return QuestionFlowGraph.from_file(file_path)
 
     def _load_json_data(self, filename):
-        data_dir = os.path.join(os.path.dirname(__file__), 'data')
-        file_path = os.path.join(data_dir, filename)
+        file_path = self._data_path(filename)
         if os.path.exists(file_path):
             with open(file_path, 'r') as f:
                 return json.load(f)
@@ -116,137 +130,88 @@ class AssessmentService:
             return {}
         return []
 
-
-
-
-    
-
-    
     def _similarity_score(self, a, b):
         """Calculate similarity between two strings with improved algorithm"""
-        if not a or not b:
-            return 0
-            
-        # Direct comparison
-        direct_ratio = SequenceMatcher(None, a, b).ratio()
-        
-        # Word set comparison (order-independent)
-        a_words = set(a.split())
-        b_words = set(b.split())
-        
-        if not a_words or not b_words:
-            return direct_ratio
-            
-        # Jaccard similarity for word sets
-        intersection = len(a_words.intersection(b_words))
-        union = len(a_words.union(b_words))
-        jaccard = intersection / union if union > 0 else 0
-        
-        # Word prefix matching (for partial word matches)
-        prefix_matches = 0
-        for a_word in a_words:
-            for b_word in b_words:
-                # Check if one word is a prefix of the other (min 3 chars)
-                min_length = min(len(a_word), len(b_word))
-                if min_length >= 3:
-                    prefix_length = min(min_length, 5)  # Check up to 5 chars
-                    if a_word[:prefix_length] == b_word[:prefix_length]:
-                        prefix_matches += 1
-                        break
-        
-        prefix_score = prefix_matches / max(len(a_words), len(b_words)) if max(len(a_words), len(b_words)) > 0 else 0
-        
-        # Combine metrics with appropriate weights
-        return (direct_ratio * 0.6) + (jaccard * 0.3) + (prefix_score * 0.1)
+        return similarity_score(a, b)
     
     def get_symptom_by_name(self, symptom_name):
         """Get symptom object by name with efficient lookup"""
+        symptom_id = self.canonical_symptom_id(symptom_name)
+        if symptom_id is None:
+            return None
+        return self._symptom_id_to_obj_map.get(symptom_id)
+    
+    def canonical_symptom_id(self, symptom_name):
+        """Map free text to a catalog symptom id (memoized), or None"""
         if not symptom_name:
             return None
-            
-        symptom_name_lower = symptom_name.lower()
-        
-        # Direct lookup from cache
-        if symptom_name_lower in self._symptom_name_to_id_map:
-            symptom_id = self._symptom_name_to_id_map[symptom_name_lower]
-            return self._symptom_id_to_obj_map.get(symptom_id)
-        
-        # Fuzzy matching if direct lookup fails
-        best_match = None
-        best_score = 0.8  # Higher threshold for name matching
-        
-        for symptom in self.symptoms:
-            score = self._similarity_score(symptom_name_lower, symptom['name'].lower())
-            if score > best_score:
-                best_score = score
-                best_match = symptom
-                
-        return best_match
+        return self._canonicalizer.match('symptoms', symptom_name)
+    
+    def _symptom_key(self, symptom_name):
+        """Canonical id for catalog symptoms, normalized text for everything else"""
+        return self.canonical_symptom_id(symptom_name) or canonical_text(symptom_name)
+    
+    def _match_keyword_table(self, name, symptom, table, threshold=0.6):
+        """Fuzzy-match a symptom against the keys of a keyword table through the shared memo"""
+        if not self._canonicalizer.has_vocabulary(name):
+            self._canonicalizer.register(name, [(key, key) for key in table], threshold=threshold)
+        return self._canonicalizer.match(name, symptom)
     
     def _find_matching_question_flow(self, symptom):
         """Find the best matching question flow for a symptom"""
-        symptom_lower = symptom.lower()
-        
-        # Direct lookup by symptom name
-        if symptom_lower in self._symptom_to_question_flow:
-            flow_key = self._symptom_to_question_flow[symptom_lower]
-            return flow_key, self.questions[flow_key]
-        
-        # Try to find a close match
-        best_match = None
-        best_score = 0.7  # Threshold for matching
-        best_key = None
-        
-        for key, flow in self.questions.items():
-            if 'symptom_name' in flow:
-                flow_symptom = flow['symptom_name'].lower()
-                score = self._similarity_score(symptom_lower, flow_symptom)
-                if score > best_score:
-                    best_score = score
-                    best_match = flow
-                    best_key = key
-        
-        return best_key, best_match
+        flow_key = self._canonicalizer.match('flows', symptom)
+        if flow_key is None:
+            return None, None
+        return flow_key, self.questions[flow_key]
+    
+    def new_question_tracking(self):
+        """Create the per-session record of asked questions
+        
+        The record lives in the caller's session so the service itself holds no
+        per-user state. Questions are remembered as short hashes of their id and
+        text, which keeps the record small and JSON-serializable.
+        """
+        return {"asked": []}
     
-    def reset_question_tracking(self):
+    def reset_question_tracking(self, tracking):
         """Reset the question tracking to start a new assessment"""
-        self._last_question = None
-        self._asked_questions_texts = set()
-        self._asked_questions_ids = set()
+        tracking["asked"] = []
+    
+    def _question_hashes(self, question):
+        """Hashes identifying a question by id and by text"""
+        hashes = []
+        for field in ('id', 'text'):
+            if field in question:
+                digest = hashlib.blake2b(f"{field}:{question[field]}".encode(), digest_size=6).digest()
+                hashes.append(int.from_bytes(digest, 'big'))
+        return hashes
     
-    def mark_question_asked(self, question):
+    def mark_question_asked(self, tracking, question):
         """Mark a question as asked to prevent repetition"""
         if question:
-            self._last_question = question
-            if 'id' in question:
-                self._asked_questions_ids.add(question['id'])
-            if 'text' in question:
-                self._asked_questions_texts.add(question['text'])
-    
-    def is_question_repeated(self, question):
-        """Check if a question has already been asked"""
+            asked = tracking.setdefault("asked", [])
+            for question_hash in self._question_hashes(question):
+                if question_hash not in asked:
+                    asked.append(question_hash)
+    
+    def forget_question(self, tracking, question):
+        """Unmark a question so it can be asked again, e.g. after going back"""
+        if question:
+            hashes = set(self._question_hashes(question))
+            tracking["asked"] = [h for h in tracking.get("asked", ()) if h not in hashes]
+    
+    def is_question_repeated(self, tracking, question):
+        """Check if a question has already been asked (by id or by text)"""
         if not question:
             return False
-            
-        # Check by ID
-        if 'id' in question and question['id'] in self._asked_questions_ids:
-            return True
-            
-        # Check by text
-        if 'text' in question and question['text'] in self._asked_questions_texts:
-            return True
-            
-        # Check against last question
-        if self._last_question:
-            if 'id' in question and 'id' in self._last_question and question['id'] == self._last_question['id']:
-                return True
-            if 'text' in question and 'text' in self._last_question and question['text'] == self._last_question['text']:
-                return True
-                
-        return False
+        asked = tracking.get("asked", ())
+        return any(question_hash in asked for question_hash in self._question_hashes(question))
     
-    def get_first_question(self, symptom):
+    def get_first_question(self, symptom, tracking=None):
         """Get the first question for a given symptom with improved matching"""
+        if tracking is None:
+            tracking = self.new_question_tracking()
+        
         # Try to find a matching question flow
         flow_key, flow = self._find_matching_question_flow(symptom)
         
@@ -262,7 +227,11 @@ class AssessmentService:
                 )
             
             # Store this as the last question to prevent repetition
-            self.mark_question_asked(question)
+            self.mark_question_asked(tracking, question)
+            
+            # Point the session's cursor at the start of the compiled flow
+            tracking["flow"] = flow_key
+            tracking["node"] = question.get('id')
             
             return question
         
@@ -285,94 +254,65 @@ class AssessmentService:
         }
         
         # Store this as the last question to prevent repetition
-        self.mark_question_asked(default_question)
+        self.mark_question_asked(tracking, default_question)
+        tracking["flow"] = None
         
         return default_question
     
-    def get_next_question(self, symptoms, previous_answers):
+    def get_next_question(self, symptoms, previous_answers, tracking=None):
         """Determine the next question based on symptoms and previous answers with enhanced logic"""
         if not symptoms:
             return None
+        if tracking is None:
+            tracking = self.new_question_tracking()
             
         main_symptom = symptoms[0] if isinstance(symptoms, list) else symptoms
         main_symptom_lower = main_symptom.lower()
         
-        # Find the matching question flow
-        flow_key, flow = self._find_matching_question_flow(main_symptom)
+        # Resolve the symptom's flow once per session; afterwards the cursor
+        # (tracking["flow"], tracking["node"]) points straight into the graph
+        if "flow" not in tracking:
+            flow_key, _ = self._find_matching_question_flow(main_symptom)
+            tracking["flow"] = flow_key
+            tracking["node"] = None
+        flow = self.question_flows.get(tracking["flow"]) if tracking["flow"] else None
         
         # If we have a specific flow for this symptom, use it
-        if flow and 'follow_up_questions' in flow:
-            # Find the last answered question in this flow
-            last_question_id = None
-            last_answer = None
+        if flow is not None:
+            if tracking.get("flow_done"):
+                return None
             
-            # Sort previous answers by their question IDs to find the most recent one
-            # that belongs to our flow
-            for q_id in sorted(previous_answers.keys(), reverse=True):
-                # Check if this question is part of our flow
-                if q_id in flow['follow_up_questions']:
-                    last_question_id = q_id
-                    last_answer = previous_answers[q_id]
-                    break
+            node_id = tracking.get("node")
+            if node_id is None:
+                # The flow has not started yet
+                next_question = flow.first_question()
+            else:
+                next_question = flow.next_question(node_id, previous_answers.get(node_id))
             
-            # If we found a previous question in this flow
-            if last_question_id:
-                next_question_info = flow['follow_up_questions'][last_question_id]
-                
-                # Handle conditional branching
-                if 'condition' in next_question_info:
-                    condition = next_question_info['condition']
-                    condition_met = False
-                    
-                    if 'answer' in condition:
-                        # Single answer condition
-                        condition_met = condition['answer'] == last_answer
-                    elif 'answers' in condition:
-                        # Multiple possible answers condition
-                        condition_met = last_answer in condition['answers']
-                    elif 'contains' in condition:
-                        # Check if answer contains specific text
-                        condition_met = isinstance(last_answer, str) and condition['contains'] in last_answer.lower()
-                    elif 'not_contains' in condition:
-                        # Check if answer does NOT contain specific text
-                        condition_met = not (isinstance(last_answer, str) and condition['not_contains'] in last_answer.lower())
-                    
-                    if condition_met and 'next_question' in next_question_info:
-                        next_question = next_question_info['next_question']
-                        # Check if this is a repeated question
-                        if self.is_question_repeated(next_question):
-                            # Skip to another question or return None
-                            return None
-                        self.mark_question_asked(next_question)
-                        return next_question
-                elif 'next_question' in next_question_info:
-                    # No condition, just return the next question
-                    next_question = next_question_info['next_question']
-                    # Check if this is a repeated question
-                    if self.is_question_repeated(next_question):
-                        # Skip to another question or return None
-                        return None
-                    self.mark_question_asked(next_question)
-                    return next_question
+            # A finished flow (or a branch back to an asked question) ends the symptom questions
+            if next_question is None or self.is_question_repeated(tracking, next_question):
+                tracking["flow_done"] = True
+                return None
             
-            # If we haven't asked the first question yet, start with that
-            if not any(q_id.startswith(flow_key) for q_id in previous_answers.keys()):
-                first_question = flow.get('first_question')
-                if not self.is_question_repeated(first_question):
-                    self.mark_question_asked(first_question)
-                    return first_question
+            tracking["node"] = next_question["id"]
+            self.mark_question_asked(tracking, next_question)
+            return next_question
         
-        # If no specific flow or we've exhausted the flow, use the adaptive questioning approach
+        # If no specific flow, use the adaptive questioning approach
         
         # Determine which questions have been asked and what information we need
-        has_duration = any(q.startswith('duration') for q in previous_answers.keys())
-        has_severity = any(q.startswith('severity') for q in previous_answers.keys())
-        has_pattern = any(q.startswith('pattern') for q in previous_answers.keys())
-        has_triggers = any(q.startswith('trigger') for q in previous_answers.keys())
-        has_additional_symptoms = any(q.startswith('additional_symptoms') for q in previous_answers.keys())
-        has_impact = any(q.startswith('impact') for q in previous_answers.keys())
-        has_relief = any(q.startswith('relief') for q in previous_answers.keys())
-        has_worsening = any(q.startswith('worsening') for q in previous_answers.keys())
+        answered_topics = {
+            topic for q_id in previous_answers
+            for topic in self.ADAPTIVE_TOPICS if q_id.startswith(topic)
+        }
+        has_duration = 'duration' in answered_topics
+        has_severity = 'severity' in answered_topics
+        has_pattern = 'pattern' in answered_topics
+        has_triggers = 'trigger' in answered_topics
+        has_additional_symptoms = 'additional_symptoms' in answered_topics
+        has_impact = 'impact' in answered_topics
+        has_relief = 'relief' in answered_topics
+        has_worsening = 'worsening' in answered_topics
         
         # Get symptom characteristics to customize questions
         symptom_characteristics = self._get_symptom_characteristics(main_symptom)
@@ -387,8 +327,8 @@ class AssessmentService:
                 "text": f"How long have you been experiencing {main_symptom}?",
                 "options": duration_options
             }
-            if not self.is_question_repeated(question):
-                self.mark_question_asked(question)
+            if not self.is_question_repeated(tracking, question):
+                self.mark_question_asked(tracking, question)
                 return question
         
         # 2. Severity is typically the second most important question
@@ -398,8 +338,8 @@ class AssessmentService:
                 "text": f"On a scale from 1 to 10, how would you rate the severity of your {main_symptom}?",
                 "options": ["1 (Very mild)", "2", "3", "4", "5 (Moderate)", "6", "7", "8", "9", "10 (Severe)"]
             }
-            if not self.is_question_repeated(question):
-                self.mark_question_asked(question)
+            if not self.is_question_repeated(tracking, question):
+                self.mark_question_asked(tracking, question)
                 return question
         
         # 3. Pattern helps understand the nature of the symptom
@@ -410,8 +350,8 @@ class AssessmentService:
                 "text": f"How would you describe the pattern of your {main_symptom}?",
                 "options": pattern_options
             }
-            if not self.is_question_repeated(question):
-                self.mark_question_asked(question)
+            if not self.is_question_repeated(tracking, question):
+                self.mark_question_asked(tracking, question)
                 return question
         
         # 4. For severe or persistent symptoms, ask about worsening
@@ -433,8 +373,8 @@ class AssessmentService:
                 "text": f"Has your {main_symptom} gotten worse recently?",
                 "options": ["Yes, significantly worse", "Yes, somewhat worse", "No change", "It's actually improving"]
             }
-            if not self.is_question_repeated(question):
-                self.mark_question_asked(question)
+            if not self.is_question_repeated(tracking, question):
+                self.mark_question_asked(tracking, question)
                 return question
         
         # 5. Ask about additional symptoms to help with diagnosis
@@ -447,8 +387,8 @@ class AssessmentService:
                 "options": related_symptoms + ["None of these"],
                 "multiple_select": True
             }
-            if not self.is_question_repeated(question):
-                self.mark_question_asked(question)
+            if not self.is_question_repeated(tracking, question):
+                self.mark_question_asked(tracking, question)
                 return question
         
         # 6. Ask about triggers to understand potential causes
@@ -462,8 +402,8 @@ class AssessmentService:
                 "options": trigger_options,
                 "multiple_select": True
             }
-            if not self.is_question_repeated(question):
-                self.mark_question_asked(question)
+            if not self.is_question_repeated(tracking, question):
+                self.mark_question_asked(tracking, question)
                 return question
         
         # 7. Ask about impact on daily life
@@ -479,8 +419,8 @@ class AssessmentService:
                     "Completely unable to perform normal activities"
                 ]
             }
-            if not self.is_question_repeated(question):
-                self.mark_question_asked(question)
+            if not self.is_question_repeated(tracking, question):
+                self.mark_question_asked(tracking, question)
                 return question
         
         # 8. Ask about relief measures
@@ -494,25 +434,24 @@ class AssessmentService:
                 "options": relief_options,
                 "multiple_select": True
             }
-            if not self.is_question_repeated(question):
-                self.mark_question_asked(question)
+            if not self.is_question_repeated(tracking, question):
+                self.mark_question_asked(tracking, question)
                 return question
         
         # If we've asked all standard questions, check for symptom-specific questions
         symptom_specific_question = self._get_symptom_specific_question(main_symptom, previous_answers)
-        if symptom_specific_question and not self.is_question_repeated(symptom_specific_question):
-            self.mark_question_asked(symptom_specific_question)
+        if symptom_specific_question and not self.is_question_repeated(tracking, symptom_specific_question):
+            self.mark_question_asked(tracking, symptom_specific_question)
             return symptom_specific_question
         
         # No more questions
-        self._last_question = None
         return None
     
-    def get_related_symptoms(self, symptom):
+    def get_related_symptoms(self, symptom, symptom_id=None):
         """Get symptoms commonly associated with the given symptom with improved relationship detection"""
-        # Get the symptom object
-        symptom_obj = self.get_symptom_by_name(symptom)
-        symptom_id = symptom_obj['id'] if symptom_obj else None
+        # Use the canonical id carried in the session when the caller has one
+        if symptom_id is None:
+            symptom_id = self.canonical_symptom_id(symptom)
         
         # First check if we have relationships defined in our database
         if self.symptom_relationships:
@@ -528,7 +467,7 @@ class AssessmentService:
                         return relationship.get('related_symptoms', [])
         
         # Check for related symptoms based on conditions
-        condition_based_symptoms = self._get_symptoms_from_conditions(symptom)
+        condition_based_symptoms = self._get_symptoms_from_conditions(symptom, symptom_id)
         if condition_based_symptoms:
             return condition_based_symptoms
         
@@ -556,14 +495,7 @@ class AssessmentService:
         default_symptoms = ["Fever", "Fatigue", "Nausea", "Dizziness", "Shortness of breath", "Headache"]
         
         # Find the closest match in our associations dictionary
-        best_match = None
-        best_score = 0.6  # Minimum threshold
-        
-        for key in common_associations:
-            score = self._similarity_score(symptom.lower(), key)
-            if score > best_score:
-                best_score = score
-                best_match = key
+        best_match = self._match_keyword_table('common_associations', symptom, common_associations)
         
         # If we found a good match, return those associations
         if best_match:
@@ -571,48 +503,78 @@ class AssessmentService:
         
         return default_symptoms
     
-    def _get_symptoms_from_conditions(self, symptom):
-        """Extract related symptoms based on conditions that feature the given symptom"""
-        if not self.conditions:
-            return []
-            
-        symptom_lower = symptom.lower()
-        related_symptoms = set()
-        
-        # Find conditions that include this symptom
-        relevant_conditions = []
-        for condition in self.conditions:
-            # Check primary symptoms
-            primary_symptoms = condition.get('primary_symptoms', [])
-            secondary_symptoms = condition.get('secondary_symptoms', [])
-            all_symptoms = primary_symptoms + secondary_symptoms
-            
-            # Check if symptom is in this condition
-            if any(s.lower() == symptom_lower or self._similarity_score(s.lower(), symptom_lower) > 0.8 for s in all_symptoms):
-                relevant_conditions.append(condition)
-                
-            # Also check symptom relationships if available
-            if 'symptom_relationships' in condition:
-                for rel in condition['symptom_relationships']:
-                    if rel.get('symptom', '').lower() == symptom_lower:
-                        relevant_conditions.append(condition)
-                        break
-        
-        # Extract related symptoms from these conditions
-        for condition in relevant_conditions:
-            primary_symptoms = condition.get('primary_symptoms', [])
-            secondary_symptoms = condition.get('secondary_symptoms', [])
-            
-            # Add all symptoms except the original one
-            for s in primary_symptoms + secondary_symptoms:
-                if s.lower() != symptom_lower:
-                    related_symptoms.add(s)
-        
-        # Convert to list and limit to top 8 most common
-        if related_symptoms:
-            return list(related_symptoms)[:8]
-        
-        return []
+    def _get_symptoms_from_conditions(self, symptom, symptom_id=None):
+        """Related symptoms from conditions featuring the given symptom, strongest co-occurrence first"""
+        symptom_key = symptom_id or self._symptom_key(symptom)
+        return self._condition_index.related_symptoms(symptom_key, limit=8)
+    
+    def rank_conditions(self, symptoms, batch=False, top_k=5):
+        """Rank conditions locally from reported symptoms
+        
+        With batch=True, symptoms is a list of symptom lists and one ranking is
+        returned per case; all cases are scored in a single matrix multiply.
+        """
+        symptom_sets = symptoms if batch else [symptoms]
+        rankings = self._scorer.rank(symptom_sets, top_k=top_k)
+        return rankings if batch else rankings[0]
+    
+    def red_flag_symptoms(self, symptoms):
+        """Unreported symptoms of urgent conditions that share a reported symptom
+        
+        Returns (symptom label, condition name, urgency_level) tuples, with the
+        most urgent conditions and their strongest symptoms first.
+        """
+        reported = {self._symptom_key(s) for s in symptoms}
+        urgent = {}
+        for key in reported:
+            for condition, _ in self._condition_index.conditions_for(key):
+                if condition.get('urgency_level') in self.RED_FLAG_URGENCY:
+                    urgent[condition['id']] = condition
+        
+        flags = []
+        for condition in sorted(urgent.values(), key=lambda c: (self.RED_FLAG_URGENCY.index(c['urgency_level']), c['id'])):
+            weights = self._condition_index.condition_weights[condition['id']]
+            for key, _ in sorted(weights.items(), key=lambda item: -item[1]):
+                if key not in reported:
+                    flags.append((self._condition_index.labels[key], condition['name'], condition['urgency_level']))
+        return flags
+    
+    def red_flag_findings(self, findings):
+        """The findings (symptom names or answer options) that mostly point to emergencies"""
+        return [f for f in findings if f and self._symptom_key(f) in self._red_flag_keys]
+    
+    def _emergency_symptom_keys(self):
+        """Symptom keys whose condition weight lies mostly with immediate-urgency conditions"""
+        total = defaultdict(float)
+        emergency = defaultdict(float)
+        for condition_id, weights in self._condition_index.condition_weights.items():
+            urgent = self._condition_index.conditions[condition_id].get('urgency_level') == self.RED_FLAG_URGENCY[0]
+            for key, weight in weights.items():
+                total[key] += weight
+                if urgent:
+                    emergency[key] += weight
+        return {key for key, weight in emergency.items() if weight >= total[key] / 2}
+    
+    def _condition_symptom_key(self, name):
+        """Canonical key for condition symptoms such as 'chest pain/pressure' or 'throbbing headache'"""
+        symptom_id = self.canonical_symptom_id(name)
+        if symptom_id:
+            return symptom_id
+        base = re.sub(r'\(.*?\)', '', name).split('/')[0].strip()
+        # Drop leading qualifiers until a catalog symptom remains
+        words = base.split()
+        for start in range(len(words)):
+            symptom_id = self.canonical_symptom_id(" ".join(words[start:]))
+            if symptom_id:
+                return symptom_id
+        return canonical_text(base)
+    
+    def _condition_symptom_label(self, key, name):
+        """Display label for a condition symptom: catalog name when known"""
+        symptom_obj = self._symptom_id_to_obj_map.get(key)
+        if symptom_obj:
+            return symptom_obj['name']
+        return name[:1].upper() + name[1:]
     
     def _get_symptom_characteristics(self, symptom):
         """Get characteristics of a symptom to customize questions"""
@@ -724,14 +686,7 @@ class AssessmentService:
         }
         
         # Find the best matching symptom
-        best_match = None
-        best_score = 0.6
-        
-        for key in specific_triggers:
-            score = self._similarity_score(symptom.lower(), key)
-            if score > best_score:
-                best_score = score
-                best_match = key
+        best_match = self._match_keyword_table('specific_triggers', symptom, specific_triggers)
         
         # If we found a match, combine common and specific triggers
         if best_match:
@@ -764,14 +719,7 @@ class AssessmentService:
         }
         
         # Find the best matching symptom
-        best_match = None
-        best_score = 0.6
-        
-        for key in specific_measures:
-            score = self._similarity_score(symptom.lower(), key)
-            if score > best_score:
-                best_score = score
-                best_match = key
+        best_match = self._match_keyword_table('specific_measures', symptom, specific_measures)
         
         # If we found a match, combine common and specific measures
         if best_match:
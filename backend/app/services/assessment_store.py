@@ -0,0 +1,302 @@
+import hashlib
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+# Blobs above this size are zlib-compressed, as in the session store
+COMPRESS_THRESHOLD = 512
+
+# Recently committed report hashes whose bodies need not be encoded again
+KNOWN_BODIES = 4096
+
+# Seconds between attempts at a batch whose commit failed; the last failure sends it to the recovery file
+RETRY_DELAYS = (0.05, 0.2, 1.0, 5.0)
+
+# How often an idle writer checks whether the process is exiting
+POLL_INTERVAL = 0.5
+
+
+def _pack(raw):
+    if len(raw) > COMPRESS_THRESHOLD:
+        return b'z' + zlib.compress(raw, 6)
+    return b'j' + raw
+
+
+def _unpack(blob):
+    marker, body = bytes(blob[:1]), bytes(blob[1:])
+    if marker == b'z':
+        body = zlib.decompress(body)
+    return json.loads(body.decode('utf-8'))
+
+
+def _canonical(value):
+    return json.dumps(value, sort_keys=True, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+class SavedAssessmentStore:
+    """Saved assessments in SQLite (WAL mode), written by one group-commit thread
+
+    save() only serializes the assessment and queues it, so request threads
+    never wait on the disk or on compression. The writer thread drains
+    whatever queued up during the previous commit (up to batch_size) into a
+    single transaction. Report bodies are stored once per SHA-256 of their
+    canonical JSON and shared by every assessment with the same report;
+    assessments are looked up by their primary key. Assessments still in
+    the queue are served from memory, so a save is readable immediately in
+    the process that made it.
+
+    An accepted save is not yet on disk: wait(), flush() or close() confirm
+    the commit. A batch whose commit fails is retried after each of
+    RETRY_DELAYS; if it still fails its assessments are appended to the
+    recovery file (path + ".failed.jsonl") and kept readable in memory, and
+    the next start writes that file into the database. The writer is not a
+    daemon thread: it drains the queue before the process exits, and
+    close() does the same on shutdown.
+    """
+
+    def __init__(self, path, batch_size=256, max_pending=10000, retry_delays=RETRY_DELAYS):
+        self.path = path
+        self.recovery_path = path + '.failed.jsonl'
+        self.batch_size = batch_size
+        self.retry_delays = tuple(retry_delays)
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._pending = {}
+        self._failed = {}
+        self._closing = False
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._local = threading.local()
+        self._known_bodies = OrderedDict()
+        self.saved = 0
+        self.deduplicated = 0
+        self.batches = 0
+        self.rejected = 0
+        self.retries = 0
+        self.failed = 0
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._connection()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS report_bodies (hash TEXT PRIMARY KEY, data BLOB NOT NULL)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS saved_assessments ("
+            "id TEXT PRIMARY KEY, created_at REAL NOT NULL, body_hash TEXT, data BLOB NOT NULL)"
+        )
+        conn.commit()
+        self._recover(conn)
+
+        self._writer = threading.Thread(target=self._run, name='assessment-writer')
+        self._writer.start()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # WAL with synchronous=NORMAL syncs at checkpoints, not on every commit
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def save(self, assessment_id, record, body=None):
+        """Queue an assessment for the next group commit; False when the queue is full"""
+        body_hash = body_raw = None
+        if body is not None:
+            body_raw = _canonical(body)
+            body_hash = hashlib.sha256(body_raw).hexdigest()
+        # Serialized now: the record may share objects with a session that keeps changing
+        record_raw = json.dumps(record, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+        item = (assessment_id, time.time(), body_hash, body_raw, record_raw)
+        with self._lock:
+            if self._closing:
+                self.rejected += 1
+                return False
+            try:
+                self._queue.put_nowait(item)
+            except queue.Full:
+                self.rejected += 1
+                return False
+            self._pending[assessment_id] = item
+        return True
+
+    def get(self, assessment_id):
+        """(record, body) for a saved assessment, body None when it had no report; None if unknown"""
+        with self._lock:
+            item = self._pending.get(assessment_id) or self._failed.get(assessment_id)
+        if item is not None:
+            _, _, _, body_raw, record_raw = item
+            return json.loads(record_raw), json.loads(body_raw) if body_raw is not None else None
+        row = self._connection().execute(
+            "SELECT a.data, b.data FROM saved_assessments a "
+            "LEFT JOIN report_bodies b ON b.hash = a.body_hash WHERE a.id = ?",
+            (assessment_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return _unpack(row[0]), _unpack(row[1]) if row[1] is not None else None
+
+    def wait(self, assessment_id, timeout=None):
+        """Wait for a queued assessment: True once committed, False if its commit failed, None on timeout"""
+        with self._idle:
+            if not self._idle.wait_for(lambda: assessment_id not in self._pending, timeout):
+                return None
+            return assessment_id not in self._failed
+
+    def flush(self, timeout=None):
+        """Wait until every queued assessment is committed or failed; False on timeout"""
+        with self._idle:
+            return self._idle.wait_for(lambda: not self._pending, timeout)
+
+    def close(self):
+        """Commit what is queued and stop the writer thread; safe to call more than once"""
+        with self._lock:
+            self._closing = True
+        self._writer.join()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "saved": self.saved,
+                "pending": len(self._pending),
+                "deduplicated": self.deduplicated,
+                "batches": self.batches,
+                "average_batch": round(self.saved / self.batches, 1) if self.batches else 0,
+                "rejected": self.rejected,
+                "retries": self.retries,
+                "failed": self.failed,
+                "unrecovered": len(self._failed)
+            }
+
+    def _run(self):
+        conn = self._connection()
+        while True:
+            try:
+                item = self._queue.get(timeout=POLL_INTERVAL)
+            except queue.Empty:
+                # The interpreter joins this thread before atexit handlers run, so notice the exit here
+                if self._closing or not threading.main_thread().is_alive():
+                    break
+                continue
+            batch = [item]
+            # Everything that queued up during the last commit goes into this one
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._write(conn, batch)
+        conn.close()
+
+    def _write(self, conn, batch):
+        with self._lock:
+            bodies = {
+                body_hash: body_raw for _, _, body_hash, body_raw, _ in batch
+                if body_hash is not None and body_hash not in self._known_bodies
+            }
+        # Batches stay in _pending, and readable, while they are retried
+        for delay in self.retry_delays + (None,):
+            try:
+                inserted = self._commit(conn, bodies, batch)
+                break
+            except sqlite3.Error as e:
+                if delay is None:
+                    print(f"Error writing {len(batch)} saved assessments, moving them to {self.recovery_path}: {e}")
+                    self._keep_failed(batch)
+                    return
+                print(f"Error writing {len(batch)} saved assessments, retrying in {delay}s: {e}")
+                with self._lock:
+                    self.retries += 1
+                time.sleep(delay)
+        with self._idle:
+            for assessment_id, *_ in batch:
+                self._pending.pop(assessment_id, None)
+            self.saved += len(batch)
+            self.batches += 1
+            self.deduplicated += sum(body_hash is not None for _, _, body_hash, _, _ in batch) - inserted
+            for body_hash in bodies:
+                self._known_bodies[body_hash] = True
+                self._known_bodies.move_to_end(body_hash)
+            while len(self._known_bodies) > KNOWN_BODIES:
+                self._known_bodies.popitem(last=False)
+            self._idle.notify_all()
+
+    def _commit(self, conn, bodies, batch):
+        """Write one batch in a transaction; returns how many report bodies were new"""
+        inserted = 0
+        with conn:
+            if bodies:
+                inserted = conn.executemany(
+                    "INSERT OR IGNORE INTO report_bodies (hash, data) VALUES (?, ?)",
+                    [(body_hash, _pack(body_raw)) for body_hash, body_raw in bodies.items()]
+                ).rowcount
+            conn.executemany(
+                "INSERT OR REPLACE INTO saved_assessments (id, created_at, body_hash, data) VALUES (?, ?, ?, ?)",
+                [(assessment_id, created_at, body_hash, _pack(record_raw))
+                 for assessment_id, created_at, body_hash, _, record_raw in batch]
+            )
+        return inserted
+
+    def _keep_failed(self, batch):
+        """Append a batch that could not be committed to the recovery file and keep it readable"""
+        try:
+            with open(self.recovery_path, 'a', encoding='utf-8') as f:
+                for assessment_id, created_at, body_hash, body_raw, record_raw in batch:
+                    f.write(json.dumps({
+                        "id": assessment_id,
+                        "created_at": created_at,
+                        "body_hash": body_hash,
+                        "body": body_raw.decode('utf-8') if body_raw is not None else None,
+                        "record": record_raw.decode('utf-8')
+                    }, ensure_ascii=False) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+        except OSError as e:
+            print(f"Error writing {self.recovery_path}, {len(batch)} saved assessments are only in memory: {e}")
+        with self._idle:
+            for item in batch:
+                self._pending.pop(item[0], None)
+                self._failed[item[0]] = item
+            self.failed += len(batch)
+            self._idle.notify_all()
+
+    def _recover(self, conn):
+        """Commit the assessments a previous run left in the recovery file"""
+        try:
+            with open(self.recovery_path, encoding='utf-8') as f:
+                entries = [json.loads(line) for line in f if line.strip()]
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            print(f"Error reading {self.recovery_path}: {e}")
+            return
+        batch = [
+            (entry["id"], entry["created_at"], entry["body_hash"],
+             entry["body"].encode('utf-8') if entry["body"] is not None else None,
+             entry["record"].encode('utf-8'))
+            for entry in entries
+        ]
+        bodies = {body_hash: body_raw for _, _, body_hash, body_raw, _ in batch if body_hash is not None}
+        try:
+            self._commit(conn, bodies, batch)
+        except sqlite3.Error as e:
+            print(f"Error recovering {len(batch)} saved assessments from {self.recovery_path}: {e}")
+            self._failed.update((item[0], item) for item in batch)
+            return
+        os.remove(self.recovery_path)
+        print(f"Recovered {len(batch)} saved assessments from {self.recovery_path}")
+
+
+def create_saved_assessment_store():
+    """Create the saved-assessment store configured through environment variables"""
+    default_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'instance', 'assessments.db')
+    return SavedAssessmentStore(
+        os.environ.get('SAVED_ASSESSMENTS_DB_PATH', default_path),
+        batch_size=int(os.environ.get('SAVED_ASSESSMENTS_BATCH_SIZE', 256)),
+        max_pending=int(os.environ.get('SAVED_ASSESSMENTS_MAX_PENDING', 10000))
+    )
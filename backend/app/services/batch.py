@@ -0,0 +1,139 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+class TokenBucket:
+    """Thread-safe token bucket; acquire() blocks until a token is available"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst or max(1.0, rate))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def parse_jsonl(lines):
+    """Yield (line number, case dict or None, error) for each non-blank JSONL line"""
+    for number, line in enumerate(lines, start=1):
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            case = json.loads(line)
+        except ValueError as e:
+            yield number, None, f"Invalid JSON: {e}"
+            continue
+        if not isinstance(case, dict):
+            yield number, None, "Each line must be a JSON object"
+            continue
+        yield number, case, None
+
+
+class BatchAssessor:
+    """Runs JSONL triage cases through a bounded worker pool
+
+    Identical cases (same key) are assessed once and the result is shared.
+    At most max_workers cases run at a time and at most window results wait
+    to be emitted, and the assess callable receives a shared TokenBucket to
+    throttle model calls. Results come back in input order, one dict per
+    case, followed by a summary dict; each is ready to be written as JSONL.
+    """
+
+    def __init__(self, assess, case_key, validate=None, max_workers=4, rate=2.0, burst=None, window=None):
+        self.assess = assess
+        self.case_key = case_key
+        self.validate = validate
+        self.max_workers = max_workers
+        self.window = window or max_workers * 4
+        self.limiter = TokenBucket(rate, burst)
+
+    def run(self, lines):
+        pending = deque()
+        unique = {}
+        stats = {"cases": 0, "unique": 0, "duplicates": 0, "errors": 0}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='batch') as executor:
+            for number, case, error in parse_jsonl(lines):
+                stats["cases"] += 1
+                if error is None and self.validate:
+                    error = self.validate(case)
+                if error is not None:
+                    pending.append((number, case, None, None, error))
+                else:
+                    key = self.case_key(case)
+                    first = unique.get(key)
+                    if first is None:
+                        future = executor.submit(self.assess, case, self.limiter)
+                        unique[key] = (number, future)
+                        stats["unique"] += 1
+                        pending.append((number, case, future, None, None))
+                    else:
+                        stats["duplicates"] += 1
+                        pending.append((number, case, first[1], first[0], None))
+
+                # Emit finished results in order; block on the oldest once the window is full
+                while pending and (len(pending) > self.window or self._ready(pending[0])):
+                    yield self._result(pending.popleft(), stats)
+
+            while pending:
+                yield self._result(pending.popleft(), stats)
+
+        yield {"summary": stats}
+
+    @staticmethod
+    def _ready(entry):
+        future = entry[2]
+        return future is None or future.done()
+
+    def _result(self, entry, stats):
+        number, case, future, duplicate_of, error = entry
+        result = {"line": number}
+        if case is not None and 'id' in case:
+            result["id"] = case['id']
+        if error is None:
+            try:
+                result["report"] = future.result()
+            except Exception as e:
+                error = str(e)
+        if error is not None:
+            stats["errors"] += 1
+            result["status"] = "error"
+            result["error"] = error
+            return result
+        result["status"] = "ok"
+        if duplicate_of is not None:
+            result["duplicate_of"] = duplicate_of
+        return result
+
+
+def create_batch_assessor(assess, case_key, validate=None):
+    """Create a BatchAssessor configured through environment variables"""
+    return BatchAssessor(
+        assess,
+        case_key,
+        validate=validate,
+        max_workers=int(os.environ.get('BATCH_MAX_WORKERS', 4)),
+        rate=float(os.environ.get('BATCH_RATE_PER_SECOND', 2)),
+        burst=float(os.environ.get('BATCH_RATE_BURST', 0)) or None
+    )
@@ -0,0 +1,274 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class MemoryCacheBackend:
+    """In-process LRU cache backend with per-entry expiry"""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class FileCacheBackend:
+    """Filesystem cache backend storing one JSON document per key
+
+    File modification times double as the LRU clock: reads touch the file and
+    the oldest files are removed once the directory holds more than
+    max_entries documents.
+    """
+
+    def __init__(self, cache_dir, max_entries=1024):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self.evictions = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key):
+        safe_key = "".join(c if c.isalnum() or c in "-_" else "_" for c in key)
+        return os.path.join(self.cache_dir, f"{safe_key}.json")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'r') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get("expires_at") is not None and entry["expires_at"] <= time.time():
+            self.delete(key)
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return entry.get("value")
+
+    def set(self, key, value, ttl=None):
+        entry = {
+            "expires_at": time.time() + ttl if ttl else None,
+            "value": value
+        }
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(entry, f, separators=(',', ':'))
+        os.replace(tmp_path, path)
+        self._evict()
+
+    def _evict(self):
+        with self._lock:
+            try:
+                files = [
+                    os.path.join(self.cache_dir, name)
+                    for name in os.listdir(self.cache_dir)
+                    if name.endswith('.json')
+                ]
+            except OSError:
+                return
+            excess = len(files) - self.max_entries
+            if excess <= 0:
+                return
+            files.sort(key=lambda p: os.path.getmtime(p) if os.path.exists(p) else 0)
+            for path in files[:excess]:
+                try:
+                    os.remove(path)
+                    self.evictions += 1
+                except OSError:
+                    pass
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def clear(self):
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.json'):
+                try:
+                    os.remove(os.path.join(self.cache_dir, name))
+                except OSError:
+                    pass
+
+    def __len__(self):
+        try:
+            return sum(1 for name in os.listdir(self.cache_dir) if name.endswith('.json'))
+        except OSError:
+            return 0
+
+
+class RedisCacheBackend:
+    """Cache backend for any client speaking the Redis GET/SET/DEL/SCAN commands
+
+    Size bounding is delegated to the server (run it with
+    maxmemory-policy allkeys-lru); entries expire through SET's EX option.
+    Counting entries would mean walking the keyspace, so the backend has no
+    size and the cache reports none.
+    """
+
+    # Keys deleted per DEL command by clear()
+    DELETE_BATCH = 500
+
+    def __init__(self, client, prefix="hcb:cache:"):
+        self.client = client
+        self.prefix = prefix
+        self.evictions = 0
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        if raw is None:
+            return None
+        if isinstance(raw, bytes):
+            raw = raw.decode('utf-8')
+        return json.loads(raw)
+
+    def set(self, key, value, ttl=None):
+        payload = json.dumps(value, separators=(',', ':'))
+        if ttl:
+            self.client.set(self.prefix + key, payload, ex=int(ttl))
+        else:
+            self.client.set(self.prefix + key, payload)
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def clear(self):
+        """Delete this prefix's keys, walking them with SCAN rather than blocking the server on KEYS"""
+        batch = []
+        for key in self.client.scan_iter(match=self.prefix + "*", count=1000):
+            batch.append(key)
+            if len(batch) >= self.DELETE_BATCH:
+                self.client.delete(*batch)
+                batch = []
+        if batch:
+            self.client.delete(*batch)
+
+
+class AssessmentCache:
+    """Result cache for generated assessment reports with hit/miss accounting"""
+
+    def __init__(self, backend, ttl=3600):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached value for key, or None on a miss"""
+        try:
+            value = self.backend.get(key)
+        except Exception as e:
+            print(f"Error reading assessment cache: {e}")
+            value = None
+            with self._lock:
+                self.errors += 1
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key, value):
+        """Store value under key for the configured TTL"""
+        try:
+            self.backend.set(key, value, self.ttl)
+        except Exception as e:
+            print(f"Error writing assessment cache: {e}")
+            with self._lock:
+                self.errors += 1
+
+    def delete(self, key):
+        self.backend.delete(key)
+
+    def clear(self):
+        """Drop every entry; the counters are exported as monotonic and keep counting"""
+        self.backend.clear()
+
+    def stats(self):
+        """Return hit/miss counters and backend size"""
+        with self._lock:
+            hits, misses, errors = self.hits, self.misses, self.errors
+        lookups = hits + misses
+        try:
+            size = len(self.backend) if hasattr(self.backend, '__len__') else None
+        except Exception:
+            size = None
+        return {
+            "backend": type(self.backend).__name__,
+            "hits": hits,
+            "misses": misses,
+            "errors": errors,
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+            "size": size,
+            "evictions": getattr(self.backend, "evictions", 0),
+            "ttl": self.ttl
+        }
+
+
+def create_cache_backend(kind, max_entries=1024, cache_dir=None, redis_url=None, redis_client=None):
+    """Build a cache backend by name ('memory', 'filesystem' or 'redis')"""
+    kind = (kind or "memory").lower()
+    if kind == "memory":
+        return MemoryCacheBackend(max_entries=max_entries)
+    if kind == "filesystem":
+        cache_dir = cache_dir or os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'cache')
+        return FileCacheBackend(cache_dir, max_entries=max_entries)
+    if kind == "redis":
+        if redis_client is None:
+            import redis
+            redis_client = redis.Redis.from_url(redis_url or "redis://localhost:6379/0")
+        return RedisCacheBackend(redis_client)
+    raise ValueError(f"Unknown cache backend: {kind}")
+
+
+def create_assessment_cache():
+    """Create the assessment cache configured through environment variables"""
+    backend = create_cache_backend(
+        os.environ.get('ASSESSMENT_CACHE_BACKEND', 'memory'),
+        max_entries=int(os.environ.get('ASSESSMENT_CACHE_MAX_ENTRIES', 1024)),
+        cache_dir=os.environ.get('ASSESSMENT_CACHE_DIR'),
+        redis_url=os.environ.get('REDIS_URL')
+    )
+    return AssessmentCache(backend, ttl=int(os.environ.get('ASSESSMENT_CACHE_TTL', 3600)))
@@ -0,0 +1,146 @@
+import threading
+from collections import OrderedDict
+from difflib import SequenceMatcher
+from app.services.search_index import normalize_text
+
+
+def similarity_score(a, b):
+    """Calculate similarity between two strings with improved algorithm"""
+    if not a or not b:
+        return 0
+
+    # Direct comparison
+    direct_ratio = SequenceMatcher(None, a, b).ratio()
+
+    # Word set comparison (order-independent)
+    a_words = set(a.split())
+    b_words = set(b.split())
+
+    if not a_words or not b_words:
+        return direct_ratio
+
+    # Jaccard similarity for word sets
+    intersection = len(a_words.intersection(b_words))
+    union = len(a_words.union(b_words))
+    jaccard = intersection / union if union > 0 else 0
+
+    # Word prefix matching (for partial word matches)
+    prefix_matches = 0
+    for a_word in a_words:
+        for b_word in b_words:
+            # Check if one word is a prefix of the other (min 3 chars)
+            min_length = min(len(a_word), len(b_word))
+            if min_length >= 3:
+                prefix_length = min(min_length, 5)  # Check up to 5 chars
+                if a_word[:prefix_length] == b_word[:prefix_length]:
+                    prefix_matches += 1
+                    break
+
+    prefix_score = prefix_matches / max(len(a_words), len(b_words)) if max(len(a_words), len(b_words)) > 0 else 0
+
+    # Combine metrics with appropriate weights
+    return (direct_ratio * 0.6) + (jaccard * 0.3) + (prefix_score * 0.1)
+
+
+def canonical_text(text):
+    """Normalized form of free text used as the memo key"""
+    return " ".join(normalize_text(text or "").split())
+
+
+class _Vocabulary:
+    __slots__ = ("exact", "labels", "threshold")
+
+    def __init__(self, labels_to_values, threshold, aliases=None):
+        # Fuzzy matching compares against the lowercased labels, as before;
+        # exact lookups also accept normalized labels and aliases
+        self.labels = [(label.lower(), value) for label, value in labels_to_values]
+        self.exact = {}
+        for label, value in self.labels:
+            self.exact.setdefault(label, value)
+            self.exact.setdefault(canonical_text(label), value)
+        for alias, value in aliases or ():
+            self.exact.setdefault(canonical_text(alias), value)
+        self.threshold = threshold
+
+
+class SymptomCanonicalizer:
+    """Maps raw user text to canonical values once, shared by every lookup
+
+    Each vocabulary pairs labels with the value a match resolves to (symptom
+    ids, question-flow keys, keys of the keyword tables). Results, including
+    misses, are memoized in a bounded LRU keyed on (vocabulary, normalized
+    text), so the same free text is only fuzzy-matched once per process.
+    """
+
+    def __init__(self, max_entries=4096):
+        self.max_entries = max_entries
+        self._vocabularies = {}
+        self._memo = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def register(self, name, labels_to_values, threshold, aliases=None):
+        """Register a vocabulary of (label, value) pairs matched above threshold"""
+        self._vocabularies[name] = _Vocabulary(labels_to_values, threshold, aliases)
+        with self._lock:
+            for key in [k for k in self._memo if k[0] == name]:
+                del self._memo[key]
+
+    def __getstate__(self):
+        # The memo is kept (it holds the fuzzy matches worth snapshotting); the lock and counters are not
+        state = self.__dict__.copy()
+        del state['_lock']
+        state['hits'] = state['misses'] = 0
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def has_vocabulary(self, name):
+        return name in self._vocabularies
+
+    def match(self, name, text):
+        """Return the value whose label best matches text, or None"""
+        if not text:
+            return None
+        key = (name, canonical_text(text))
+        with self._lock:
+            if key in self._memo:
+                self._memo.move_to_end(key)
+                self.hits += 1
+                return self._memo[key]
+            self.misses += 1
+
+        value = self._resolve(self._vocabularies[name], text)
+
+        with self._lock:
+            self._memo[key] = value
+            while len(self._memo) > self.max_entries:
+                self._memo.popitem(last=False)
+        return value
+
+    def _resolve(self, vocabulary, text):
+        text_lower = text.lower()
+        for candidate in (text_lower, canonical_text(text)):
+            if candidate in vocabulary.exact:
+                return vocabulary.exact[candidate]
+
+        best_value = None
+        best_score = vocabulary.threshold
+        for label, value in vocabulary.labels:
+            score = similarity_score(text_lower, label)
+            if score > best_score:
+                best_score = score
+                best_value = value
+        return best_value
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "size": len(self._memo)
+        }
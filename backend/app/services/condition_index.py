@@ -0,0 +1,75 @@
+from collections import defaultdict
+
+# Strengths used when a condition lists a symptom without a symptom_relationships entry
+PRIMARY_SYMPTOM_STRENGTH = 0.6
+SECONDARY_SYMPTOM_STRENGTH = 0.3
+
+
+class ConditionIndex:
+    """Inverted index from canonical symptom keys to conditions
+
+    Built once from conditions.json. Each condition contributes a weight per
+    symptom: the symptom_relationships strength when one is given, otherwise a
+    default for primary and secondary symptoms. From those weights the index
+    precomputes, per symptom, the strength-ordered list of conditions and a
+    ranked co-occurrence list of other symptoms (sum over shared conditions of
+    the product of both weights).
+    """
+
+    def __init__(self, conditions, symptom_key, symptom_label=None):
+        self.conditions = {c['id']: c for c in conditions if 'id' in c}
+        self.labels = {}
+        self.condition_weights = {}
+        self._by_symptom = defaultdict(list)
+        self._related = {}
+
+        for condition_id, condition in self.conditions.items():
+            weights = {}
+            for names, default in (
+                (condition.get('primary_symptoms', []), PRIMARY_SYMPTOM_STRENGTH),
+                (condition.get('secondary_symptoms', []), SECONDARY_SYMPTOM_STRENGTH),
+            ):
+                for name in names:
+                    key = symptom_key(name)
+                    self.labels.setdefault(key, symptom_label(key, name) if symptom_label else name)
+                    weights[key] = max(weights.get(key, 0.0), default)
+            for rel in condition.get('symptom_relationships', []):
+                name = rel.get('symptom')
+                if not name:
+                    continue
+                key = symptom_key(name)
+                self.labels.setdefault(key, symptom_label(key, name) if symptom_label else name)
+                weights[key] = float(rel.get('strength', weights.get(key, PRIMARY_SYMPTOM_STRENGTH)))
+            self.condition_weights[condition_id] = weights
+            for key, strength in weights.items():
+                self._by_symptom[key].append((condition_id, strength))
+
+        for postings in self._by_symptom.values():
+            postings.sort(key=lambda item: (-item[1], item[0]))
+
+        co_occurrence = defaultdict(lambda: defaultdict(float))
+        for weights in self.condition_weights.values():
+            for a, weight_a in weights.items():
+                for b, weight_b in weights.items():
+                    if a != b:
+                        co_occurrence[a][b] += weight_a * weight_b
+        for key, neighbours in co_occurrence.items():
+            self._related[key] = sorted(
+                neighbours.items(),
+                key=lambda item: (-item[1], self.labels[item[0]])
+            )
+
+    def conditions_for(self, key):
+        """(condition, strength) pairs for a symptom key, strongest first"""
+        return [(self.conditions[cid], strength) for cid, strength in self._by_symptom.get(key, ())]
+
+    def related(self, key, limit=8):
+        """(label, weight) pairs of symptoms co-occurring with key, strongest first"""
+        return [(self.labels[other], weight) for other, weight in self._related.get(key, ())[:limit]]
+
+    def related_symptoms(self, key, limit=8):
+        """Labels of the symptoms that most often accompany key"""
+        return [label for label, _ in self.related(key, limit)]
+
+    def __contains__(self, key):
+        return key in self._by_symptom
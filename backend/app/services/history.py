@@ -0,0 +1,160 @@
+import datetime
+import json
+import os
+import re
+import sys
+import threading
+import time
+
+ROLES = ("user", "assistant")
+
+# Strings up to this length (option answers, short replies) are shared between sessions
+INTERN_MAX_LENGTH = 64
+
+_SAFE_SESSION_ID = re.compile(r'^[A-Za-z0-9_-]+$')
+
+
+class ConversationLog:
+    """Bounded, compact conversation transcripts stored inside sessions
+
+    A session holds {"started": epoch seconds, "turns": [...], "spilled": n}.
+    Each turn is [seconds since start, role index, template key, text]:
+    messages that are a static intake prompt keep only its key, everything
+    else keeps its (interned when short) text. When more than max_turns pile
+    up, the oldest half is appended to a per-session log under spill_dir
+    (or counted as "dropped" when it cannot be written), so long or abandoned
+    sessions stop growing in the session store. The full
+    transcript in the original dict format is only rebuilt by transcript().
+    """
+
+    PURGE_INTERVAL = 200
+
+    def __init__(self, templates=None, max_turns=64, spill_dir=None, ttl=7200):
+        self.max_turns = max(2, max_turns)
+        self.spill_dir = spill_dir
+        self.ttl = ttl
+        self._templates = {}
+        self._template_keys = {}
+        for key, template in (templates or {}).items():
+            if template.static:
+                message = template.render()["message"]
+                self._templates[key] = message
+                self._template_keys.setdefault(message, key)
+        self._lock = threading.Lock()
+        self._spills = 0
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+
+    def new(self):
+        """Empty history for a new session"""
+        return {"started": round(time.time(), 3), "turns": [], "spilled": 0}
+
+    def append(self, session_id, history, role, message):
+        """Record one message, spilling the oldest turns once the buffer is full"""
+        message = "" if message is None else str(message)
+        key = self._template_keys.get(message)
+        if key is not None:
+            turn = [round(time.time() - history["started"], 3), ROLES.index(role), key, None]
+        else:
+            if len(message) <= INTERN_MAX_LENGTH:
+                message = sys.intern(message)
+            turn = [round(time.time() - history["started"], 3), ROLES.index(role), None, message]
+        history["turns"].append(turn)
+        if len(history["turns"]) > self.max_turns:
+            self._spill(session_id, history)
+
+    def transcript(self, session_id, history):
+        """The full conversation as {"role", "content", "timestamp"} dicts, oldest first"""
+        turns = self._read_spilled(session_id, history) + history["turns"]
+        return [self._materialize(history["started"], turn) for turn in turns]
+
+    def discard(self, session_id):
+        """Delete the spilled turns of a session that is being thrown away"""
+        path = self._path(session_id)
+        if path is None:
+            return
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"Error removing conversation log {path}: {e}")
+
+    def purge_expired(self):
+        """Remove spill logs untouched for longer than the session ttl; returns how many"""
+        if not self.spill_dir:
+            return 0
+        cutoff = time.time() - self.ttl
+        removed = 0
+        for entry in os.scandir(self.spill_dir):
+            try:
+                if entry.is_file() and entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+                    removed += 1
+            except OSError:
+                continue
+        return removed
+
+    def _spill(self, session_id, history):
+        count = len(history["turns"]) - self.max_turns // 2
+        path = self._path(session_id)
+        written = False
+        if path is not None:
+            lines = "".join(json.dumps(turn, separators=(',', ':')) + "\n" for turn in history["turns"][:count])
+            try:
+                with open(path, "a", encoding="utf-8") as f:
+                    f.write(lines)
+                written = True
+            except OSError as e:
+                print(f"Error spilling conversation history to {path}: {e}")
+        del history["turns"][:count]
+        if written:
+            history["spilled"] += count
+        else:
+            # Nowhere to keep them: the buffer stays bounded and the loss is recorded
+            history["dropped"] = history.get("dropped", 0) + count
+            return
+        with self._lock:
+            self._spills += 1
+            purge = self._spills % self.PURGE_INTERVAL == 0
+        if purge:
+            self.purge_expired()
+
+    def _read_spilled(self, session_id, history):
+        if not history["spilled"]:
+            return []
+        path = self._path(session_id)
+        turns = []
+        if path is not None:
+            try:
+                with open(path, encoding="utf-8") as f:
+                    turns = [json.loads(line) for line in f if line.strip()]
+            except (OSError, ValueError) as e:
+                print(f"Error reading conversation log {path}: {e}")
+        # Only the turns this copy of the session spilled, in case an older copy wrote more
+        return turns[:history["spilled"]]
+
+    def _materialize(self, started, turn):
+        offset, role, key, text = turn
+        return {
+            "role": ROLES[role],
+            "content": self._templates.get(key, "") if key is not None else text,
+            "timestamp": datetime.datetime.fromtimestamp(started + offset).strftime("%Y-%m-%d %H:%M:%S")
+        }
+
+    def _path(self, session_id):
+        if not self.spill_dir or not session_id or not _SAFE_SESSION_ID.match(session_id):
+            return None
+        return os.path.join(self.spill_dir, f"{session_id}.jsonl")
+
+
+def create_conversation_log(templates=None):
+    """Create the conversation log configured through environment variables"""
+    default_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'instance', 'conversations')
+    spill_dir = os.environ.get('CONVERSATION_SPILL_DIR', default_dir)
+    return ConversationLog(
+        templates,
+        max_turns=int(os.environ.get('CONVERSATION_MAX_TURNS', 64)),
+        spill_dir=spill_dir if spill_dir.lower() not in ('', 'none', 'off') else None,
+        ttl=int(os.environ.get('SESSION_TTL', 7200))
+    )
@@ -0,0 +1,513 @@
+import asyncio
+import contextvars
+from types import MappingProxyType
+
+INFO_OPTION = "What information will you collect?"
+NO_ADDITIONAL_SYMPTOMS = "None of these"
+OTHER_SYMPTOMS = "Other symptoms"
+
+# Answered states kept for go_back(); older ones are forgotten so looping sessions stay small
+MAX_STATE_HISTORY = 128
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def _thaw(value):
+    if isinstance(value, MappingProxyType):
+        return {k: _thaw(v) for k, v in value.items()}
+    if isinstance(value, tuple):
+        return [_thaw(v) for v in value]
+    return value
+
+
+class _FormatValues(dict):
+    def __missing__(self, key):
+        return ""
+
+
+class PromptTemplate:
+    """Immutable bot response, rendered into a fresh dict for every turn"""
+
+    __slots__ = ("_fields", "_formatted")
+
+    def __init__(self, message, progress, **fields):
+        fields = {"message": message, **fields, "progress": progress}
+        object.__setattr__(self, "_fields", _freeze(fields))
+        object.__setattr__(self, "_formatted", "{" in message)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("PromptTemplate is immutable")
+
+    @property
+    def static(self):
+        """Whether every render produces the same message"""
+        return not self._formatted
+
+    def render(self, values=None):
+        response = _thaw(self._fields)
+        if self._formatted:
+            response["message"] = response["message"].format_map(_FormatValues(values or {}))
+        return response
+
+
+class Transition:
+    """What answering a state does: validate, store, act, then pick the next state
+
+    next is a state name or a callable (session, value) returning a state name
+    or a (state, prompt key) pair when the next state has a prompt variant.
+    validate returns (value, error prompt key or None).
+    """
+
+    __slots__ = ("store", "next", "validate", "action")
+
+    def __init__(self, next, store=None, validate=None, action=None):
+        self.next = next
+        self.store = store
+        self.validate = validate
+        self.action = action
+
+
+def _is_yes(value):
+    return isinstance(value, str) and value.lower() == "yes"
+
+
+def _store(session, path, value):
+    target = session
+    for key in path[:-1]:
+        target = target.setdefault(key, {})
+    target[path[-1]] = value
+
+
+def _parse_age(value):
+    try:
+        age = int(value)
+    except (TypeError, ValueError):
+        return None, "age_not_number"
+    if age < 0 or age > 120:
+        return None, "age_out_of_range"
+    return age, None
+
+
+def _set_unless_yes(path, value=None):
+    """Action storing value (or the answer itself) when the answer is not yes"""
+    def action(session, answer):
+        if not _is_yes(answer):
+            _store(session, path, answer if value is None else value)
+    return action
+
+
+def _add_additional_symptoms(session, answer):
+    if answer in (NO_ADDITIONAL_SYMPTOMS, OTHER_SYMPTOMS):
+        return
+    if isinstance(answer, list):
+        session["symptoms"].extend(answer)
+    else:
+        session["symptoms"].extend(s.strip() for s in answer.split(','))
+
+
+def _add_other_symptoms(session, answer):
+    # Remembered so going back removes only what this step added
+    session["other_symptoms_start"] = len(session["symptoms"])
+    session["symptoms"].extend(s.strip() for s in answer.split(','))
+
+
+def _keep_primary_symptom(session):
+    del session["symptoms"][1:]
+
+
+def _drop_other_symptoms(session):
+    del session["symptoms"][session.pop("other_symptoms_start", len(session["symptoms"])):]
+
+
+_HEIGHT_WEIGHT_PROMPT = dict(
+    message="What is your height and weight? This helps assess your body mass index (BMI), which can be relevant for certain conditions.",
+    input_type="text",
+    placeholder="e.g., 5'10\", 160 lbs or 178 cm, 73 kg"
+)
+_IMPACT_OPTIONS = [
+    "Not at all",
+    "Slightly limiting",
+    "Moderately limiting",
+    "Severely limiting",
+    "Completely unable to perform normal activities"
+]
+
+# Prompt shown on entering each state; keys other than state names are variants
+PROMPTS = {
+    "introduction": PromptTemplate(
+        "Hi, I'm your health assistant. I'll ask you several detailed questions about your symptoms to provide a comprehensive assessment. This is not a substitute for professional medical advice, but I can help guide you. Shall we begin?",
+        0,
+        options=["Yes, let's start", INFO_OPTION]
+    ),
+    "start_new": PromptTemplate(
+        "Starting a new health assessment. I'll ask you several detailed questions about your symptoms to provide a comprehensive assessment. This is not a substitute for professional medical advice, but I can help guide you. Shall we begin?",
+        0,
+        options=["Yes, let's start", INFO_OPTION]
+    ),
+    "introduction_info": PromptTemplate(
+        "I'll ask about your personal details (name, age, sex), medical history, current symptoms, their severity and duration, and lifestyle factors. This helps me provide a more accurate assessment. All information is kept confidential. Would you like to proceed?",
+        0,
+        options=["Yes, let's start", "No, maybe later"]
+    ),
+    "name": PromptTemplate(
+        "Great! First, what's your name? This helps me personalize our conversation.",
+        5,
+        input_type="text"
+    ),
+    "age": PromptTemplate(
+        "Nice to meet you, {name}. How old are you? Your age helps me understand which conditions might be more relevant to you.",
+        8,
+        input_type="number"
+    ),
+    "age_out_of_range": PromptTemplate("Please enter a valid age between 0 and 120.", 8, input_type="number"),
+    "age_not_number": PromptTemplate("Please enter a valid number for your age.", 8, input_type="number"),
+    "biological_sex": PromptTemplate(
+        "What is your biological sex? This is important as certain medical conditions affect biological sexes differently.",
+        12,
+        options=["Female", "Male", "Intersex"],
+        info_button={
+            "title": "Why is this important?",
+            "content": "Biological sex affects how symptoms present and which conditions are more likely. For example, heart attack symptoms often differ between males and females."
+        }
+    ),
+    "pregnancy": PromptTemplate(
+        "Are you currently pregnant or is there a possibility you might be pregnant?",
+        16,
+        options=["Yes", "No", "Possibly", "I'm not sure"]
+    ),
+    "height_weight": PromptTemplate(progress=16, **_HEIGHT_WEIGHT_PROMPT),
+    "height_weight_after_pregnancy": PromptTemplate(progress=20, **_HEIGHT_WEIGHT_PROMPT),
+    "medical_history_intro": PromptTemplate(
+        "Now I'll ask about your medical history. This information helps provide context for your current symptoms. Do you have any diagnosed medical conditions?",
+        24,
+        options=["Yes", "No"]
+    ),
+    "medical_history_conditions": PromptTemplate(
+        "Please select any conditions you've been diagnosed with:",
+        28,
+        options=[
+            "Diabetes", "High blood pressure", "Heart disease", "Asthma",
+            "COPD", "Cancer", "Thyroid disorder", "Autoimmune disease",
+            "Kidney disease", "Liver disease", "Mental health condition",
+            "Neurological disorder", "Other condition"
+        ],
+        multiple_select=True
+    ),
+    "medical_history_other": PromptTemplate(
+        "You mentioned having another condition. Could you please specify what it is?",
+        32,
+        input_type="text"
+    ),
+    "medications": PromptTemplate(
+        "Are you currently taking any medications, including prescription, over-the-counter, supplements, or herbal remedies?",
+        32,
+        options=["Yes", "No"]
+    ),
+    "medications_list": PromptTemplate(
+        "Please list the medications you're taking. Include the name, dosage if known, and how often you take them.",
+        36,
+        input_type="text",
+        placeholder="e.g., Lisinopril 10mg daily, Vitamin D 1000IU daily"
+    ),
+    "allergies": PromptTemplate(
+        "Do you have any allergies to medications, foods, or environmental factors?",
+        40,
+        options=["Yes", "No"]
+    ),
+    "allergies_list": PromptTemplate(
+        "Please list your allergies and any reactions you experience:",
+        44,
+        input_type="text",
+        placeholder="e.g., Penicillin (rash), Peanuts (anaphylaxis)"
+    ),
+    "family_history": PromptTemplate(
+        "Do any medical conditions run in your family? Family history can be relevant for many health issues.",
+        48,
+        options=["Yes", "No", "I don't know"]
+    ),
+    "family_history_details": PromptTemplate(
+        "Please select any conditions that run in your immediate family (parents, siblings, children):",
+        52,
+        options=[
+            "Heart disease", "Diabetes", "Cancer", "High blood pressure",
+            "Stroke", "Mental health conditions", "Autoimmune disorders",
+            "Other condition"
+        ],
+        multiple_select=True
+    ),
+    "lifestyle_smoking": PromptTemplate(
+        "Do you smoke tobacco or use e-cigarettes/vaping products?",
+        56,
+        options=["Currently smoke", "Used to smoke", "Never smoked", "Use e-cigarettes/vape"]
+    ),
+    "lifestyle_alcohol": PromptTemplate(
+        "How often do you consume alcoholic beverages?",
+        60,
+        options=["Never", "Occasionally", "Weekly", "Several times per week", "Daily"]
+    ),
+    "lifestyle_exercise": PromptTemplate(
+        "How would you describe your physical activity level?",
+        64,
+        options=["Sedentary (little to no exercise)", "Light (1-3 days/week)", "Moderate (3-5 days/week)", "Active (6-7 days/week)", "Very active (multiple times daily)"]
+    ),
+    "lifestyle_diet": PromptTemplate(
+        "How would you describe your diet?",
+        68,
+        options=["Balanced diet", "Vegetarian", "Vegan", "Keto/low-carb", "High protein", "Restricted due to allergies/conditions", "Irregular eating patterns"]
+    ),
+    "lifestyle_stress": PromptTemplate(
+        "How would you rate your current stress level?",
+        72,
+        options=["Low", "Moderate", "High", "Very high"]
+    ),
+    "lifestyle_sleep": PromptTemplate(
+        "How many hours of sleep do you typically get per night?",
+        76,
+        options=["Less than 5 hours", "5-6 hours", "7-8 hours", "More than 8 hours", "Irregular sleep pattern"]
+    ),
+    "symptom_entry": PromptTemplate(
+        "Now, let's focus on why you're seeking help today. What's the main symptom that's bothering you?",
+        80,
+        input_type="symptom_search",
+        placeholder="e.g., headache, cough, stomach pain"
+    ),
+    "other_symptoms": PromptTemplate(
+        "Please describe any other symptoms you're experiencing:",
+        94,
+        input_type="text"
+    ),
+    "symptom_impact": PromptTemplate(
+        "How much are your symptoms affecting your daily activities?",
+        94,
+        options=_IMPACT_OPTIONS
+    ),
+    "previous_treatment": PromptTemplate(
+        "Have you tried any treatments or remedies for these symptoms?",
+        98,
+        options=["No treatment tried", "Over-the-counter medication", "Prescription medication", "Home remedies", "Rest/lifestyle changes", "Other"],
+        multiple_select=True
+    ),
+    "results": PromptTemplate(
+        "Thank you for providing all this information. I now have enough details to generate your health assessment report.",
+        99,
+        options=["View my assessment report"]
+    ),
+    "unknown_state": PromptTemplate(
+        "I'm not sure how to proceed. Let's start over.",
+        0,
+        options=["Start over"]
+    ),
+}
+
+TRANSITIONS = {
+    "introduction": Transition(
+        next=lambda session, answer: ("introduction", "introduction_info") if answer == INFO_OPTION else "name"
+    ),
+    "name": Transition("age", store=("gathered_info", "name")),
+    "age": Transition("biological_sex", store=("gathered_info", "age"), validate=_parse_age),
+    "biological_sex": Transition(
+        next=lambda session, answer: (
+            "pregnancy"
+            if isinstance(answer, str) and answer.lower() == "female" and 12 <= session["gathered_info"].get("age", 0) <= 55
+            else "height_weight"
+        ),
+        store=("gathered_info", "biological_sex")
+    ),
+    "pregnancy": Transition(("height_weight", "height_weight_after_pregnancy"), store=("gathered_info", "pregnancy_status")),
+    "height_weight": Transition("medical_history_intro", store=("gathered_info", "height_weight")),
+    "medical_history_intro": Transition(
+        next=lambda session, answer: "medical_history_conditions" if _is_yes(answer) else "medications"
+    ),
+    "medical_history_conditions": Transition(
+        next=lambda session, answer: "medical_history_other" if "Other condition" in answer else "medications",
+        store=("gathered_info", "medical_history", "conditions")
+    ),
+    "medical_history_other": Transition("medications", store=("gathered_info", "medical_history", "other_condition")),
+    "medications": Transition(
+        next=lambda session, answer: "medications_list" if _is_yes(answer) else "allergies",
+        action=_set_unless_yes(("gathered_info", "medications"), "None")
+    ),
+    "medications_list": Transition("allergies", store=("gathered_info", "medications")),
+    "allergies": Transition(
+        next=lambda session, answer: "allergies_list" if _is_yes(answer) else "family_history",
+        action=_set_unless_yes(("gathered_info", "allergies"), "None")
+    ),
+    "allergies_list": Transition("family_history", store=("gathered_info", "allergies")),
+    "family_history": Transition(
+        next=lambda session, answer: "family_history_details" if _is_yes(answer) else "lifestyle_smoking",
+        action=_set_unless_yes(("gathered_info", "family_history"))
+    ),
+    "family_history_details": Transition("lifestyle_smoking", store=("gathered_info", "family_history")),
+    "lifestyle_smoking": Transition("lifestyle_alcohol", store=("gathered_info", "lifestyle_factors", "smoking")),
+    "lifestyle_alcohol": Transition("lifestyle_exercise", store=("gathered_info", "lifestyle_factors", "alcohol")),
+    "lifestyle_exercise": Transition("lifestyle_diet", store=("gathered_info", "lifestyle_factors", "exercise")),
+    "lifestyle_diet": Transition("lifestyle_stress", store=("gathered_info", "lifestyle_factors", "diet")),
+    "lifestyle_stress": Transition("lifestyle_sleep", store=("gathered_info", "lifestyle_factors", "stress")),
+    "lifestyle_sleep": Transition("symptom_entry", store=("gathered_info", "lifestyle_factors", "sleep")),
+    "additional_symptoms": Transition(
+        next=lambda session, answer: "other_symptoms" if answer == OTHER_SYMPTOMS else "symptom_impact",
+        action=_add_additional_symptoms
+    ),
+    "other_symptoms": Transition("symptom_impact", action=_add_other_symptoms),
+    "symptom_impact": Transition("previous_treatment", store=("symptom_details", "impact")),
+    "previous_treatment": Transition("results", store=("symptom_details", "previous_treatment")),
+}
+
+# Undo the side effects of answering a state before it is asked again
+REWINDS = {
+    "additional_symptoms": _keep_primary_symptom,
+    "other_symptoms": _drop_other_symptoms,
+}
+
+
+class IntakeMachine:
+    """Precompiled intake state machine
+
+    Each turn is one dictionary lookup: a registered handler for states whose
+    answer needs services (symptom entry, results), otherwise the declarative
+    Transition for the state. Responses come from immutable PromptTemplates;
+    prompts that depend on session data can be overridden per state with
+    prompt builders. States whose handler waits on the model can also register
+    a coroutine for advance_async(), used by the async views. go_back() pops
+    the last answered state, undoes its side effects and replays that
+    state's prompt.
+    """
+
+    def __init__(self, transitions=TRANSITIONS, prompts=PROMPTS, rewinds=REWINDS, executor=None):
+        self.transitions = dict(transitions)
+        self.prompts = dict(prompts)
+        self.rewinds = dict(rewinds)
+        self.handlers = {}
+        self.async_handlers = {}
+        self.prompt_builders = {}
+        self.enter_hooks = {}
+        # Where advance_async() runs states without an async handler (None: the loop's default)
+        self.executor = executor
+
+    def handler(self, state):
+        """Register fn(session, answer) -> response for a state"""
+        def register(fn):
+            self.handlers[state] = fn
+            return fn
+        return register
+
+    def async_handler(self, state):
+        """Register async fn(session, answer) -> response used by advance_async() for a state"""
+        def register(fn):
+            self.async_handlers[state] = fn
+            return fn
+        return register
+
+    def prompt_builder(self, state):
+        """Register fn(session) -> response used to (re)ask a state"""
+        def register(fn):
+            self.prompt_builders[state] = fn
+            return fn
+        return register
+
+    def on_enter(self, state):
+        """Register fn(session) called whenever the conversation moves into a state"""
+        def register(fn):
+            self.enter_hooks[state] = fn
+            return fn
+        return register
+
+    def rewinder(self, state):
+        """Register fn(session) undoing the side effects of answering a state"""
+        def register(fn):
+            self.rewinds[state] = fn
+            return fn
+        return register
+
+    def __contains__(self, state):
+        return state in self.transitions or state in self.handlers
+
+    def prompt(self, state, session, prompt_key=None):
+        """Response asking the question of a state"""
+        builder = self.prompt_builders.get(state)
+        if builder is not None and prompt_key is None:
+            return builder(session)
+        return self.prompts[prompt_key or state].render(session["gathered_info"])
+
+    def advance(self, session, answer):
+        """Apply an answer to the session's current state and return the next prompt"""
+        state = session["current_state"]
+        handler = self.handlers.get(state)
+        if handler is not None:
+            self.record(session, state)
+            return handler(session, answer)
+
+        transition = self.transitions.get(state)
+        if transition is None:
+            return self.prompts["unknown_state"].render()
+
+        value = answer
+        if transition.validate is not None:
+            value, error = transition.validate(answer)
+            if error is not None:
+                # Invalid answers leave the state (and history) untouched
+                return self.prompts[error].render()
+
+        self.record(session, state)
+        if transition.store is not None:
+            _store(session, transition.store, value)
+        if transition.action is not None:
+            transition.action(session, value)
+
+        next_state = transition.next
+        if callable(next_state):
+            next_state = next_state(session, value)
+        prompt_key = None
+        if isinstance(next_state, tuple):
+            next_state, prompt_key = next_state
+        session["current_state"] = next_state
+        self._entered(session, next_state)
+        return self.prompt(next_state, session, prompt_key)
+
+    async def advance_async(self, session, answer):
+        """advance() that awaits the state's async handler when one is registered
+
+        Other states run advance() on the executor, in a copy of the caller's
+        context, since their handlers and enter hooks may match symptoms or
+        touch the report cache.
+        """
+        state = session["current_state"]
+        handler = self.async_handlers.get(state)
+        if handler is None:
+            context = contextvars.copy_context()
+            return await asyncio.get_running_loop().run_in_executor(self.executor, context.run, self.advance, session, answer)
+        self.record(session, state)
+        return await handler(session, answer)
+
+    def go_back(self, session):
+        """Return to the last answered state and replay its prompt, or None at the start"""
+        if not session["state_history"]:
+            return None
+        state = session["state_history"].pop()
+        session["previous_state"] = session["state_history"][-1] if session["state_history"] else None
+        session["current_state"] = state
+        rewind = self.rewinds.get(state)
+        if rewind is not None:
+            rewind(session)
+        self._entered(session, state)
+        return self.prompt(state, session)
+
+    def _entered(self, session, state):
+        hook = self.enter_hooks.get(state)
+        if hook is not None:
+            hook(session)
+
+    @staticmethod
+    def record(session, state):
+        """Mark state as answered so go_back() can return to it"""
+        session["previous_state"] = state
+        history = session["state_history"]
+        history.append(state)
+        if len(history) > MAX_STATE_HISTORY:
+            del history[:len(history) - MAX_STATE_HISTORY]
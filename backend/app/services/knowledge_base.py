@@ -0,0 +1,219 @@
+import hashlib
+import io
+import json
+import os
+import pickle
+import struct
+import sys
+import time
+
+MAGIC = b'SYMKB'
+
+# Bump when the layout of the snapshot itself changes
+FORMAT_VERSION = 1
+
+_HEADER = struct.Struct('>HI')
+
+# Modules whose code shapes the compiled structures; editing one invalidates the snapshot
+BUILDER_MODULES = ('assessment.py', 'canonical.py', 'condition_index.py', 'question_flow.py', 'scoring.py', 'search_index.py')
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+
+
+def _file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class _Pickler(pickle.Pickler):
+    """Stores the owning service as a reference so bound methods rebind on load"""
+
+    def __init__(self, file, owner):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self._owner = owner
+
+    def persistent_id(self, obj):
+        return 'owner' if obj is self._owner else None
+
+
+class _Unpickler(pickle.Unpickler):
+    def __init__(self, file, owner):
+        super().__init__(file)
+        self._owner = owner
+
+    def persistent_load(self, pid):
+        if pid != 'owner':
+            raise pickle.UnpicklingError(f"unknown persistent id {pid!r}")
+        return self._owner
+
+
+class KnowledgeBaseSnapshot:
+    """Compiled knowledge base kept in one versioned binary file
+
+    The file is MAGIC, (format version, header length), a JSON header and a
+    pickle of the structures the service builds from its JSON sources: the
+    parsed catalog, normalized lookup maps, search and condition indexes,
+    the scoring matrices, the question-flow graph and the canonicalizer with
+    its memo of fuzzy matches. It is read with a single read. The header
+    records the Python version and the size, mtime and SHA-256 of every
+    source (data files and the modules that build from them); when a size
+    or mtime differs the hash decides, so a touched but unchanged file only
+    refreshes the header while a real edit rebuilds the snapshot. Writes go
+    to a temporary file that atomically replaces the old one.
+
+    Only files this process wrote are unpickled, so the path must not be
+    writable by anyone the service does not trust.
+    """
+
+    def __init__(self, path, sources):
+        self.path = path
+        self.sources = list(sources)
+        self.loaded = None
+        self.load_ms = None
+
+    def load(self, owner, build):
+        """Attributes for owner from the snapshot, or from build() when it is stale or missing"""
+        started = time.perf_counter()
+        state = self._read(owner)
+        if state is None:
+            fingerprint = self._fingerprint()
+            state = build()
+            self._write(self._header(fingerprint), self._dump(owner, state))
+            self.loaded = "built"
+        self.load_ms = round((time.perf_counter() - started) * 1000, 2)
+        return state
+
+    def stats(self):
+        return {"path": self.path, "loaded": self.loaded, "load_ms": self.load_ms}
+
+    def _name(self, path):
+        return os.path.relpath(os.path.abspath(path), _ROOT)
+
+    def _fingerprint(self):
+        fingerprint = {}
+        for path in self.sources:
+            try:
+                stat = os.stat(path)
+                fingerprint[self._name(path)] = [stat.st_size, stat.st_mtime_ns, _file_hash(path)]
+            except OSError:
+                fingerprint[self._name(path)] = None
+        return fingerprint
+
+    def _header(self, fingerprint):
+        return {"python": list(sys.version_info[:2]), "sources": fingerprint}
+
+    def _read(self, owner):
+        try:
+            with open(self.path, 'rb') as f:
+                blob = f.read()
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            print(f"Error reading knowledge base snapshot {self.path}: {e}")
+            return None
+
+        view = memoryview(blob)
+        prefix = len(MAGIC) + _HEADER.size
+        if len(blob) < prefix or blob[:len(MAGIC)] != MAGIC:
+            return None
+        version, header_length = _HEADER.unpack_from(blob, len(MAGIC))
+        if version != FORMAT_VERSION:
+            return None
+        try:
+            header = json.loads(bytes(view[prefix:prefix + header_length]))
+        except ValueError:
+            return None
+        if header.get("python") != list(sys.version_info[:2]):
+            return None
+
+        refreshed = self._validate(header.get("sources", {}))
+        if refreshed is None:
+            return None
+        payload = view[prefix + header_length:]
+        try:
+            state = _Unpickler(io.BytesIO(payload), owner).load()
+        except Exception as e:
+            print(f"Error loading knowledge base snapshot {self.path}: {e}")
+            return None
+        if refreshed:
+            # Touched but identical sources: record their new stats so the next start skips hashing
+            header["sources"] = refreshed
+            self._write(header, payload)
+        self.loaded = "snapshot"
+        return state
+
+    def _validate(self, recorded):
+        """None when a source changed; otherwise the refreshed fingerprint, or {} when nothing moved"""
+        names = {self._name(path): path for path in self.sources}
+        if set(names) != set(recorded):
+            return None
+        refreshed = dict(recorded)
+        moved = False
+        for name, path in names.items():
+            entry = recorded[name]
+            try:
+                stat = os.stat(path)
+            except OSError:
+                if entry is None:
+                    continue
+                return None
+            if entry is None or entry[0] != stat.st_size:
+                return None
+            if entry[1] == stat.st_mtime_ns:
+                continue
+            if _file_hash(path) != entry[2]:
+                return None
+            refreshed[name] = [stat.st_size, stat.st_mtime_ns, entry[2]]
+            moved = True
+        return refreshed if moved else {}
+
+    def _dump(self, owner, state):
+        buffer = io.BytesIO()
+        _Pickler(buffer, owner).dump(state)
+        return buffer.getvalue()
+
+    def _write(self, header, payload):
+        raw_header = json.dumps(header, sort_keys=True, separators=(',', ':')).encode('utf-8')
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(tmp_path, 'wb') as f:
+                f.write(MAGIC + _HEADER.pack(FORMAT_VERSION, len(raw_header)) + raw_header)
+                f.write(payload)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"Error writing knowledge base snapshot {self.path}: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+
+def create_knowledge_base_snapshot(data_paths):
+    """Snapshot of the knowledge base built from data_paths, or None when disabled
+
+    KNOWLEDGE_BASE_SNAPSHOT sets the file (default instance/knowledge_base.snapshot);
+    an empty value, "none" or "off" builds from the JSON sources on every start.
+    """
+    default_path = os.path.join(_ROOT, 'instance', 'knowledge_base.snapshot')
+    path = os.environ.get('KNOWLEDGE_BASE_SNAPSHOT', default_path)
+    if path.lower() in ('', 'none', 'off'):
+        return None
+    services_dir = os.path.dirname(__file__)
+    sources = list(data_paths) + [os.path.join(services_dir, name) for name in BUILDER_MODULES]
+    return KnowledgeBaseSnapshot(path, sources)
+
+
+if __name__ == '__main__':
+    # Compile step: `python -m app.services.knowledge_base [--force]` from backend/
+    from app.services.assessment import AssessmentService
+
+    if '--force' in sys.argv[1:]:
+        snapshot = create_knowledge_base_snapshot([])
+        if snapshot is not None and os.path.exists(snapshot.path):
+            os.remove(snapshot.path)
+    service = AssessmentService()
+    print(json.dumps(service.knowledge_base.stats() if service.knowledge_base else None))
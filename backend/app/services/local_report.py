@@ -0,0 +1,141 @@
+import re
+
+# conditions.json urgency_level -> the phrases the report parser and frontend recognise
+URGENCY_PHRASES = {
+    "immediate": "requires immediate attention",
+    "prompt": "requires prompt attention",
+    "routine": "routine care recommended",
+    "self-care": "self-care appropriate"
+}
+URGENCY_ORDER = ("immediate", "prompt", "routine", "self-care")
+
+NEXT_STEPS = {
+    "immediate": "Seek emergency care now: call emergency services or go to the nearest emergency department. Do not drive yourself if you feel faint, confused or have chest pain.",
+    "prompt": "Contact a healthcare provider within 24 hours to arrange an evaluation. If your symptoms worsen before then, seek urgent care.",
+    "routine": "Schedule an appointment with your primary care physician within the next 1-2 weeks. Seek care sooner if your symptoms worsen or new symptoms appear.",
+    "self-care": "Your symptoms can usually be managed at home. See a healthcare provider if they last longer than 7-10 days, get worse, or any of the warning signs below appear."
+}
+
+# Question-id fragments of the symptom flows, in the order symptom analysis lists them
+DETAIL_TOPICS = (
+    ("duration", "Duration"),
+    ("severity", "Severity"),
+    ("pattern", "Pattern"),
+    ("trigger", "Triggers"),
+)
+
+
+class LocalReportEngine:
+    """Builds a complete assessment report from conditions.json without the model
+
+    Conditions are ranked by AssessmentService.rank_conditions; every other
+    section is derived from the ranked conditions' urgency, recommendations,
+    likelihood factors and the urgent conditions sharing the reported
+    symptoms. Returns None when no condition matches, so the caller can fall
+    back to generic guidance.
+    """
+
+    def __init__(self, assessment_service, top_k=5):
+        self.assessment_service = assessment_service
+        self.top_k = top_k
+        self._conditions = (None, {})
+
+    def build(self, name, age, biological_sex, symptoms, answers=None):
+        answers = answers or {}
+        # One knowledge-base version for the whole report, even if it is reloaded meanwhile
+        service = self.assessment_service.current()
+        conditions = self._conditions_by_id(service)
+        ranking = service.rank_conditions(symptoms, top_k=self.top_k)
+        if not ranking:
+            return None
+
+        possible_conditions = [c['name'] for c in ranking]
+        top_urgency = min(
+            (c.get('urgency_level') for c in ranking if c.get('urgency_level') in NEXT_STEPS),
+            key=URGENCY_ORDER.index,
+            default="routine"
+        )
+
+        return {
+            "summary": self._summary(name, symptoms, ranking, conditions),
+            "symptom_analysis": self._symptom_analysis(symptoms, answers),
+            "possible_conditions": possible_conditions,
+            "condition_details": {
+                c['name']: conditions[c['id']].get('description', '') for c in ranking
+            },
+            "urgency_levels": {
+                c['name']: URGENCY_PHRASES.get(c.get('urgency_level'), URGENCY_PHRASES["routine"]) for c in ranking
+            },
+            "likelihood_percentages": {c['name']: c['likelihood'] for c in ranking},
+            "supporting_symptoms": {c['name']: c['matched_symptoms'] for c in ranking},
+            "warning_signs": self._warning_signs(service, symptoms, ranking, conditions),
+            "next_steps": NEXT_STEPS[top_urgency],
+            "self_care": self._self_care(ranking, top_urgency, conditions),
+            "prevention": []
+        }
+
+    def _conditions_by_id(self, service):
+        source, by_id = self._conditions
+        if source is not service.conditions:
+            by_id = {c['id']: c for c in service.conditions if 'id' in c}
+            self._conditions = (service.conditions, by_id)
+        return by_id
+
+    def _summary(self, name, symptoms, ranking, conditions):
+        top = ranking[0]
+        leading = ", ".join(f"{c['name']} ({c['likelihood']}%)" for c in ranking[:2])
+        description = conditions[top['id']].get('description', '')
+        return (
+            f"Assessment for {name}: Based on your report of {', '.join(symptoms)}, the closest matches "
+            f"in our medical knowledge base are {leading}. {description} "
+            "This report was generated from a symptom knowledge base rather than a clinician's review; "
+            "please confirm it with a healthcare professional."
+        )
+
+    def _symptom_analysis(self, symptoms, answers):
+        analysis = []
+        for index, symptom in enumerate(symptoms):
+            if index > 0:
+                analysis.append(f"{symptom}: Reported as an additional symptom")
+                continue
+            details = []
+            for fragment, label in DETAIL_TOPICS:
+                value = next((v for k, v in answers.items() if fragment in k and v), None)
+                if isinstance(value, list):
+                    value = ", ".join(str(v) for v in value)
+                details.append(f"{label}: {value}" if value else f"{label} not reported")
+            analysis.append(f"{symptom}: " + ", ".join(details))
+        return analysis
+
+    def _warning_signs(self, service, symptoms, ranking, conditions):
+        red_flags = service.red_flag_symptoms(symptoms)
+        signs = _unique(
+            f"New or worsening {symptom.lower()} ({URGENCY_PHRASES[urgency]})"
+            for symptom, _, urgency in red_flags
+        )[:4]
+
+        # Findings that argue against the likeliest conditions point to something else
+        for entry in ranking[:2]:
+            for factor in conditions[entry['id']].get('likelihood_factors', {}).get('decreases', []):
+                signs.append(f"Development of {factor}")
+
+        return _unique(signs)[:6]
+
+    def _self_care(self, ranking, top_urgency, conditions):
+        if top_urgency == "immediate":
+            return ["Do not wait for symptoms to improve on their own; get medical help now"]
+        advice = []
+        for entry in ranking[:3]:
+            recommendation = conditions[entry['id']].get('recommendation', '')
+            advice.extend(s.strip() for s in re.split(r'(?<=\.)\s+', recommendation) if s.strip())
+        return _unique(advice)[:6]
+
+
+def _unique(items):
+    seen = set()
+    result = []
+    for item in items:
+        if item.lower() not in seen:
+            seen.add(item.lower())
+            result.append(item)
+    return result
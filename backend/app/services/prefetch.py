@@ -0,0 +1,127 @@
+import asyncio
+import os
+import threading
+
+
+class ReportPrefetcher:
+    """Tracks reports generated ahead of the results step
+
+    Jobs are keyed by report cache key, so sessions that would send the model
+    the same request share one job. Each session holds a reference to at most
+    one key; releasing the last reference cancels a job that has not started.
+    Finished jobs are dropped on the next start() since their reports already
+    sit in the assessment cache.
+    """
+
+    def __init__(self, max_pending=32):
+        self.max_pending = max_pending
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self.started = 0
+        self.shared = 0
+        self.skipped = 0
+        self.cancelled = 0
+        self.waited = 0
+
+    def start(self, key, submit):
+        """Start submit() for key unless a job for it is already running
+
+        submit() returns the job's future, or None when it declined to
+        start one. It runs outside the lock. Returns True when the caller
+        now holds a reference to a job for key.
+        """
+        with self._lock:
+            for done_key in [k for k, job in self._jobs.items() if job[0].done()]:
+                del self._jobs[done_key]
+            if self._share(key):
+                return True
+            if len(self._jobs) >= self.max_pending:
+                self.skipped += 1
+                return False
+
+        future = submit()
+        with self._lock:
+            if future is None:
+                self.skipped += 1
+                return False
+            if not self._share(key):
+                self._jobs[key] = [future, 1]
+                self.started += 1
+                return True
+        # Another session started the same job meanwhile; theirs is kept
+        future.cancel()
+        return True
+
+    def _share(self, key):
+        job = self._jobs.get(key)
+        if job is None:
+            return False
+        job[1] += 1
+        self.shared += 1
+        return True
+
+    def release(self, key):
+        """Drop a reference taken by start(); cancels the job when nobody needs it"""
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is None:
+                return
+            job[1] -= 1
+            if job[1] <= 0:
+                del self._jobs[key]
+                if job[0].cancel():
+                    self.cancelled += 1
+
+    def wait(self, key, timeout=None):
+        """Block until the job for key finishes and return its result
+
+        None if there is no job, or it failed, was cancelled or timed out.
+        The result is returned rather than read back from the cache, which
+        the job's done-callbacks may not have filled yet when this wakes.
+        """
+        with self._lock:
+            job = self._jobs.get(key)
+        if job is None:
+            return None
+        self.waited += 1
+        try:
+            return job[0].result(timeout=timeout)
+        except Exception:
+            # Timed out, cancelled or failed
+            return None
+
+    async def wait_async(self, key, timeout=None):
+        """wait() for the event loop: awaits the job without holding a thread"""
+        with self._lock:
+            job = self._jobs.get(key)
+        if job is None:
+            return None
+        self.waited += 1
+        try:
+            # Shielded so a timed-out waiter leaves the shared job running
+            return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(job[0])), timeout)
+        except asyncio.TimeoutError:
+            return None
+        except asyncio.CancelledError:
+            if not job[0].cancelled():
+                raise
+            return None
+        except Exception:
+            return None
+
+    def stats(self):
+        return {
+            "pending": len(self._jobs),
+            "started": self.started,
+            "shared": self.shared,
+            "skipped": self.skipped,
+            "cancelled": self.cancelled,
+            "waited": self.waited
+        }
+
+
+def create_report_prefetcher():
+    """Create the prefetcher configured through environment variables, or None when disabled"""
+    if os.environ.get('ASSESSMENT_PREFETCH', '1').lower() in ('0', 'false', 'no', 'off'):
+        return None
+    return ReportPrefetcher(max_pending=int(os.environ.get('ASSESSMENT_PREFETCH_MAX_PENDING', 32)))
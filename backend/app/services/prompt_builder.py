@@ -0,0 +1,189 @@
+import os
+import re
+import threading
+
+# Answers already in the prompt header or carrying no information for the model
+HEADER_FIELDS = ("name", "age", "biological_sex", "assessment_date")
+EMPTY_ANSWERS = {"", "none", "none of these", "n/a", "not applicable", "not sure", "unknown", "skip"}
+
+HISTORY_FIELDS = ("medications", "current_medications", "allergies", "family_history", "pregnancy_status", "height_weight")
+
+# Verbose option wording -> compact form, applied in one pass; the units
+# (keys starting with a space) only right after a number, as in "1-3 days"
+ABBREVIATIONS = {
+    "less than ": "<",
+    "more than ": ">",
+    "over-the-counter": "OTC",
+    " hours": "h",
+    " hour": "h",
+    " days": "d",
+    " day": "d",
+    " weeks": "wk",
+    " week": "wk",
+    " months": "mo",
+    " month": "mo",
+    " years": "y",
+    " year": "y"
+}
+_ABBREVIATION_PATTERN = re.compile(
+    "|".join(rf"(?<=\d){re.escape(k)}\b" if k.startswith(" ") else re.escape(k) for k in ABBREVIATIONS),
+    re.IGNORECASE
+)
+
+# Lower numbers survive the token budget first
+PRIORITY_RED_FLAG = 0
+PRIORITY_SYMPTOM = 1
+PRIORITY_HISTORY = 2
+PRIORITY_DIFFERENTIAL = 3
+PRIORITY_LIFESTYLE = 4
+
+SECTION_TITLES = (
+    ("symptom", "SYMPTOM DETAILS"),
+    ("history", "MEDICAL HISTORY, MEDICATIONS AND ALLERGIES"),
+    ("lifestyle", "LIFESTYLE FACTORS"),
+    ("differential", "KNOWLEDGE-BASE DIFFERENTIAL (consider these first, but include other conditions if the details fit better)"),
+)
+
+
+def estimate_tokens(text):
+    """Rough token count for Gemini models, about four characters per token"""
+    return (len(text) + 3) // 4
+
+
+def compact_value(value):
+    """Render an answer value in its shortest readable form"""
+    if isinstance(value, (list, tuple)):
+        value = ", ".join(str(v) for v in value if str(v).strip())
+    value = " ".join(str(value).split())
+    return _ABBREVIATION_PATTERN.sub(lambda m: ABBREVIATIONS[m.group(0).lower()], value)
+
+
+class PromptBuilder:
+    """Assembles the assessment prompt within an input token budget
+
+    Answers are flattened, stripped of empty or header-duplicated values and
+    compacted to "label: value" lines. When the prompt would exceed
+    token_budget, whole lines are dropped lowest priority first: lifestyle,
+    then the knowledge-base differential, history, and symptom details.
+    Answers that mention a red-flag symptom are kept longest. The reported
+    symptoms, patient header and format instructions are never dropped.
+    """
+
+    def __init__(self, assessment_service=None, token_budget=1500):
+        self.assessment_service = assessment_service
+        self.token_budget = token_budget
+        self._lock = threading.Lock()
+        self.prompts = 0
+        self.total_tokens = 0
+        self.dropped_lines = 0
+
+    def build(self, name, age, biological_sex, symptoms, answers, candidates, format_str, current_date):
+        """Return the prompt and its estimated token count"""
+        red_flags = self._red_flags(symptoms)
+        header = [
+            "You are an expert medical assistant creating a comprehensive health assessment report. Follow this structured format exactly:",
+            "",
+            f"PATIENT: {name}, {age} years old, {biological_sex}",
+            f"DATE: {current_date}",
+            f"SYMPTOMS: {', '.join(symptoms)}"
+        ]
+        if red_flags:
+            header.append(f"RED-FLAG SYMPTOMS (weigh these first): {', '.join(red_flags)}")
+        header += ["", "Based on this information and the details below, generate a structured clinical report:"]
+        footer = [
+            "",
+            format_str,
+            "",
+            "Use plain, direct language. Avoid medical jargon when possible. Do not use markdown formatting."
+        ]
+
+        lines = self._answer_lines(answers) + self._differential_lines(candidates)
+        budget = self.token_budget - estimate_tokens("\n".join(header + footer))
+        kept = set()
+        titled = set()
+        for index, (priority, section, line) in sorted(enumerate(lines), key=lambda item: (item[1][0], item[0])):
+            # Each line also costs its newline and, for a section's first line, the title
+            cost = estimate_tokens(line) + 1
+            if section not in titled:
+                cost += estimate_tokens(dict(SECTION_TITLES)[section]) + 2
+            if cost > budget:
+                continue
+            budget -= cost
+            kept.add(index)
+            titled.add(section)
+
+        body = []
+        for section, title in SECTION_TITLES:
+            section_lines = [line for index, (_, s, line) in enumerate(lines) if s == section and index in kept]
+            if section_lines:
+                body += ["", f"{title}:"] + section_lines
+        prompt = "\n".join(header + body + footer)
+        tokens = estimate_tokens(prompt)
+        with self._lock:
+            self.prompts += 1
+            self.total_tokens += tokens
+            self.dropped_lines += len(lines) - len(kept)
+        return prompt, tokens
+
+    def stats(self):
+        with self._lock:
+            return {
+                "token_budget": self.token_budget,
+                "prompts": self.prompts,
+                "average_tokens": round(self.total_tokens / self.prompts) if self.prompts else 0,
+                "dropped_lines": self.dropped_lines
+            }
+
+    def _red_flags(self, findings):
+        if self.assessment_service is None:
+            return []
+        return self.assessment_service.red_flag_findings(findings)
+
+    def _answer_lines(self, answers):
+        """(priority, section, line) for every informative answer, in answer order"""
+        lines = []
+        seen = set()
+        for key, value in self._flatten(answers):
+            text = compact_value(value)
+            if text.lower() in EMPTY_ANSWERS or (key, text) in seen:
+                continue
+            seen.add((key, text))
+            if key.startswith("lifestyle"):
+                section, priority = "lifestyle", PRIORITY_LIFESTYLE
+            elif key.startswith("medical_history") or key in HISTORY_FIELDS:
+                section, priority = "history", PRIORITY_HISTORY
+            else:
+                section, priority = "symptom", PRIORITY_SYMPTOM
+            raw = ", ".join(str(v) for v in value) if isinstance(value, (list, tuple)) else str(value)
+            if self._red_flags([part.strip() for part in raw.split(",")]):
+                priority = PRIORITY_RED_FLAG
+            label = key.split(".")[-1].replace("_", " ")
+            lines.append((priority, section, f"- {label}: {text}"))
+        return lines
+
+    def _flatten(self, answers, prefix=""):
+        for key, value in answers.items():
+            if not prefix and key in HEADER_FIELDS:
+                continue
+            if isinstance(value, dict):
+                yield from self._flatten(value, f"{prefix}{key}.")
+            elif value is not None:
+                yield f"{prefix}{key}", value
+
+    def _differential_lines(self, candidates):
+        return [
+            (
+                PRIORITY_DIFFERENTIAL,
+                "differential",
+                f"- {c['name']} ({c['likelihood']}%; {', '.join(c['matched_symptoms']) or 'related findings'})"
+            )
+            for c in candidates or []
+        ]
+
+
+def create_prompt_builder(assessment_service=None):
+    """Create the PromptBuilder configured through environment variables"""
+    return PromptBuilder(
+        assessment_service,
+        token_budget=int(os.environ.get('GEMINI_PROMPT_TOKEN_BUDGET', 1500))
+    )
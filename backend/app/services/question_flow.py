@@ -0,0 +1,210 @@
+import json
+
+
+class _MultiValue(list):
+    """Values of a JSON object key that appears more than once"""
+
+
+def _keep_duplicate_keys(pairs):
+    """json object_pairs_hook that keeps every value of repeated keys
+
+    questions.json expresses conditional branches by repeating a
+    follow_up_questions key with different conditions; a plain json.load
+    would silently keep only the last branch.
+    """
+    result = {}
+    for key, value in pairs:
+        if key in result:
+            existing = result[key]
+            if not isinstance(existing, _MultiValue):
+                existing = _MultiValue([existing])
+                result[key] = existing
+            existing.append(value)
+        else:
+            result[key] = value
+    return result
+
+
+def _as_list(value):
+    return list(value) if isinstance(value, _MultiValue) else [value]
+
+
+def _strip_duplicates(value):
+    """Collapse repeated keys to their first value for plain question dicts"""
+    if isinstance(value, _MultiValue):
+        value = value[0]
+    if isinstance(value, dict):
+        return {k: _strip_duplicates(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_strip_duplicates(v) for v in value]
+    return value
+
+
+class FlowNode:
+    """A compiled question: the question dict plus its outgoing edges"""
+
+    __slots__ = ("id", "question", "options", "edges")
+
+    def __init__(self, question):
+        self.id = question["id"]
+        self.question = question
+        self.options = tuple(question.get("options", ()))
+        self.edges = []
+
+    def next_for(self, answer):
+        """Return the id of the first edge target whose condition the answer meets"""
+        for condition, target in self.edges:
+            if condition is None or _condition_met(condition, answer):
+                return target
+        return None
+
+
+def _condition_met(condition, answer):
+    """Evaluate a follow-up condition from questions.json against an answer"""
+    if isinstance(answer, list):
+        answer_text = ", ".join(str(a) for a in answer)
+    else:
+        answer_text = answer if isinstance(answer, str) else None
+
+    if 'answer' in condition:
+        return condition['answer'] == answer
+    if 'answers' in condition:
+        if isinstance(answer, list):
+            return any(a in condition['answers'] for a in answer)
+        return answer in condition['answers']
+    if 'contains' in condition:
+        return answer_text is not None and condition['contains'] in answer_text.lower()
+    if 'not_contains' in condition:
+        return not (answer_text is not None and condition['not_contains'] in answer_text.lower())
+    return False
+
+
+class QuestionFlow:
+    """Directed graph of the questions asked for one symptom"""
+
+    __slots__ = ("key", "symptom_name", "first", "nodes")
+
+    def __init__(self, key, symptom_name, first, nodes):
+        self.key = key
+        self.symptom_name = symptom_name
+        self.first = first
+        self.nodes = nodes
+
+    def first_question(self):
+        node = self.nodes.get(self.first)
+        return dict(node.question) if node else None
+
+    def next_question(self, node_id, answer):
+        """Follow the edge chosen by answer out of node_id"""
+        node = self.nodes.get(node_id)
+        if node is None:
+            return None
+        target = node.next_for(answer)
+        if target is None:
+            return None
+        return dict(self.nodes[target].question)
+
+
+class QuestionFlowGraph:
+    """questions.json compiled into per-symptom directed graphs
+
+    Every question becomes a node keyed by its id, and each follow-up entry
+    becomes a typed edge (condition, target id). Sessions keep a cursor of
+    (flow key, node id), so resolving the next question is a dictionary
+    lookup plus evaluation of that node's few edges.
+    """
+
+    def __init__(self, raw_flows):
+        self.flows = {}
+        self.problems = []
+        for key, raw_flow in raw_flows.items():
+            raw_flow = _as_list(raw_flow)[-1]
+            if not isinstance(raw_flow, dict):
+                continue
+            self.flows[key] = self._compile_flow(key, raw_flow)
+        self.problems.extend(self.validate())
+
+    @classmethod
+    def from_file(cls, path):
+        """Compile the flows in a questions.json file, keeping repeated branch keys"""
+        with open(path, 'r') as f:
+            raw_flows = json.load(f, object_pairs_hook=_keep_duplicate_keys)
+        return cls(raw_flows)
+
+    def _compile_flow(self, key, raw_flow):
+        nodes = {}
+        first = None
+        raw_first = raw_flow.get('first_question')
+        if isinstance(raw_first, dict) and 'id' in raw_first:
+            first_question = _strip_duplicates(raw_first)
+            first = first_question['id']
+            nodes[first] = FlowNode(first_question)
+
+        follow_ups = raw_flow.get('follow_up_questions', {})
+        pending_edges = []
+        for source_id, entries in follow_ups.items():
+            for entry in _as_list(entries):
+                next_question = entry.get('next_question')
+                if not isinstance(next_question, dict) or 'id' not in next_question:
+                    self.problems.append(f"{key}: follow-up of '{source_id}' has no next_question id")
+                    continue
+                next_question = _strip_duplicates(next_question)
+                nodes.setdefault(next_question['id'], FlowNode(next_question))
+                pending_edges.append((source_id, entry.get('condition'), next_question['id']))
+
+        for source_id, condition, target in pending_edges:
+            node = nodes.get(source_id)
+            if node is None:
+                self.problems.append(f"{key}: follow-up defined for unknown question '{source_id}'")
+                continue
+            node.edges.append((_strip_duplicates(condition), target))
+
+        # Unconditional edges are fallbacks; evaluate conditional ones first
+        for node in nodes.values():
+            node.edges.sort(key=lambda edge: edge[0] is None)
+
+        return QuestionFlow(key, raw_flow.get('symptom_name'), first, nodes)
+
+    def validate(self):
+        """Report unreachable questions and cycles in every flow"""
+        problems = []
+        for key, flow in self.flows.items():
+            if flow.first is None:
+                problems.append(f"{key}: flow has no first_question")
+                continue
+
+            reachable = set()
+            stack = [flow.first]
+            while stack:
+                node_id = stack.pop()
+                if node_id in reachable:
+                    continue
+                reachable.add(node_id)
+                stack.extend(target for _, target in flow.nodes[node_id].edges)
+            for node_id in flow.nodes:
+                if node_id not in reachable:
+                    problems.append(f"{key}: question '{node_id}' is unreachable")
+
+            # Iterative DFS with colors to detect back edges
+            color = {}
+            for start in flow.nodes:
+                if color.get(start):
+                    continue
+                stack = [(start, iter(flow.nodes[start].edges))]
+                color[start] = 1
+                while stack:
+                    node_id, edges = stack[-1]
+                    for _, target in edges:
+                        if color.get(target) == 1:
+                            problems.append(f"{key}: cycle through '{node_id}' -> '{target}'")
+                        elif not color.get(target):
+                            color[target] = 1
+                            stack.append((target, iter(flow.nodes[target].edges)))
+                            break
+                    else:
+                        color[node_id] = 2
+                        stack.pop()
+        return problems
+
+    def get(self, flow_key):
+        return self.flows.get(flow_key)
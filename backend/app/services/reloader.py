@@ -0,0 +1,130 @@
+import contextvars
+import os
+import threading
+import time
+
+
+class KnowledgeBaseReloader:
+    """The current knowledge base, rebuilt and swapped when its data files change
+
+    Attribute access is forwarded to the current version, an object built by
+    factory() and never modified afterwards (AssessmentService and
+    SpecialistMatcher keep no per-user state). A watcher thread polls the
+    size and mtime of the data files; once a change has held still for one
+    poll it builds a new version off the request path and replaces the
+    reference in one assignment. A request pins the version it started with (pin() /
+    unpin()), so it finishes on that version while new requests use the
+    new one. Callbacks registered with on_reload() run after each swap, to
+    drop whatever was derived from the old version. A failed build keeps the
+    old version and is retried when the files change again.
+    """
+
+    _current = None
+
+    def __init__(self, factory, paths, interval=5.0):
+        self._factory = factory
+        self.paths = list(paths)
+        self.interval = interval
+        self._pinned = contextvars.ContextVar('knowledge_base', default=None)
+        self._signature = self._stat()
+        self._current = factory()
+        self.version = 1
+        self.reloads = 0
+        self.failures = 0
+        self.reloaded_at = None
+        self._callbacks = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watcher = None
+        if interval and interval > 0:
+            self._watcher = threading.Thread(target=self._watch, name='knowledge-base-watcher', daemon=True)
+            self._watcher.start()
+
+    def __getattr__(self, name):
+        return getattr(self.current(), name)
+
+    def current(self):
+        """The version pinned for this request, else the latest one"""
+        return self._pinned.get() or self._current
+
+    def pin(self):
+        """Keep the current version for the rest of this request; returns the token for unpin()"""
+        return self._pinned.set(self._current)
+
+    def unpin(self, token):
+        self._pinned.reset(token)
+
+    def on_reload(self, callback):
+        """Call callback(new_version) after every successful reload"""
+        self._callbacks.append(callback)
+
+    def reload(self):
+        """Build a new version now and swap it in; False when the build failed"""
+        with self._lock:
+            started = time.perf_counter()
+            try:
+                service = self._factory()
+            except Exception as e:
+                self.failures += 1
+                print(f"Error reloading knowledge base, keeping version {self.version}: {e}")
+                return False
+            self._current = service
+            self.version += 1
+            self.reloads += 1
+            self.reloaded_at = time.time()
+            print(f"Knowledge base reloaded as version {self.version} in {time.perf_counter() - started:.2f}s")
+            for callback in self._callbacks:
+                try:
+                    callback(service)
+                except Exception as e:
+                    print(f"Error in knowledge base reload callback: {e}")
+            return True
+
+    def close(self):
+        """Stop watching the data files"""
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join()
+
+    def stats(self):
+        return {
+            "version": self.version,
+            "reloads": self.reloads,
+            "failures": self.failures,
+            "reloaded_at": self.reloaded_at,
+            "watching": self._watcher is not None and not self._stop.is_set()
+        }
+
+    def _stat(self):
+        signature = []
+        for path in self.paths:
+            try:
+                stat = os.stat(path)
+                signature.append((stat.st_size, stat.st_mtime_ns))
+            except OSError:
+                signature.append(None)
+        return tuple(signature)
+
+    def _watch(self):
+        seen = self._signature
+        while not self._stop.wait(self.interval):
+            signature = self._stat()
+            if signature != seen:
+                # Still being written, or just written: wait for the files to settle
+                seen = signature
+                continue
+            if signature != self._signature:
+                self._signature = signature
+                self.reload()
+
+
+def create_knowledge_base_reloader(factory, paths):
+    """Reloader for the knowledge base built by factory from paths
+
+    KNOWLEDGE_BASE_RELOAD_INTERVAL is the polling interval in seconds
+    (default 5); 0 or "off" serves the first version until restart.
+    """
+    interval = os.environ.get('KNOWLEDGE_BASE_RELOAD_INTERVAL', '5')
+    if interval.lower() in ('', 'none', 'off'):
+        interval = '0'
+    return KnowledgeBaseReloader(factory, paths, interval=float(interval))
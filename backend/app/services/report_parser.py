@@ -0,0 +1,225 @@
+import json
+import re
+
+from app.services.local_report import URGENCY_PHRASES
+
+# JSON schema the model is asked to follow; properties are in report order so
+# a streamed response completes the sections one after another
+REPORT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "summary": {"type": "string"},
+        "symptom_analysis": {"type": "array", "items": {"type": "string"}},
+        "possible_conditions": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "name": {"type": "string"},
+                    "likelihood": {"type": "integer"},
+                    "urgency": {"type": "string", "enum": list(URGENCY_PHRASES)},
+                    "explanation": {"type": "string"},
+                    "supporting_symptoms": {"type": "array", "items": {"type": "string"}}
+                },
+                "required": ["name", "likelihood", "urgency", "explanation", "supporting_symptoms"]
+            }
+        },
+        "warning_signs": {"type": "array", "items": {"type": "string"}},
+        "next_steps": {"type": "string"},
+        "self_care": {"type": "array", "items": {"type": "string"}},
+        "prevention": {"type": "array", "items": {"type": "string"}}
+    },
+    "required": [
+        "summary", "symptom_analysis", "possible_conditions", "warning_signs",
+        "next_steps", "self_care", "prevention"
+    ]
+}
+
+TEXT_SECTIONS = ("summary", "next_steps")
+
+# Characters that can change the parser state; everything between them is skipped in one search
+_STRUCTURAL = re.compile(r'[\\"{}\[\]:,]')
+_STRING_SPECIAL = re.compile(r'[\\"]')
+
+
+class IncrementalReportParser:
+    """Single-pass parser for a JSON report arriving in chunks
+
+    feed() scans only the new characters and returns the (key, value) pairs of
+    top-level members completed by the chunk, so sections can be sent before
+    the object closes. Only the text of the member in progress is kept, so a
+    long stream is not copied again with every chunk. Text before the opening
+    brace (such as a code fence) and after the closing brace is ignored.
+    Malformed input raises ValueError; the members completed up to that point
+    remain available in values.
+    """
+
+    def __init__(self):
+        self.values = {}
+        self.done = False
+        self._text = ""
+        self._pos = 0
+        # Offset in the whole stream of self._text[0], for error messages
+        self._offset = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._phase = "key"
+        self._token_start = None
+        self._key = None
+
+    def feed(self, chunk):
+        if self.done:
+            return []
+        self._text += chunk
+        text = self._text
+        completed = []
+        i = self._pos
+        while not self.done:
+            if self._escape:
+                if i >= len(text):
+                    break
+                self._escape = False
+                i += 1
+                continue
+            match = (_STRING_SPECIAL if self._in_string else _STRUCTURAL).search(text, i)
+            end = match.start() if match else len(text)
+            if self._depth == 1 and self._phase != "value" and not self._in_string and text[i:end].strip():
+                raise ValueError(f"unexpected {text[i:end].strip()[:20]!r} at offset {self._offset + i}")
+            if match is None:
+                i = end
+                break
+            char = text[end]
+            i = end + 1
+            if self._in_string:
+                if char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self._phase == "key":
+                        self._key = json.loads(text[self._token_start:i])
+                        self._token_start = None
+                        self._phase = "colon"
+            elif self._depth == 0:
+                if char == '{':
+                    self._depth = 1
+            elif self._depth == 1 and self._phase == "value":
+                if char in ',}':
+                    self._complete_member(text[self._token_start:end], completed)
+                    if char == '}':
+                        self._depth = 0
+                        self.done = True
+                elif char in '{[':
+                    self._depth += 1
+                elif char == '"':
+                    self._in_string = True
+            elif self._depth == 1:
+                if self._phase == "key" and char == '"':
+                    self._in_string = True
+                    self._token_start = end
+                elif self._phase == "key" and char == '}' and not self.values:
+                    self._depth = 0
+                    self.done = True
+                elif self._phase == "colon" and char == ':':
+                    self._phase = "value"
+                    self._token_start = i
+                else:
+                    raise ValueError(f"unexpected {char!r} at offset {self._offset + end}")
+            elif char == '"':
+                self._in_string = True
+            elif char in '{[':
+                self._depth += 1
+            elif char in '}]':
+                self._depth -= 1
+        # Drop the text before the token in progress (or all of it between tokens)
+        start = i if self._token_start is None else self._token_start
+        if start:
+            self._text = text[start:]
+            self._offset += start
+            i -= start
+            if self._token_start is not None:
+                self._token_start -= start
+        self._pos = i
+        return completed
+
+    def close(self):
+        """Return the parsed members; ValueError when the object never closed"""
+        if not self.done:
+            raise ValueError("report JSON ended before the closing brace")
+        return self.values
+
+    def _complete_member(self, raw, completed):
+        try:
+            value = json.loads(raw)
+        except ValueError as e:
+            raise ValueError(f"invalid value for {self._key!r}: {e}")
+        self.values[self._key] = value
+        completed.append((self._key, value))
+        self._key = None
+        self._token_start = None
+        self._phase = "key"
+
+
+def section_value(key, value):
+    """Convert one parsed JSON member to the value stored in the report section"""
+    if key in TEXT_SECTIONS:
+        if isinstance(value, list):
+            return " ".join(str(v).strip() for v in value)
+        return str(value or "").strip()
+    if key == "possible_conditions":
+        return [c["name"].strip() for c in _conditions(value)]
+    if not isinstance(value, list):
+        value = [value]
+    return [str(v).strip() for v in value if str(v).strip()]
+
+
+def build_sections(values):
+    """Build report sections, in the shape the text parser produces, from parsed JSON members"""
+    sections = {
+        "summary": "",
+        "symptom_analysis": [],
+        "possible_conditions": [],
+        "warning_signs": [],
+        "next_steps": "",
+        "self_care": [],
+        "prevention": []
+    }
+    for key, value in values.items():
+        if key in sections:
+            sections[key] = section_value(key, value)
+
+    condition_details = {}
+    urgency_levels = {}
+    likelihood_percentages = {}
+    supporting_symptoms = {}
+    for condition in _conditions(values.get("possible_conditions")):
+        name = condition["name"].strip()
+        if condition.get("explanation"):
+            condition_details[name] = str(condition["explanation"]).strip()
+        urgency = str(condition.get("urgency", "")).strip().lower()
+        if urgency in URGENCY_PHRASES:
+            urgency_levels[name] = URGENCY_PHRASES[urgency]
+        elif urgency in URGENCY_PHRASES.values():
+            urgency_levels[name] = urgency
+        try:
+            likelihood_percentages[name] = int(float(str(condition.get("likelihood", "")).rstrip('%')))
+        except ValueError:
+            pass
+        if isinstance(condition.get("supporting_symptoms"), list):
+            supporting_symptoms[name] = [str(s).strip() for s in condition["supporting_symptoms"]]
+
+    if condition_details:
+        sections["condition_details"] = condition_details
+    if urgency_levels:
+        sections["urgency_levels"] = urgency_levels
+    if likelihood_percentages:
+        sections["likelihood_percentages"] = likelihood_percentages
+    if supporting_symptoms:
+        sections["supporting_symptoms"] = supporting_symptoms
+    return sections
+
+
+def _conditions(value):
+    if not isinstance(value, list):
+        return []
+    return [c for c in value if isinstance(c, dict) and isinstance(c.get("name"), str) and c["name"].strip()]
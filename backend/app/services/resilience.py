@@ -0,0 +1,310 @@
+import asyncio
+import os
+import random
+import threading
+import time
+
+
+class CircuitBreaker:
+    """Closed/open/half-open breaker over consecutive model failures
+
+    After failure_threshold consecutive failures the breaker opens and every
+    call is refused for reset_timeout seconds. It then lets a single probe
+    through (half-open); a success closes it, a failure opens it again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+        self.rejected = 0
+        self.opened = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self):
+        if self._state == self.OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+            self._probe_in_flight = False
+        return self._state
+
+    def allow(self):
+        """Whether a call may go to the model now"""
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self.rejected += 1
+            return False
+
+    def release_probe(self):
+        """Forget a half-open probe that was admitted but never ran"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            state = self._current_state()
+            if state == self.HALF_OPEN or (state == self.CLOSED and self._failures >= self.failure_threshold):
+                self._state = self.OPEN
+                self._opened_at = self._clock()
+                self._probe_in_flight = False
+                self.opened += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "state": self._current_state(),
+                "consecutive_failures": self._failures,
+                "opened": self.opened,
+                "rejected": self.rejected
+            }
+
+
+class RetryBudget:
+    """Caps retries to a fraction of recent requests across all callers
+
+    Every request deposits ratio tokens (up to a ceiling) and every retry
+    withdraws one, so a brownout cannot multiply traffic to the model by the
+    per-call retry count. min_per_second keeps a trickle of retries
+    available when traffic is low.
+    """
+
+    def __init__(self, ratio=0.1, min_per_second=1.0, max_tokens=10.0, clock=time.monotonic):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.max_tokens = max_tokens
+        self._clock = clock
+        self._tokens = max_tokens
+        self._updated = clock()
+        self._lock = threading.Lock()
+        self.retries = 0
+        self.exhausted = 0
+
+    def _refill(self):
+        now = self._clock()
+        self._tokens = min(self.max_tokens, self._tokens + (now - self._updated) * self.min_per_second)
+        self._updated = now
+
+    def deposit(self):
+        with self._lock:
+            self._refill()
+            self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def withdraw(self):
+        """Take a token for one retry; False when the budget is spent"""
+        with self._lock:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                self.retries += 1
+                return True
+            self.exhausted += 1
+            return False
+
+    def stats(self):
+        with self._lock:
+            self._refill()
+            return {"tokens": round(self._tokens, 2), "retries": self.retries, "exhausted": self.exhausted}
+
+
+class AIMDLimiter:
+    """Adaptive concurrency limit: additive increase, multiplicative decrease
+
+    Each successful call raises the limit by 1/limit; a failed or slow call
+    multiplies it by backoff. Callers that find the limit reached are turned
+    away instead of queueing.
+    """
+
+    def __init__(self, initial=8, min_limit=1, max_limit=64, backoff=0.5):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self._limit = float(max(min_limit, min(initial, max_limit)))
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    @property
+    def limit(self):
+        return int(self._limit)
+
+    def try_acquire(self, reserve=0):
+        """Take a slot unless fewer than reserve + 1 are free
+
+        Callers passing a reserve are optional work; their refusals are not
+        counted as rejections.
+        """
+        with self._lock:
+            if self._in_flight + reserve >= int(self._limit):
+                if not reserve:
+                    self.rejected += 1
+                return False
+            self._in_flight += 1
+            return True
+
+    def cancel(self):
+        """Give back a slot that was never used, leaving the limit unchanged"""
+        with self._lock:
+            self._in_flight = max(0, self._in_flight - 1)
+
+    def release(self, success):
+        with self._lock:
+            self._in_flight = max(0, self._in_flight - 1)
+            if success:
+                self._limit = min(self.max_limit, self._limit + 1.0 / self._limit)
+            else:
+                self._limit = max(self.min_limit, self._limit * self.backoff)
+
+    def stats(self):
+        with self._lock:
+            return {"limit": int(self._limit), "in_flight": self._in_flight, "rejected": self.rejected}
+
+
+def backoff_delay(attempt, base=0.25, cap=4.0):
+    """Full-jitter exponential backoff for the given retry attempt (1-based)"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class ModelGuard:
+    """Breaker, retry budget and concurrency limiter applied together to model calls
+
+    A call that succeeds slower than latency_target counts as a failure for
+    the breaker and the limiter, so a slow model sheds load like a failing one.
+    """
+
+    def __init__(self, breaker, budget, limiter, max_retries=2, latency_target=None, clock=time.monotonic):
+        self.breaker = breaker
+        self.budget = budget
+        self.limiter = limiter
+        self.max_retries = max_retries
+        self.latency_target = latency_target
+        self._clock = clock
+
+    def admit(self, background=False):
+        """Reserve a slot for a model call; False means shed to the local fallback
+
+        Background calls (reports generated ahead of need) only run while
+        the breaker is closed and half of the concurrency limit is free, so
+        they never take the recovery probe or a slot a user is waiting for.
+        """
+        if background:
+            if self.breaker.state != CircuitBreaker.CLOSED:
+                return False
+            reserve = max(1, self.limiter.limit // 2)
+        else:
+            reserve = 0
+        if not self.limiter.try_acquire(reserve):
+            return False
+        if not self.breaker.allow():
+            self.limiter.cancel()
+            return False
+        self.budget.deposit()
+        return True
+
+    def abandon(self):
+        """Return an admitted slot whose call was cancelled before it started"""
+        self.limiter.cancel()
+        self.breaker.release_probe()
+
+    def call(self, fn):
+        """Run fn() in an admitted slot with budgeted, jittered retries, then release the slot"""
+        started = self._clock()
+        attempt = 0
+        while True:
+            try:
+                result = fn()
+            except Exception:
+                attempt += 1
+                self.breaker.record_failure()
+                if attempt > self.max_retries or not self.breaker.allow() or not self.budget.withdraw():
+                    self.limiter.release(False)
+                    raise
+                time.sleep(backoff_delay(attempt))
+                continue
+            self.finish(True, started)
+            return result
+
+    async def call_async(self, fn, executor):
+        """Run fn() on executor in an admitted slot like call(), awaiting it and sleeping between retries without a thread
+
+        A call cancelled by its caller's deadline keeps the slot until fn()
+        has actually returned, then releases it as a failure, so the limit
+        still counts the threads busy with abandoned calls.
+        """
+        started = self._clock()
+        attempt = 0
+        while True:
+            future = executor.submit(fn)
+            try:
+                result = await asyncio.wrap_future(future)
+            except asyncio.CancelledError:
+                future.add_done_callback(lambda f: self.finish(False, started))
+                raise
+            except Exception:
+                attempt += 1
+                self.breaker.record_failure()
+                if attempt > self.max_retries or not self.breaker.allow() or not self.budget.withdraw():
+                    self.limiter.release(False)
+                    raise
+                try:
+                    await asyncio.sleep(backoff_delay(attempt))
+                except asyncio.CancelledError:
+                    self.limiter.release(False)
+                    raise
+                continue
+            self.finish(True, started)
+            return result
+
+    def finish(self, success, started):
+        """Release an admitted slot, recording the outcome of a call begun at started"""
+        slow = self.latency_target is not None and self._clock() - started > self.latency_target
+        if success and not slow:
+            self.breaker.record_success()
+            self.limiter.release(True)
+        else:
+            self.breaker.record_failure()
+            self.limiter.release(False)
+
+    def stats(self):
+        return {
+            "breaker": self.breaker.stats(),
+            "retry_budget": self.budget.stats(),
+            "concurrency": self.limiter.stats()
+        }
+
+
+def create_model_guard(max_concurrency, timeout):
+    """Create the ModelGuard configured through environment variables"""
+    return ModelGuard(
+        CircuitBreaker(
+            failure_threshold=int(os.environ.get('GEMINI_BREAKER_FAILURES', 5)),
+            reset_timeout=float(os.environ.get('GEMINI_BREAKER_RESET_SECONDS', 30))
+        ),
+        RetryBudget(ratio=float(os.environ.get('GEMINI_RETRY_BUDGET_RATIO', 0.1))),
+        AIMDLimiter(initial=max_concurrency, min_limit=1, max_limit=max_concurrency),
+        max_retries=int(os.environ.get('GEMINI_MAX_RETRIES', 2)),
+        latency_target=timeout
+    )
@@ -0,0 +1,98 @@
+import numpy as np
+
+# Score adjustments for likelihood_factors entries that name a reported symptom
+INCREASES_WEIGHT = 0.15
+DECREASES_WEIGHT = -0.3
+
+
+class DifferentialScorer:
+    """Vectorized condition ranking over the conditions.json knowledge base
+
+    Conditions are encoded once as a dense condition x symptom matrix of
+    relationship strengths (from ConditionIndex), normalized so a condition
+    whose every symptom is reported scores 1.0. likelihood_factors that name a
+    symptom add a second, signed matrix. A batch of cases is encoded as a
+    case x symptom indicator matrix and scored with one matrix multiply.
+    """
+
+    def __init__(self, condition_index, symptom_key, condition_symptom_key=None):
+        self._symptom_key = symptom_key
+        condition_symptom_key = condition_symptom_key or symptom_key
+        self.conditions = [condition_index.conditions[cid] for cid in condition_index.condition_weights]
+        self.condition_ids = [c['id'] for c in self.conditions]
+
+        factor_keys = []
+        for condition in self.conditions:
+            factors = condition.get('likelihood_factors', {})
+            for direction, weight in (('increases', INCREASES_WEIGHT), ('decreases', DECREASES_WEIGHT)):
+                for factor in factors.get(direction, []):
+                    factor_keys.append((condition['id'], condition_symptom_key(factor), weight))
+
+        keys = set()
+        for weights in condition_index.condition_weights.values():
+            keys.update(weights)
+        keys.update(key for _, key, _ in factor_keys)
+        self.symptom_keys = sorted(keys)
+        self._column = {key: i for i, key in enumerate(self.symptom_keys)}
+        self.labels = condition_index.labels
+
+        n_conditions, n_symptoms = len(self.conditions), len(self.symptom_keys)
+        weights = np.zeros((n_conditions, n_symptoms), dtype=np.float32)
+        for row, condition_id in enumerate(self.condition_ids):
+            for key, strength in condition_index.condition_weights[condition_id].items():
+                weights[row, self._column[key]] = strength
+        totals = weights.sum(axis=1, keepdims=True)
+        totals[totals == 0] = 1.0
+        self._weights = weights
+        self._normalized_t = (weights / totals).T.copy()
+
+        modifiers = np.zeros((n_conditions, n_symptoms), dtype=np.float32)
+        row_of = {cid: row for row, cid in enumerate(self.condition_ids)}
+        for condition_id, key, weight in factor_keys:
+            modifiers[row_of[condition_id], self._column[key]] += weight
+        self._modifiers_t = modifiers.T.copy()
+
+    def encode(self, symptoms):
+        """Indicator vector of the known symptom keys among free-text symptoms"""
+        vector = np.zeros(len(self.symptom_keys), dtype=np.float32)
+        for symptom in symptoms:
+            column = self._column.get(self._symptom_key(symptom))
+            if column is not None:
+                vector[column] = 1.0
+        return vector
+
+    def score(self, matrix):
+        """Score a case x symptom matrix; returns a case x condition matrix in [0, 1]"""
+        scores = matrix @ self._normalized_t + matrix @ self._modifiers_t
+        return np.clip(scores, 0.0, 1.0)
+
+    def rank(self, symptom_sets, top_k=5):
+        """Rank conditions for each symptom set with a single matrix multiply"""
+        if not symptom_sets or not self.condition_ids:
+            return [[] for _ in symptom_sets]
+        matrix = np.stack([self.encode(symptoms) for symptoms in symptom_sets])
+        scores = self.score(matrix)
+        top_k = min(top_k, len(self.condition_ids))
+        # argpartition finds the top rows per case without a full sort
+        top = np.argpartition(-scores, top_k - 1, axis=1)[:, :top_k]
+
+        rankings = []
+        for case, columns in enumerate(top):
+            ordered = sorted(columns, key=lambda c: (-scores[case, c], self.condition_ids[c]))
+            ordered = [c for c in ordered if scores[case, c] > 0]
+            total = float(sum(scores[case, c] for c in ordered)) or 1.0
+            present = matrix[case] > 0
+            ranking = []
+            for c in ordered:
+                condition = self.conditions[c]
+                matched = np.nonzero(present & (self._weights[c] > 0))[0]
+                ranking.append({
+                    "id": condition['id'],
+                    "name": condition['name'],
+                    "score": round(float(scores[case, c]), 4),
+                    "likelihood": int(round(100 * float(scores[case, c]) / total)),
+                    "urgency_level": condition.get('urgency_level'),
+                    "matched_symptoms": [self.labels[self.symptom_keys[i]] for i in matched]
+                })
+            rankings.append(ranking)
+        return rankings
@@ -0,0 +1,182 @@
+import re
+from collections import defaultdict
+
+_PUNCTUATION_RE = re.compile(r'[^\w\s]')
+
+NGRAM_SIZE = 3
+
+
+def normalize_text(text):
+    """Lowercase text and strip punctuation the same way for index and queries"""
+    return _PUNCTUATION_RE.sub('', text.lower()).strip()
+
+
+def _ngrams(text):
+    padded = f" {text} "
+    return {padded[i:i + NGRAM_SIZE] for i in range(len(padded) - NGRAM_SIZE + 1)}
+
+
+class _TrieNode:
+    __slots__ = ("children", "ids")
+
+    def __init__(self):
+        self.children = {}
+        self.ids = set()
+
+
+class SymptomSearchIndex:
+    """Precomputed lookup structures for symptom search
+
+    Built once from the symptom catalog. Every name and synonym is normalized
+    up front and registered in a token inverted index, a prefix trie over
+    tokens and a character trigram table, so a query only touches the
+    entries that share something with it.
+    """
+
+    def __init__(self, symptoms, limit=15):
+        self.symptoms = [s for s in symptoms if 'name' in s and 'id' in s]
+        self.limit = limit
+        self._names = []
+        self._name_words = []
+        self._synonyms = []
+        self._name_lookup = {}
+        self._token_index = defaultdict(set)
+        self._synonym_token_index = defaultdict(set)
+        self._ngram_index = defaultdict(set)
+        # Trigram sets of each entry's name and synonyms, scored one string at a time
+        self._string_ngrams = []
+        self._min_ngram_counts = []
+        self._trie = _TrieNode()
+
+        for idx, symptom in enumerate(self.symptoms):
+            name = normalize_text(symptom['name'])
+            words = frozenset(name.split())
+            synonyms = tuple(normalize_text(s) for s in symptom.get('synonyms', []) if s)
+
+            self._names.append(name)
+            self._name_words.append(words)
+            self._synonyms.append(synonyms)
+            self._name_lookup.setdefault(name, idx)
+
+            for word in words:
+                self._token_index[word].add(idx)
+                self._insert_prefix(word, idx)
+            for synonym in synonyms:
+                for word in synonym.split():
+                    self._synonym_token_index[word].add(idx)
+                    self._insert_prefix(word, idx)
+
+            string_ngrams = tuple(_ngrams(text) for text in (name,) + synonyms)
+            self._string_ngrams.append(string_ngrams)
+            self._min_ngram_counts.append(min(len(grams) for grams in string_ngrams))
+            for grams in string_ngrams:
+                for gram in grams:
+                    self._ngram_index[gram].add(idx)
+
+    def _insert_prefix(self, word, idx):
+        node = self._trie
+        for char in word:
+            node = node.children.setdefault(char, _TrieNode())
+            node.ids.add(idx)
+
+    def _prefix_ids(self, prefix):
+        node = self._trie
+        for char in prefix:
+            node = node.children.get(char)
+            if node is None:
+                return set()
+        return node.ids
+
+    def _substring_ids(self, query):
+        """Ids of entries whose name or a synonym may contain the query"""
+        if len(query) >= NGRAM_SIZE:
+            grams = {query[i:i + NGRAM_SIZE] for i in range(len(query) - NGRAM_SIZE + 1)}
+            postings = sorted((self._ngram_index.get(g, set()) for g in grams), key=len)
+            candidates = set(postings[0])
+            for posting in postings[1:]:
+                candidates &= posting
+                if not candidates:
+                    break
+            return candidates
+        # Very short queries: the gram table is small enough to scan its keys
+        candidates = set()
+        for gram, ids in self._ngram_index.items():
+            if query in gram:
+                candidates |= ids
+        return candidates
+
+    def search(self, query):
+        """Return ranked symptom dicts matching the query"""
+        normalized_query = normalize_text(query)
+        if not normalized_query:
+            return self.symptoms[:self.limit]
+
+        query_words = frozenset(normalized_query.split())
+        ranked = {}
+
+        # Each entry keeps the first rule it matches, checked in this order:
+        # exact name, name substring, synonym, word overlap on the name
+        def offer(idx, tier, score=0.0):
+            ranked.setdefault(idx, (tier, score))
+
+        exact = self._name_lookup.get(normalized_query)
+        if exact is not None:
+            offer(exact, 0)
+
+        for idx in self._substring_ids(normalized_query):
+            if normalized_query in self._names[idx]:
+                offer(idx, 1, 0.0)
+            elif any(normalized_query in s or s in normalized_query for s in self._synonyms[idx]):
+                offer(idx, 2)
+
+        # Synonyms that are contained in a longer query
+        synonym_ids = set()
+        for word in query_words:
+            synonym_ids |= self._synonym_token_index.get(word, set())
+        for idx in synonym_ids:
+            if any(s and s in normalized_query for s in self._synonyms[idx]):
+                offer(idx, 2)
+
+        # Word overlap on names shares the substring tier, ranked by overlap
+        overlap_ids = set()
+        for word in query_words:
+            overlap_ids |= self._token_index.get(word, set())
+        for idx in overlap_ids:
+            words = self._name_words[idx]
+            overlap = len(query_words & words) / max(len(query_words), len(words))
+            offer(idx, 1, overlap)
+
+        # Token prefixes catch partially typed words ("short brea")
+        prefix_ids = None
+        for word in query_words:
+            ids = self._prefix_ids(word)
+            prefix_ids = set(ids) if prefix_ids is None else prefix_ids & ids
+            if not prefix_ids:
+                break
+        for idx in prefix_ids or ():
+            offer(idx, 3)
+
+        # Trigram similarity for misspellings
+        if len(ranked) < self.limit:
+            query_grams = _ngrams(normalized_query)
+            shared = defaultdict(int)
+            for gram in query_grams:
+                for idx in self._ngram_index.get(gram, ()):
+                    shared[idx] += 1
+            for idx, count in shared.items():
+                if idx in ranked:
+                    continue
+                # Grams shared with the name and synonyms together bound the
+                # score of each; only entries that could pass are scored
+                if 2 * count / (len(query_grams) + self._min_ngram_counts[idx]) < 0.5:
+                    continue
+                # Best match among the name and synonyms, each against its own gram count
+                dice = max(
+                    2 * len(query_grams & grams) / (len(query_grams) + len(grams))
+                    for grams in self._string_ngrams[idx]
+                )
+                if dice >= 0.5:
+                    offer(idx, 4, dice)
+
+        ordered = sorted(ranked.items(), key=lambda item: (item[1][0], -item[1][1], item[0]))
+        return [self.symptoms[idx] for idx, _ in ordered[:self.limit]]
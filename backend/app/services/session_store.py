@@ -0,0 +1,232 @@
+import abc
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+# Payloads above this size are zlib-compressed before they leave the process
+COMPRESS_THRESHOLD = 512
+
+
+def serialize_session(session):
+    """Encode a session dict into a compact byte string"""
+    raw = json.dumps(session, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    if len(raw) > COMPRESS_THRESHOLD:
+        return b'z' + zlib.compress(raw, 6)
+    return b'j' + raw
+
+
+def deserialize_session(payload):
+    """Decode a byte string produced by serialize_session"""
+    if isinstance(payload, str):
+        payload = payload.encode('utf-8')
+    marker, body = payload[:1], payload[1:]
+    if marker == b'z':
+        body = zlib.decompress(body)
+    return json.loads(body.decode('utf-8'))
+
+
+class SessionStore(abc.ABC):
+    """Interface for assessment session storage
+
+    Sessions are plain JSON-compatible dicts. Callers fetch a session with
+    get(), mutate it and persist it again with save(); stores other than the
+    in-memory one never see in-place mutations until save() is called.
+    """
+
+    @abc.abstractmethod
+    def get(self, session_id):
+        """The session stored under session_id, or None"""
+
+    @abc.abstractmethod
+    def save(self, session_id, session):
+        """Store session under session_id, replacing any previous version"""
+
+    @abc.abstractmethod
+    def delete(self, session_id):
+        """Remove a session; unknown ids are ignored"""
+
+    @abc.abstractmethod
+    def __len__(self):
+        """Number of live sessions"""
+
+    def size(self):
+        """Number of live sessions for the metrics, or None when the store cannot count them cheaply"""
+        return len(self)
+
+    def __contains__(self, session_id):
+        return self.get(session_id) is not None
+
+
+class MemorySessionStore(SessionStore):
+    """In-process store with LRU eviction and idle expiry"""
+
+    def __init__(self, max_sessions=10000, ttl=7200):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id):
+        if not session_id:
+            return None
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return None
+            expires_at, session = entry
+            if expires_at <= time.monotonic():
+                del self._sessions[session_id]
+                return None
+            self._sessions.move_to_end(session_id)
+            return session
+
+    def save(self, session_id, session):
+        with self._lock:
+            self._sessions[session_id] = (time.monotonic() + self.ttl, session)
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+    def delete(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def purge_expired(self):
+        """Drop every expired session and return how many were removed"""
+        now = time.monotonic()
+        with self._lock:
+            expired = [sid for sid, (expires_at, _) in self._sessions.items() if expires_at <= now]
+            for sid in expired:
+                del self._sessions[sid]
+        return len(expired)
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+class SQLiteSessionStore(SessionStore):
+    """File-backed store shared by all worker processes on one host"""
+
+    PURGE_INTERVAL = 500
+
+    def __init__(self, path, ttl=7200):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+        self._writes = 0
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        conn = self._connection()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "id TEXT PRIMARY KEY, data BLOB NOT NULL, expires_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS sessions_expires_at ON sessions (expires_at)")
+        conn.commit()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, session_id):
+        if not session_id:
+            return None
+        row = self._connection().execute(
+            "SELECT data, expires_at FROM sessions WHERE id = ?", (session_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        if row[1] <= time.time():
+            self.delete(session_id)
+            return None
+        return deserialize_session(row[0])
+
+    def save(self, session_id, session):
+        conn = self._connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO sessions (id, data, expires_at) VALUES (?, ?, ?)",
+            (session_id, serialize_session(session), time.time() + self.ttl)
+        )
+        conn.commit()
+        self._writes += 1
+        if self._writes % self.PURGE_INTERVAL == 0:
+            self.purge_expired()
+
+    def delete(self, session_id):
+        conn = self._connection()
+        conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+        conn.commit()
+
+    def purge_expired(self):
+        """Drop every expired session and return how many were removed"""
+        conn = self._connection()
+        cursor = conn.execute("DELETE FROM sessions WHERE expires_at <= ?", (time.time(),))
+        conn.commit()
+        return cursor.rowcount
+
+    def __len__(self):
+        row = self._connection().execute(
+            "SELECT COUNT(*) FROM sessions WHERE expires_at > ?", (time.time(),)
+        ).fetchone()
+        return row[0]
+
+
+class RedisSessionStore(SessionStore):
+    """Store for any client speaking the Redis GET/SET/EXPIRE/DEL commands"""
+
+    def __init__(self, client, ttl=7200, prefix="hcb:session:"):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, session_id):
+        if not session_id:
+            return None
+        key = self.prefix + session_id
+        payload = self.client.get(key)
+        if payload is None:
+            return None
+        # Sliding expiry: every access keeps the conversation alive
+        self.client.expire(key, int(self.ttl))
+        return deserialize_session(payload)
+
+    def save(self, session_id, session):
+        self.client.set(self.prefix + session_id, serialize_session(session), ex=int(self.ttl))
+
+    def delete(self, session_id):
+        self.client.delete(self.prefix + session_id)
+
+    def __len__(self):
+        # O(keyspace): walks every key on the server; size() skips it for the metrics
+        return sum(1 for _ in self.client.scan_iter(match=self.prefix + "*", count=1000))
+
+    def size(self):
+        return None
+
+
+def create_session_store():
+    """Create the session store configured through environment variables"""
+    kind = os.environ.get('SESSION_STORE_BACKEND', 'memory').lower()
+    ttl = int(os.environ.get('SESSION_TTL', 7200))
+    if kind == 'memory':
+        return MemorySessionStore(
+            max_sessions=int(os.environ.get('SESSION_MAX_ENTRIES', 10000)),
+            ttl=ttl
+        )
+    if kind == 'sqlite':
+        default_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'instance', 'sessions.db')
+        return SQLiteSessionStore(os.environ.get('SESSION_DB_PATH', default_path), ttl=ttl)
+    if kind == 'redis':
+        import redis
+        client = redis.Redis.from_url(os.environ.get('REDIS_URL', 'redis://localhost:6379/0'))
+        return RedisSessionStore(client, ttl=ttl)
+    raise ValueError(f"Unknown session store backend: {kind}")
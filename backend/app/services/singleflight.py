@@ -0,0 +1,131 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+
+class SingleFlight:
+    """Coalesces concurrent calls for the same key into one
+
+    The first caller for a key (the leader) runs the work; callers arriving
+    while it is in flight wait for its result instead of repeating it. At
+    most max_waiters callers wait on one key and each waits at most its own
+    timeout; a caller turned away, timed out or whose leader failed gets
+    fallback(reason) instead, with reason "shed", "timeout" or "error".
+    Nothing is kept after the leader finishes, so results are only shared
+    between overlapping calls. Sync and async callers can share one flight.
+    """
+
+    def __init__(self, max_waiters=64):
+        self.max_waiters = max_waiters
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.shared = 0
+        self.shed = 0
+        self.timed_out = 0
+
+    def do(self, key, fn, fallback, timeout=None):
+        """Return fn(), or the result of the call for key already in flight"""
+        future, leading = self._join(key)
+        if leading:
+            return self._lead(key, future, fn)
+        if future is None:
+            return fallback("shed")
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            self._count_timeout()
+            return fallback("timeout")
+        except Exception:
+            return fallback("error")
+        finally:
+            self._leave(key, future)
+
+    async def do_async(self, key, fn, fallback, timeout=None):
+        """do() for coroutine functions: fn is awaited and waiters hold no thread"""
+        future, leading = self._join(key)
+        if leading:
+            try:
+                result = await fn()
+            except BaseException as e:
+                self._land(key, future, error=e)
+                raise
+            self._land(key, future, result=result)
+            return result
+        if future is None:
+            return fallback("shed")
+        try:
+            # Shielded so a waiter's own cancellation leaves the shared call running
+            return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), timeout)
+        except asyncio.TimeoutError:
+            self._count_timeout()
+            return fallback("timeout")
+        except Exception:
+            return fallback("error")
+        finally:
+            self._leave(key, future)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "in_flight": len(self._flights),
+                "leaders": self.leaders,
+                "shared": self.shared,
+                "shed": self.shed,
+                "timed_out": self.timed_out
+            }
+
+    def _join(self, key):
+        """(future, leading) for a caller of key; future is None when the key has max_waiters waiting"""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None:
+                future = Future()
+                self._flights[key] = [future, 0]
+                self.leaders += 1
+                return future, True
+            if flight[1] >= self.max_waiters:
+                self.shed += 1
+                return None, False
+            flight[1] += 1
+            self.shared += 1
+            return flight[0], False
+
+    def _lead(self, key, future, fn):
+        try:
+            result = fn()
+        except BaseException as e:
+            self._land(key, future, error=e)
+            raise
+        self._land(key, future, result=result)
+        return result
+
+    def _land(self, key, future, result=None, error=None):
+        """Publish the leader's outcome and close the flight to new waiters"""
+        with self._lock:
+            del self._flights[key]
+        if error is None:
+            future.set_result(result)
+        elif isinstance(error, Exception):
+            future.set_exception(error)
+        else:
+            # A cancelled or interrupted leader is a failure for its waiters
+            future.set_exception(RuntimeError(f"call for {key!r} was interrupted"))
+
+    def _leave(self, key, future):
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None and flight[0] is future:
+                flight[1] -= 1
+
+    def _count_timeout(self):
+        with self._lock:
+            self.timed_out += 1
+
+
+def create_single_flight():
+    """Create the request coalescer configured through environment variables, or None when disabled"""
+    if os.environ.get('ASSESSMENT_COALESCE', '1').lower() in ('0', 'false', 'no', 'off'):
+        return None
+    return SingleFlight(max_waiters=int(os.environ.get('ASSESSMENT_COALESCE_MAX_WAITERS', 64)))
@@ -0,0 +1,137 @@
+import bisect
+import json
+import os
+from collections import deque
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'specialists.json')
+
+
+class AhoCorasick:
+    """Automaton finding every pattern that occurs in a text in one pass
+
+    find() walks the text once, following failure links on mismatches, so
+    its cost is linear in the text length plus the matches reported, no
+    matter how many patterns were compiled.
+    """
+
+    def __init__(self, patterns):
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [()]
+        for pattern_id, pattern in enumerate(patterns):
+            state = 0
+            for char in pattern:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append(())
+                    self._goto[state][char] = next_state
+                state = next_state
+            self._out[state] += (pattern_id,)
+
+        # Breadth-first so every failure target is complete before it is used
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(char, 0)
+                self._fail[next_state] = target if target != next_state else 0
+                self._out[next_state] += self._out[self._fail[next_state]]
+
+    def find(self, text):
+        """Ids of the patterns occurring anywhere in text"""
+        goto, fail, out = self._goto, self._fail, self._out
+        found = set()
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if out[state]:
+                found.update(out[state])
+        return found
+
+
+class SpecialistMatcher:
+    """Ranks specialists for reported symptoms from symptom -> specialty rules
+
+    A rule matches a symptom when its key occurs in the lowercased symptom
+    or the symptom occurs in the key. Keys inside the symptom come from an
+    Aho-Corasick automaton; keys containing the symptom from a binary search
+    over the sorted suffixes of all keys. Every matched rule adds one point
+    to each of its specialists, which rank by points, ties in the order they
+    were first matched.
+    """
+
+    def __init__(self, rules, descriptions=None):
+        self.keys = []
+        self.specialists = []
+        self.descriptions = dict(descriptions or {})
+        specialist_ids = {}
+        self._rule_specialists = []
+        for key, specialists in rules.items():
+            key = key.lower()
+            if not key.strip():
+                continue
+            self.keys.append(key)
+            ids = []
+            for name in specialists:
+                if name not in specialist_ids:
+                    specialist_ids[name] = len(self.specialists)
+                    self.specialists.append(name)
+                ids.append(specialist_ids[name])
+            self._rule_specialists.append(tuple(ids))
+
+        self._automaton = AhoCorasick(self.keys)
+        suffixes = sorted((key[i:], key_id) for key_id, key in enumerate(self.keys) for i in range(len(key)))
+        self._suffixes = [suffix for suffix, _ in suffixes]
+        self._suffix_keys = [key_id for _, key_id in suffixes]
+
+    @classmethod
+    def from_file(cls, path):
+        """Load {"rules": {symptom: [specialist, ...]}, "descriptions": {specialist: text}}"""
+        with open(path, 'r') as f:
+            data = json.load(f)
+        return cls(data.get("rules", {}), data.get("descriptions"))
+
+    def recommend(self, symptoms, limit=3):
+        """Top specialists for the symptoms with their descriptions and scores"""
+        scores = {}
+        for symptom in symptoms:
+            text = symptom.lower()
+            for key_id in sorted(self._automaton.find(text) | self._keys_containing(text)):
+                for specialist in self._rule_specialists[key_id]:
+                    scores[specialist] = scores.get(specialist, 0) + 1
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+        return [
+            {
+                "name": self.specialists[specialist],
+                "description": self.descriptions.get(self.specialists[specialist], "Medical specialist"),
+                "relevance_score": score
+            }
+            for specialist, score in ranked
+        ]
+
+    def _keys_containing(self, text):
+        found = set()
+        index = bisect.bisect_left(self._suffixes, text)
+        while index < len(self._suffixes) and self._suffixes[index].startswith(text):
+            found.add(self._suffix_keys[index])
+            index += 1
+        return found
+
+
+def create_specialist_matcher(path=None):
+    """Load the specialist rules from app/data/specialists.json, or an empty matcher when missing"""
+    path = path or DEFAULT_PATH
+    if not os.path.exists(path):
+        print(f"Warning: Could not find data file {path}")
+        return SpecialistMatcher({})
+    return SpecialistMatcher.from_file(path)
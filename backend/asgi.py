@@ -0,0 +1,7 @@
+import os
+
+from app.asgi import create_asgi_app
+
+# ASGI serving mode, e.g. `uvicorn asgi:app --host 0.0.0.0 --port 8000`;
+# run.py and gunicorn serve the same app over WSGI
+app = create_asgi_app(os.environ.get('FLASK_CONFIG', 'production'))
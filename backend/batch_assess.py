@@ -0,0 +1,46 @@
+"""Re-score a JSONL file of intakes offline
+
+Each input line is a JSON object with symptoms, age, biological_sex and
+optionally id, name and answers. One JSON result is written per line, in
+input order, followed by a summary line.
+
+    python batch_assess.py cases.jsonl -o results.jsonl
+
+Concurrency and rate limiting follow BATCH_MAX_WORKERS,
+BATCH_RATE_PER_SECOND and BATCH_RATE_BURST, as for /api/assessment/batch.
+"""
+import argparse
+import json
+import sys
+
+from app import create_app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Assess a JSONL file of cases")
+    parser.add_argument('input', nargs='?', help="JSONL input file (default: stdin)")
+    parser.add_argument('-o', '--output', help="JSONL output file (default: stdout)")
+    args = parser.parse_args()
+
+    create_app('production')
+    from app.routes import assess_batch_case, batch_case_key, validate_batch_case
+    from app.services.batch import create_batch_assessor
+
+    runner = create_batch_assessor(assess_batch_case, batch_case_key, validate_batch_case)
+    source = open(args.input, 'r') if args.input else sys.stdin
+    target = open(args.output, 'w') if args.output else sys.stdout
+    try:
+        for result in runner.run(source):
+            target.write(json.dumps(result, separators=(',', ':')) + "\n")
+            target.flush()
+            if "summary" in result:
+                print(f"Batch finished: {result['summary']}", file=sys.stderr)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if target is not sys.stdout:
+            target.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,374 @@
+"""Benchmarks for full assessment conversations and the request hot paths
+
+Run from the backend directory:
+
+    python -m benchmarks.run                              # everything
+    python -m benchmarks.run conversations -c 16 -n 400 --model-latency 1.5
+    python -m benchmarks.run micro --save-baseline
+
+The conversation benchmark replays the scripts in conversations.json through
+/api/assessment/start and /api/assessment/next on the Flask test client, from
+-c threads at once, until each reaches its report. Gemini is replaced by a
+stub that answers with a canned JSON report after --model-latency seconds
+(+/- --model-jitter), so the numbers cover everything except the model.
+Each conversation gets a distinct height answer so reports are not served
+from the report cache, unless --reuse-reports is given.
+
+Micro-benchmarks time search_symptoms, get_next_question (walking every
+question flow), rank_conditions and both report parsers call by call,
+keeping the fastest of --repeat runs.
+
+Results are compared with baselines.json; --save-baseline records the
+current run there and --check exits non-zero when throughput or p95 latency
+regress by more than --tolerance. Baselines are only comparable on the
+machine that recorded them; re-record them before comparing elsewhere.
+"""
+import argparse
+import contextlib
+import json
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BASELINES = os.path.join(HERE, 'baselines.json')
+SCRIPTS = os.path.join(HERE, 'conversations.json')
+
+SAMPLE_REPORT = {
+    "summary": "Assessment for {patient}: The reported symptoms most likely reflect a self-limiting viral illness. Symptom timing and the absence of high fever argue against a bacterial cause. Persistent or worsening symptoms would warrant an in-person evaluation.",
+    "symptom_analysis": [
+        "Cough: 1-3 days, moderate, worse at night, triggered by cold air",
+        "Fatigue: 2 days, mild, constant, associated with poor sleep"
+    ],
+    "possible_conditions": [
+        {"name": "Common Cold", "likelihood": 55, "urgency": "self-care", "explanation": "Short duration with upper respiratory symptoms fits a viral cold.", "supporting_symptoms": ["cough", "fatigue"]},
+        {"name": "Influenza", "likelihood": 25, "urgency": "routine", "explanation": "Fatigue and cough during flu season make influenza possible.", "supporting_symptoms": ["cough", "fatigue"]},
+        {"name": "Acute Bronchitis", "likelihood": 15, "urgency": "routine", "explanation": "A cough lasting several days can reflect bronchial inflammation.", "supporting_symptoms": ["cough"]},
+        {"name": "Pneumonia", "likelihood": 5, "urgency": "prompt", "explanation": "Less likely without fever or shortness of breath.", "supporting_symptoms": ["cough"]}
+    ],
+    "warning_signs": [
+        "Shortness of breath or difficulty breathing",
+        "Fever above 39C (102F) lasting more than 2 days",
+        "Chest pain when breathing or coughing",
+        "Coughing up blood",
+        "Confusion or extreme drowsiness"
+    ],
+    "next_steps": "Rest and monitor your symptoms at home. Contact your primary care physician within 1 week if the cough persists, or within 24 hours if fever develops.",
+    "self_care": [
+        "Drink 2-3 liters of fluids daily",
+        "Use a humidifier at night",
+        "Take honey in warm water to soothe the cough",
+        "Sleep 7-9 hours to support recovery"
+    ],
+    "prevention": [
+        "Wash hands frequently with soap for 20 seconds",
+        "Get an annual flu vaccine",
+        "Avoid close contact with sick people",
+        "Do not smoke and avoid second-hand smoke"
+    ]
+}
+
+
+def _text_report(report):
+    """Render SAMPLE_REPORT in the headed-sections format of the text prompt"""
+    lines = ["1. SUMMARY:", report["summary"], "", "2. SYMPTOM ANALYSIS:"]
+    lines += [f"- {item}" for item in report["symptom_analysis"]]
+    lines += ["", "3. POSSIBLE CONDITIONS:"]
+    phrases = {"self-care": "Self-care appropriate", "routine": "Routine care recommended", "prompt": "Requires prompt attention"}
+    for condition in report["possible_conditions"]:
+        lines.append(f"- {condition['name']} ({condition['likelihood']}%): {phrases[condition['urgency']]}; {condition['explanation']}")
+        lines.append("  Key symptoms supporting this diagnosis:")
+        lines += [f"  - {s}" for s in condition["supporting_symptoms"]]
+    for number, title, key in ((4, "WARNING SIGNS", "warning_signs"), (6, "SELF-CARE", "self_care"), (7, "PREVENTION", "prevention")):
+        if key == "self_care":
+            lines += ["", "5. RECOMMENDED NEXT STEPS:", report["next_steps"]]
+        lines += ["", f"{number}. {title}:"] + [f"- {item}" for item in report[key]]
+    return "\n".join(lines)
+
+
+class _StubResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class StubModel:
+    """Stands in for genai.GenerativeModel, answering after a configurable delay"""
+
+    def __init__(self, latency, jitter=0.0, text=None, chunk_size=64):
+        self.latency = latency
+        self.jitter = jitter
+        self.text = text or json.dumps(SAMPLE_REPORT)
+        self.chunk_size = chunk_size
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _delay(self):
+        with self._lock:
+            self.calls += 1
+        return max(0.0, self.latency + random.uniform(-self.jitter, self.jitter))
+
+    def generate_content(self, prompt, generation_config=None, stream=False):
+        delay = self._delay()
+        if stream:
+            return self._stream(delay)
+        time.sleep(delay)
+        return _StubResponse(self.text)
+
+    def _stream(self, delay):
+        chunks = [self.text[i:i + self.chunk_size] for i in range(0, len(self.text), self.chunk_size)]
+        for chunk in chunks:
+            time.sleep(delay / len(chunks))
+            yield _StubResponse(chunk)
+
+
+def summarize(latencies, elapsed=None):
+    """Throughput and nearest-rank percentiles (in milliseconds) of per-operation latencies"""
+    ordered = sorted(latencies)
+    if not ordered:
+        return {"count": 0}
+
+    def percentile(p):
+        return round(ordered[min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered))) - 1))] * 1000, 3)
+
+    elapsed = elapsed if elapsed is not None else sum(ordered)
+    return {
+        "count": len(ordered),
+        "ops_per_sec": round(len(ordered) / elapsed, 2) if elapsed > 0 else None,
+        "p50_ms": percentile(50),
+        "p95_ms": percentile(95),
+        "p99_ms": percentile(99),
+        "max_ms": round(ordered[-1] * 1000, 3)
+    }
+
+
+def run_conversations(app, scripts, total, concurrency, reuse_reports=False, max_turns=80):
+    """Replay total scripted conversations from concurrency threads"""
+    local = threading.local()
+    turn_latencies = []
+    report_latencies = []
+    conversation_latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def converse(index):
+        client = getattr(local, 'client', None)
+        if client is None:
+            client = local.client = app.test_client()
+        script = scripts[index % len(scripts)]
+        height = "170cm 70kg" if reuse_reports else f"{150 + index % 50}cm {50 + index // 50}kg"
+        turns = []
+        started = time.perf_counter()
+
+        t = time.perf_counter()
+        response = client.post('/api/assessment/start')
+        turns.append(time.perf_counter() - t)
+        session_id = response.get_json()['session_id']
+
+        inputs = [value.format(name=f"Patient {index}", height=height) for value in script["inputs"]]
+        body = None
+        report_latency = None
+        for turn in range(max_turns):
+            if inputs:
+                answer = inputs.pop(0)
+            else:
+                options = (body or {}).get('options') or ["No"]
+                answer = "None of these" if "None of these" in options else options[script.get("option", 0)]
+            t = time.perf_counter()
+            response = client.post('/api/assessment/next', json={'session_id': session_id, 'input': answer})
+            turns.append(time.perf_counter() - t)
+            body = response.get_json()
+            if response.status_code != 200:
+                with lock:
+                    errors.append(f"{script['name']}: HTTP {response.status_code} at turn {turn}")
+                return
+            if 'report' in body:
+                report_latency = turns[-1]
+                break
+
+        with lock:
+            turn_latencies.extend(turns)
+            if report_latency is None:
+                errors.append(f"{script['name']}: no report after {max_turns} turns")
+                return
+            report_latencies.append(report_latency)
+            conversation_latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for future in [pool.submit(converse, i) for i in range(total)]:
+            future.result()
+    elapsed = time.perf_counter() - started
+
+    return {
+        "conversations": summarize(conversation_latencies, elapsed),
+        "turns": summarize(turn_latencies, elapsed),
+        "report_turn": summarize(report_latencies, elapsed),
+        "errors": errors
+    }
+
+
+def _best_of(measure, repeat):
+    """Run measure() repeat times and keep the fastest run, as timeit does"""
+    return max((measure() for _ in range(repeat)), key=lambda stats: stats.get("ops_per_sec") or 0)
+
+
+def _time_calls(calls, iterations):
+    # Warm memo tables and caches so the first run after start-up is comparable
+    for i in range(min(500, iterations)):
+        calls[i % len(calls)]()
+    latencies = []
+    for i in range(iterations):
+        fn = calls[i % len(calls)]
+        t = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - t)
+    return summarize(latencies)
+
+
+def _time_flow_walks(service, iterations):
+    """Time get_next_question step by step while walking every flow with its first options"""
+    flows = [flow['symptom_name'] for flow in service.questions.values() if flow.get('symptom_name')]
+    latencies = []
+    while len(latencies) < 2 * iterations:
+        for symptom in flows:
+            tracking = service.new_question_tracking()
+            question = service.get_first_question(symptom, tracking)
+            answers = {}
+            for _ in range(30):
+                if not question:
+                    break
+                answers[question['id']] = (question.get('options') or ["Yes"])[0]
+                t = time.perf_counter()
+                question = service.get_next_question(symptom, answers, tracking)
+                latencies.append(time.perf_counter() - t)
+    # The first half warms the flow graph and canonicalizer memo
+    return summarize(latencies[iterations:2 * iterations])
+
+
+def run_micro(service, ai, iterations, repeat=5, specialists=None):
+    queries = ["head", "chest pa", "cough", "stomach", "short of br", "dizz", "rash", "fev", "joint", "runny"]
+    symptom_sets = [["cough"], ["headache", "fever"], ["chest pain", "shortness of breath"], ["runny nose", "sore throat", "cough"]]
+    text_report = _text_report(SAMPLE_REPORT)
+    json_report = json.dumps(SAMPLE_REPORT, indent=2)
+
+    output_format = ai.output_format
+    try:
+        ai.output_format = 'json'
+        results = {
+            "micro.search_symptoms": _best_of(
+                lambda: _time_calls([lambda q=q: service.search_symptoms(q) for q in queries], iterations), repeat
+            ),
+            "micro.get_next_question": _best_of(lambda: _time_flow_walks(service, iterations), repeat),
+            "micro.rank_conditions": _best_of(
+                lambda: _time_calls([lambda s=s: service.rank_conditions(s) for s in symptom_sets], iterations), repeat
+            ),
+            "micro.parse_text_report": _best_of(
+                lambda: _time_calls([lambda: ai._parse_assessment_into_sections(text_report)], iterations), repeat
+            ),
+            "micro.parse_json_report": _best_of(lambda: _time_calls([lambda: ai._parse_report(json_report)], iterations), repeat)
+        }
+        if specialists is not None:
+            results["micro.recommend_specialists"] = _best_of(
+                lambda: _time_calls([lambda s=s: specialists.recommend(s) for s in symptom_sets], iterations), repeat
+            )
+    finally:
+        ai.output_format = output_format
+    return results
+
+
+def compare(results, baselines, tolerance):
+    """Print results next to their baselines; return the names that regressed"""
+    regressions = []
+    print(f"{'benchmark':<58} {'ops/s':>10} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}  vs baseline")
+    for name, stats in results.items():
+        if not stats.get("count"):
+            print(f"{name:<58} {'no samples':>10}")
+            continue
+        line = f"{name:<58} {stats['ops_per_sec']:>10} {stats['p50_ms']:>9} {stats['p95_ms']:>9} {stats['p99_ms']:>9}"
+        base = baselines.get(name)
+        if base and base.get("count"):
+            throughput = stats['ops_per_sec'] / base['ops_per_sec'] - 1 if base.get('ops_per_sec') else 0.0
+            p95 = stats['p95_ms'] / base['p95_ms'] - 1 if base.get('p95_ms') else 0.0
+            line += f"  ops/s {throughput:+.0%}, p95 {p95:+.0%}"
+            if throughput < -tolerance or p95 > tolerance:
+                regressions.append(name)
+                line += "  REGRESSION"
+        print(line)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark assessment conversations and hot paths")
+    parser.add_argument('suite', nargs='?', choices=('all', 'conversations', 'micro'), default='all')
+    parser.add_argument('-c', '--concurrency', type=int, default=8, help="concurrent conversations (default 8)")
+    parser.add_argument('-n', '--conversations', type=int, default=100, help="conversations to replay (default 100)")
+    parser.add_argument('--model-latency', type=float, default=0.5, help="stub model latency in seconds (default 0.5)")
+    parser.add_argument('--model-jitter', type=float, default=0.1, help="uniform +/- jitter on the latency (default 0.1)")
+    parser.add_argument('--reuse-reports', action='store_true', help="let conversations share cached reports")
+    parser.add_argument('-i', '--iterations', type=int, default=2000, help="calls per micro-benchmark run (default 2000)")
+    parser.add_argument('-r', '--repeat', type=int, default=5, help="micro-benchmark runs, the fastest is kept (default 5)")
+    parser.add_argument('--save-baseline', action='store_true', help="store this run in baselines.json")
+    parser.add_argument('--check', action='store_true', help="exit with status 1 when a benchmark regressed")
+    parser.add_argument('--tolerance', type=float, default=0.5, help="allowed relative regression (default 0.5)")
+    parser.add_argument('-o', '--output', help="also write the results as JSON to this file")
+    args = parser.parse_args()
+
+    random.seed(1)
+    # Service and request logging would dominate the measurements
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        from app import create_app
+        app = create_app('production')
+        import logging
+        app.logger.setLevel(logging.WARNING)
+        from app import routes
+
+        results = {}
+        if args.suite in ('all', 'micro'):
+            results.update(run_micro(
+                routes.assessment_service, routes.ai_service, args.iterations, args.repeat, routes.specialist_matcher
+            ))
+
+        errors = []
+        if args.suite in ('all', 'conversations'):
+            with open(SCRIPTS, 'r') as f:
+                scripts = json.load(f)["conversations"]
+            routes.ai_service.mode = 'llm'
+            routes.ai_service.model = StubModel(args.model_latency, args.model_jitter)
+            run = run_conversations(app, scripts, args.conversations, args.concurrency, args.reuse_reports)
+            label = f"c={args.concurrency},latency={args.model_latency}{',cached' if args.reuse_reports else ''}"
+            for key in ("conversations", "turns", "report_turn"):
+                results[f"{key}[{label}]"] = run[key]
+            errors = run["errors"]
+            model_calls = routes.ai_service.model.calls
+            from app.services.ai import FALLBACK_REPORTS
+            fallbacks = {reason: FALLBACK_REPORTS.value(reason=reason) for reason in ("unavailable", "local_mode", "shed", "timeout", "error")}
+
+    baselines = {}
+    if os.path.exists(BASELINES):
+        with open(BASELINES, 'r') as f:
+            baselines = json.load(f)
+    regressions = compare(results, baselines, args.tolerance)
+
+    if args.suite in ('all', 'conversations'):
+        print(f"stub model calls: {model_calls}, local fallback reports: {fallbacks}, conversation errors: {len(errors)}")
+        for error in errors[:10]:
+            print(f"  {error}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.save_baseline:
+        baselines.update(results)
+        with open(BASELINES, 'w') as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Saved {len(results)} baselines to {BASELINES}")
+    if args.check and (regressions or errors):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
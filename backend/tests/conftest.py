@@ -0,0 +1,23 @@
+import os
+import tempfile
+
+import pytest
+
+# Set before the app is imported: routes builds its services from the environment
+_instance = tempfile.mkdtemp(prefix='symptom-checker-tests-')
+os.environ["GEMINI_API_KEY"] = ""
+os.environ["SAVED_ASSESSMENTS_DB_PATH"] = os.path.join(_instance, 'assessments.db')
+os.environ["CONVERSATION_SPILL_DIR"] = os.path.join(_instance, 'conversations')
+os.environ["KNOWLEDGE_BASE_SNAPSHOT"] = "off"
+os.environ["KNOWLEDGE_BASE_RELOAD_INTERVAL"] = "0"
+
+
+@pytest.fixture(scope='session')
+def app():
+    from app import create_app
+    return create_app('development')
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
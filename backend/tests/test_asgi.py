@@ -0,0 +1,112 @@
+import asyncio
+import json
+
+from flask import Flask, Response
+
+from app.asgi import ASGIApp
+
+
+def http_scope(method, path, query_string=b""):
+    return {
+        "type": "http",
+        "method": method,
+        "path": path,
+        "root_path": "",
+        "query_string": query_string,
+        "headers": [(b"content-type", b"application/json")],
+        "http_version": "1.1",
+        "scheme": "http",
+        "server": ("localhost", 80),
+        "client": ("127.0.0.1", 5000),
+    }
+
+
+async def call(asgi_app, method, path, body=b"", query_string=b"", disconnect=None):
+    """Send one request; the client disconnects once disconnect (an Event) is set"""
+    sent = []
+    requested = False
+
+    async def receive():
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await (disconnect or asyncio.Event()).wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    await asgi_app(http_scope(method, path, query_string), receive, send)
+    return sent
+
+
+def test_async_views_are_awaited_on_the_loop(app):
+    asgi_app = ASGIApp(app)
+    assert asgi_app._routes_to_async_view(http_scope("GET", "/api/symptoms/search"))
+    assert not asgi_app._routes_to_async_view(http_scope("OPTIONS", "/api/symptoms/search"))
+    assert not asgi_app._routes_to_async_view(http_scope("GET", "/api/health"))
+
+    start, body = asyncio.run(call(asgi_app, "GET", "/api/symptoms/search", query_string=b"q=headache"))
+    assert start["status"] == 200
+    assert json.loads(body["body"])[0]["name"] == "Headache"
+
+    start, body = asyncio.run(call(asgi_app, "POST", "/api/assessment/quick", b"{not json"))
+    assert start["status"] == 400
+
+
+def test_other_requests_go_through_the_wsgi_adapter(app):
+    asgi_app = ASGIApp(app, wsgi_threads=2)
+    sent = asyncio.run(call(asgi_app, "GET", "/api/health"))
+    assert sent[0]["status"] == 200
+    assert json.loads(b"".join(m.get("body", b"") for m in sent[1:]))["status"]
+    assert asyncio.run(call(asgi_app, "GET", "/api/assessment/quick"))[0]["status"] == 405
+
+
+def test_lifespan_shutdown_stops_the_services(app, monkeypatch):
+    from app import routes
+
+    stopped = []
+    monkeypatch.setattr(routes, "shutdown", lambda: stopped.append(True))
+    messages = [{"type": "lifespan.startup"}, {"type": "lifespan.shutdown"}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message["type"])
+
+    asyncio.run(ASGIApp(app)({"type": "lifespan"}, receive, send))
+    assert sent == ["lifespan.startup.complete", "lifespan.shutdown.complete"]
+    assert stopped == [True]
+
+
+def test_streamed_response_stops_after_the_client_disconnects():
+    flask_app = Flask(__name__)
+    produced = []
+    closed = []
+
+    @flask_app.route('/stream')
+    def stream():
+        def chunks():
+            try:
+                for n in range(100):
+                    produced.append(n)
+                    yield f"chunk {n}\n"
+            finally:
+                closed.append(True)
+        return Response(chunks(), mimetype='text/plain')
+
+    async def main():
+        disconnect = asyncio.Event()
+        task = asyncio.create_task(call(ASGIApp(flask_app), "GET", "/stream", disconnect=disconnect))
+        while not produced:
+            await asyncio.sleep(0.001)
+        disconnect.set()
+        return await task
+
+    sent = asyncio.run(main())
+    assert closed == [True]
+    assert len(produced) < 100
+    assert not any(m.get("more_body") is False for m in sent[1:])
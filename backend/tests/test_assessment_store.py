@@ -0,0 +1,163 @@
+import sqlite3
+import threading
+
+import pytest
+
+from app.services.assessment_store import SavedAssessmentStore
+
+REPORT = {"summary": "Assessment for the patient", "possible_conditions": ["Migraine"], "urgency": "Low"}
+
+
+def record(assessment_id):
+    return {"id": assessment_id, "symptoms": ["headache"], "gathered_info": {"name": "Ann"}}
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'assessments.db')
+
+
+def test_concurrent_saves_are_all_readable_after_close(path):
+    store = SavedAssessmentStore(path, batch_size=64)
+    ids = [f"a-{thread}-{i}" for thread in range(8) for i in range(250)]
+
+    def save(chunk):
+        for assessment_id in chunk:
+            assert store.save(assessment_id, record(assessment_id), REPORT)
+
+    threads = [threading.Thread(target=save, args=(ids[k::8],)) for k in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    store.close()
+
+    assert store.stats()["saved"] == len(ids)
+    reopened = SavedAssessmentStore(path)
+    try:
+        for assessment_id in ids:
+            assert reopened.get(assessment_id) == (record(assessment_id), REPORT)
+    finally:
+        reopened.close()
+
+
+def test_identical_report_bodies_are_stored_once(path):
+    store = SavedAssessmentStore(path)
+    for i in range(50):
+        store.save(f"a-{i}", record(f"a-{i}"), REPORT)
+    store.save("other", record("other"), {**REPORT, "urgency": "High"})
+    store.close()
+
+    conn = sqlite3.connect(path)
+    try:
+        assert conn.execute("SELECT COUNT(*) FROM report_bodies").fetchone()[0] == 2
+        assert conn.execute("SELECT COUNT(*) FROM saved_assessments").fetchone()[0] == 51
+    finally:
+        conn.close()
+    assert store.stats()["deduplicated"] == 49
+
+
+def test_failed_commit_is_retried_without_losing_saves(path):
+    store = SavedAssessmentStore(path, retry_delays=(0, 0, 0))
+    commit = store._commit
+    failures = []
+
+    def flaky_commit(conn, bodies, batch):
+        if len(failures) < 2:
+            failures.append(len(batch))
+            raise sqlite3.OperationalError("database is locked")
+        return commit(conn, bodies, batch)
+
+    store._commit = flaky_commit
+    for i in range(100):
+        store.save(f"a-{i}", record(f"a-{i}"), REPORT)
+    store.close()
+
+    stats = store.stats()
+    assert failures and stats["retries"] == 2
+    assert stats["failed"] == 0 and stats["saved"] == 100
+    reopened = SavedAssessmentStore(path)
+    try:
+        assert all(reopened.get(f"a-{i}") is not None for i in range(100))
+    finally:
+        reopened.close()
+
+
+def test_batch_that_keeps_failing_is_recovered_on_next_start(path):
+    store = SavedAssessmentStore(path, retry_delays=(0,))
+
+    def failing_commit(conn, bodies, batch):
+        raise sqlite3.OperationalError("disk I/O error")
+
+    store._commit = failing_commit
+    assert store.save("kept", record("kept"), REPORT)
+    assert store.wait("kept", timeout=5) is False
+    # Still readable from memory, and reported
+    assert store.get("kept") == (record("kept"), REPORT)
+    assert store.stats()["failed"] == 1 and store.stats()["unrecovered"] == 1
+    store.close()
+
+    reopened = SavedAssessmentStore(path)
+    try:
+        assert reopened.stats()["unrecovered"] == 0
+        assert reopened.get("kept") == (record("kept"), REPORT)
+    finally:
+        reopened.close()
+    conn = sqlite3.connect(path)
+    try:
+        assert conn.execute("SELECT COUNT(*) FROM saved_assessments WHERE id = 'kept'").fetchone()[0] == 1
+    finally:
+        conn.close()
+
+
+def test_wait_reports_the_commit(path):
+    store = SavedAssessmentStore(path)
+    store.save("a", record("a"))
+    assert store.wait("a", timeout=5) is True
+    assert store.get("a") == (record("a"), None)
+    store.close()
+    # close() is idempotent and later saves are refused
+    store.close()
+    assert store.save("b", record("b")) is False
+
+
+def test_full_queue_answers_503(client, path, monkeypatch):
+    from app import routes
+
+    store = SavedAssessmentStore(path, max_pending=1)
+    release = threading.Event()
+    commit = store._commit
+
+    def blocked_commit(conn, bodies, batch):
+        release.wait()
+        return commit(conn, bodies, batch)
+
+    store._commit = blocked_commit
+    monkeypatch.setattr(routes, 'saved_assessments', store)
+    session_id = client.post('/api/assessment/start').json["session_id"]
+    try:
+        # One batch held by the writer, then the queue fills up
+        statuses = [client.post('/api/assessment/save', json={"session_id": session_id}).status_code for _ in range(5)]
+        assert statuses[-1] == 503
+        assert statuses.count(200) <= 2
+    finally:
+        release.set()
+        store.close()
+    assert store.stats()["saved"] == statuses.count(200)
+
+
+def test_sync_save_waits_for_the_commit(client):
+    session_id = client.post('/api/assessment/start').json["session_id"]
+    response = client.post('/api/assessment/save?sync=1', json={"session_id": session_id})
+    assert response.status_code == 200 and response.json["committed"] is True
+    assert client.get(f'/api/assessments/{response.json["assessment_id"]}').status_code == 200
+
+    queued = client.post('/api/assessment/save', json={"session_id": session_id})
+    assert queued.json["committed"] is False
+
+
+def test_assessment_actions_answer_get_with_405(client):
+    for action in ('start', 'next', 'back', 'save', 'quick'):
+        assert client.get(f'/api/assessment/{action}').status_code == 405
+    assert client.get('/api/assessments/not-a-uuid').status_code == 404
+    assert client.get('/api/assessments/00000000-0000-0000-0000-000000000000').status_code == 404
@@ -0,0 +1,74 @@
+import json
+import time
+
+
+def batch(client, *cases):
+    body = "\n".join(c if isinstance(c, str) else json.dumps(c) for c in cases)
+    response = client.post('/api/assessment/batch', data=body, content_type='application/x-ndjson')
+    assert response.status_code == 200
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+def test_symptoms_must_be_strings(client):
+    results = batch(
+        client,
+        {"id": "a", "age": 30, "biological_sex": "male", "symptoms": ["cough", 3]},
+        {"id": "b", "age": 30, "biological_sex": "male", "symptoms": [{"name": "cough"}]},
+        {"id": "c", "age": 30, "biological_sex": "male", "symptoms": ["cough", " "]},
+    )
+    assert [r["error"] for r in results[:3]] == ["symptoms must be non-empty strings"] * 3
+    assert results[-1]["summary"]["errors"] == 3
+
+
+def test_invalid_lines_are_reported_in_place(client):
+    results = batch(
+        client,
+        "{not json",
+        "[1, 2]",
+        "",
+        {"id": "no-age", "biological_sex": "male", "symptoms": ["cough"]},
+        {"id": "no-symptoms", "age": 30, "biological_sex": "male"},
+        {"id": "bad-answers", "age": 30, "biological_sex": "male", "symptoms": ["cough"], "answers": ["3 days"]},
+    )
+    assert [r["line"] for r in results[:-1]] == [1, 2, 4, 5, 6]
+    assert results[0]["error"].startswith("Invalid JSON")
+    assert results[1]["error"] == "Each line must be a JSON object"
+    assert [(r["id"], r["error"]) for r in results[2:5]] == [
+        ("no-age", "Missing required parameters"),
+        ("no-symptoms", "Missing or invalid symptoms"),
+        ("bad-answers", "answers must be an object"),
+    ]
+    assert results[-1]["summary"] == {"cases": 5, "unique": 0, "duplicates": 0, "errors": 5}
+
+
+def test_identical_cases_share_one_report(client):
+    case = {"age": 30, "biological_sex": "male", "symptoms": ["cough", "fever"], "answers": {"duration": "3 days"}}
+    results = batch(client, dict(case, id="a"), dict(case, id="b"), dict(case, id="c", name="Ana"))
+    assert [r["status"] for r in results[:3]] == ["ok"] * 3
+    assert results[1]["duplicate_of"] == 1
+    assert results[1]["report"] == results[0]["report"]
+    # A different name is a different report
+    assert "duplicate_of" not in results[2]
+    assert results[-1]["summary"] == {"cases": 3, "unique": 2, "duplicates": 1, "errors": 0}
+
+
+def test_results_keep_input_order_when_later_cases_finish_first():
+    from app.services.batch import BatchAssessor
+
+    calls = []
+
+    def assess(case, limiter):
+        calls.append(case["id"])
+        time.sleep(case["delay"])
+        if case["id"] == "fails":
+            raise RuntimeError("model unavailable")
+        return {"id": case["id"]}
+
+    runner = BatchAssessor(assess, lambda case: case["id"], max_workers=3, rate=0, window=2)
+    cases = [{"id": "slow", "delay": 0.2}, {"id": "fails", "delay": 0}, {"id": "fast", "delay": 0}, {"id": "slow", "delay": 0}]
+    results = list(runner.run(json.dumps(case) for case in cases))
+    assert [r.get("id") for r in results[:-1]] == ["slow", "fails", "fast", "slow"]
+    assert [r["status"] for r in results[:-1]] == ["ok", "error", "ok", "ok"]
+    assert results[1]["error"] == "model unavailable"
+    assert results[3]["duplicate_of"] == 1
+    assert sorted(calls) == ["fails", "fast", "slow"]
@@ -0,0 +1,63 @@
+import os
+import time
+
+from app.services.history import ConversationLog
+from app.services.intake import PROMPTS
+
+
+def fill(log, session_id, history, count):
+    for n in range(count):
+        log.append(session_id, history, "user" if n % 2 == 0 else "assistant", f"message {n}")
+
+
+def test_transcript_keeps_order_across_spills(tmp_path):
+    log = ConversationLog(max_turns=4, spill_dir=str(tmp_path))
+    history = log.new()
+    fill(log, "abc", history, 11)
+    # The buffer stays bounded and the oldest turns are on disk
+    assert len(history["turns"]) <= 4
+    assert history["spilled"] == 11 - len(history["turns"])
+    transcript = log.transcript("abc", history)
+    assert [t["content"] for t in transcript] == [f"message {n}" for n in range(11)]
+    assert [t["role"] for t in transcript[:2]] == ["user", "assistant"]
+
+
+def test_static_prompts_are_stored_by_key():
+    log = ConversationLog(PROMPTS)
+    history = log.new()
+    message = PROMPTS["name"].render()["message"]
+    log.append("abc", history, "assistant", message)
+    assert history["turns"][0][2:] == ["name", None]
+    assert log.transcript("abc", history)[0]["content"] == message
+
+
+def test_turns_that_cannot_be_spilled_are_counted_as_dropped(tmp_path):
+    log = ConversationLog(max_turns=4, spill_dir=str(tmp_path))
+    history = log.new()
+    # Not a safe file name, so nothing is written for it
+    fill(log, "../escape", history, 6)
+    assert history["spilled"] == 0
+    assert history["dropped"] == 6 - len(history["turns"])
+    assert os.listdir(tmp_path) == []
+    assert [t["content"] for t in log.transcript("../escape", history)] == [f"message {n}" for n in range(history["dropped"], 6)]
+
+
+def test_an_older_copy_of_the_session_reads_only_its_own_spills(tmp_path):
+    log = ConversationLog(max_turns=4, spill_dir=str(tmp_path))
+    history = log.new()
+    fill(log, "abc", history, 5)
+    older = {"started": history["started"], "turns": list(history["turns"]), "spilled": history["spilled"]}
+    fill(log, "abc", history, 4)
+    assert len(log.transcript("abc", older)) == 5
+
+
+def test_discard_and_expiry_remove_spill_logs(tmp_path):
+    log = ConversationLog(max_turns=2, spill_dir=str(tmp_path), ttl=60)
+    for session_id in ("old", "new", "gone"):
+        fill(log, session_id, log.new(), 3)
+    log.discard("gone")
+    log.discard("never-spilled")
+    stale = time.time() - 120
+    os.utime(tmp_path / "old.jsonl", (stale, stale))
+    assert log.purge_expired() == 1
+    assert os.listdir(tmp_path) == ["new.jsonl"]
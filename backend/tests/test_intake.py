@@ -0,0 +1,128 @@
+from app.services.intake import IntakeMachine, NO_ADDITIONAL_SYMPTOMS, OTHER_SYMPTOMS
+
+
+def new_machine():
+    machine = IntakeMachine()
+    # Registered by the routes, where it needs the knowledge base
+    machine.prompt_builder("additional_symptoms")(lambda session: {"message": "Any other symptoms?", "progress": 92})
+    return machine
+
+
+def new_session(state, symptoms=("Cough",)):
+    return {
+        "current_state": state,
+        "previous_state": None,
+        "state_history": [],
+        "gathered_info": {},
+        "symptoms": list(symptoms),
+        "symptom_details": {},
+    }
+
+
+def test_going_back_from_other_symptoms_keeps_the_additional_ones():
+    machine = new_machine()
+    # Symptoms gathered before the other-symptoms step
+    session = new_session("other_symptoms", ["Cough", "Fever"])
+    session["state_history"] = ["additional_symptoms"]
+    machine.advance(session, "rash, itching")
+    assert session["symptoms"] == ["Cough", "Fever", "rash", "itching"]
+
+    machine.go_back(session)
+    assert session["current_state"] == "other_symptoms"
+    assert session["symptoms"] == ["Cough", "Fever"]
+    machine.go_back(session)
+    assert session["current_state"] == "additional_symptoms"
+    assert session["symptoms"] == ["Cough"]
+
+
+def walk(machine, session, answers):
+    states = []
+    for answer in answers:
+        machine.advance(session, answer)
+        states.append(session["current_state"])
+    return states
+
+
+def test_transition_table_follows_the_answers():
+    machine = new_machine()
+    session = new_session("introduction")
+    states = walk(machine, session, [
+        "Start", "Ana", "30", "Female", "No", "170cm 60kg", "Yes", ["Other condition"], "Gout",
+        "No", "Yes", "Penicillin", "No", "Never", "Rarely", "Often", "Balanced", "Low", "Good"
+    ])
+    assert states == [
+        "name", "age", "biological_sex", "pregnancy", "height_weight", "medical_history_intro",
+        "medical_history_conditions", "medical_history_other", "medications", "allergies", "allergies_list",
+        "family_history", "lifestyle_smoking", "lifestyle_alcohol", "lifestyle_exercise", "lifestyle_diet",
+        "lifestyle_stress", "lifestyle_sleep", "symptom_entry"
+    ]
+    assert session["gathered_info"]["age"] == 30
+    assert session["gathered_info"]["medications"] == "None"
+    assert session["gathered_info"]["allergies"] == "Penicillin"
+    assert session["gathered_info"]["medical_history"] == {"conditions": ["Other condition"], "other_condition": "Gout"}
+    assert session["state_history"] == ["introduction"] + states[:-1]
+
+
+def test_pregnancy_is_asked_only_for_women_of_childbearing_age():
+    machine = new_machine()
+    for age, sex, expected in [(30, "Female", "pregnancy"), (60, "Female", "height_weight"), (30, "Male", "height_weight")]:
+        session = new_session("biological_sex")
+        session["gathered_info"]["age"] = age
+        machine.advance(session, sex)
+        assert session["current_state"] == expected
+
+
+def test_invalid_age_keeps_the_state_and_history():
+    machine = new_machine()
+    session = new_session("age")
+    response = machine.advance(session, "thirty")
+    assert response["message"] == machine.prompts["age_not_number"].render()["message"]
+    machine.advance(session, "130")
+    assert session["current_state"] == "age"
+    assert session["state_history"] == []
+    assert "age" not in session["gathered_info"]
+
+
+def test_going_back_replays_the_last_answered_state():
+    machine = new_machine()
+    session = new_session("introduction")
+    assert machine.go_back(session) is None
+    walk(machine, session, ["Start", "Ana", "30"])
+    response = machine.go_back(session)
+    assert session["current_state"] == "age"
+    assert session["previous_state"] == "name"
+    assert response["message"] == machine.prompt("age", session)["message"]
+    machine.go_back(session)
+    machine.go_back(session)
+    assert session["current_state"] == "introduction"
+    assert session["previous_state"] is None
+    assert machine.go_back(session) is None
+
+
+def test_going_back_to_additional_symptoms_keeps_only_the_primary_symptom():
+    machine = new_machine()
+    session = new_session("additional_symptoms")
+    machine.advance(session, "Fever, Chills")
+    assert session["current_state"] == "symptom_impact"
+    assert session["symptoms"] == ["Cough", "Fever", "Chills"]
+    machine.go_back(session)
+    assert session["current_state"] == "additional_symptoms"
+    assert session["symptoms"] == ["Cough"]
+
+
+def test_no_additional_symptoms_adds_nothing():
+    machine = new_machine()
+    session = new_session("additional_symptoms")
+    machine.advance(session, NO_ADDITIONAL_SYMPTOMS)
+    assert session["current_state"] == "symptom_impact"
+    machine.go_back(session)
+    machine.advance(session, OTHER_SYMPTOMS)
+    assert session["current_state"] == "other_symptoms"
+    assert session["symptoms"] == ["Cough"]
+
+
+def test_unknown_state_asks_to_start_over():
+    machine = new_machine()
+    session = new_session("nowhere")
+    assert machine.advance(session, "Yes")["options"] == ["Start over"]
+    assert session["state_history"] == []
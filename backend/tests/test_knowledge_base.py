@@ -0,0 +1,111 @@
+import json
+import os
+
+from app.services.knowledge_base import KnowledgeBaseSnapshot, create_knowledge_base_snapshot
+
+
+class Owner:
+    def score(self, value):
+        return (self, value)
+
+
+def write_source(path, data):
+    path.write_text(json.dumps(data))
+    return str(path)
+
+
+def counting_build(owner, data_path):
+    calls = []
+
+    def build():
+        calls.append(1)
+        with open(data_path) as f:
+            return {"catalog": json.load(f), "scorer": owner.score}
+    return build, calls
+
+
+def test_snapshot_is_built_once_then_loaded(tmp_path):
+    source = write_source(tmp_path / "symptoms.json", [{"id": 1}])
+    snapshot_path = str(tmp_path / "kb.snapshot")
+
+    owner = Owner()
+    build, calls = counting_build(owner, source)
+    assert KnowledgeBaseSnapshot(snapshot_path, [source]).load(owner, build)["catalog"] == [{"id": 1}]
+    assert calls == [1]
+
+    # A new process: bound methods rebind to the new owner
+    owner = Owner()
+    build, calls = counting_build(owner, source)
+    snapshot = KnowledgeBaseSnapshot(snapshot_path, [source])
+    state = snapshot.load(owner, build)
+    assert calls == []
+    assert snapshot.loaded == "snapshot"
+    assert state["catalog"] == [{"id": 1}]
+    assert state["scorer"](2) == (owner, 2)
+
+
+def test_edited_source_rebuilds(tmp_path):
+    source = write_source(tmp_path / "symptoms.json", [{"id": 1}])
+    snapshot_path = str(tmp_path / "kb.snapshot")
+    owner = Owner()
+    KnowledgeBaseSnapshot(snapshot_path, [source]).load(owner, counting_build(owner, source)[0])
+
+    write_source(tmp_path / "symptoms.json", [{"id": 2}, {"id": 3}])
+    build, calls = counting_build(owner, source)
+    snapshot = KnowledgeBaseSnapshot(snapshot_path, [source])
+    assert snapshot.load(owner, build)["catalog"] == [{"id": 2}, {"id": 3}]
+    assert calls == [1]
+    assert snapshot.loaded == "built"
+
+    # The rebuilt snapshot is current again
+    build, calls = counting_build(owner, source)
+    KnowledgeBaseSnapshot(snapshot_path, [source]).load(owner, build)
+    assert calls == []
+
+
+def test_touched_source_refreshes_the_header_without_rebuilding(tmp_path):
+    source = write_source(tmp_path / "symptoms.json", [{"id": 1}])
+    snapshot_path = str(tmp_path / "kb.snapshot")
+    owner = Owner()
+    KnowledgeBaseSnapshot(snapshot_path, [source]).load(owner, counting_build(owner, source)[0])
+
+    stat = os.stat(source)
+    os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    build, calls = counting_build(owner, source)
+    snapshot = KnowledgeBaseSnapshot(snapshot_path, [source])
+    snapshot.load(owner, build)
+    assert calls == []
+    assert snapshot.loaded == "snapshot"
+    with open(snapshot_path, 'rb') as f:
+        assert str(stat.st_mtime_ns + 10 ** 9).encode() in f.read()
+
+
+def test_added_source_rebuilds(tmp_path):
+    source = write_source(tmp_path / "symptoms.json", [{"id": 1}])
+    snapshot_path = str(tmp_path / "kb.snapshot")
+    owner = Owner()
+    KnowledgeBaseSnapshot(snapshot_path, [source]).load(owner, counting_build(owner, source)[0])
+
+    extra = write_source(tmp_path / "conditions.json", [])
+    build, calls = counting_build(owner, source)
+    KnowledgeBaseSnapshot(snapshot_path, [source, extra]).load(owner, build)
+    assert calls == [1]
+
+
+def test_unreadable_snapshot_rebuilds(tmp_path):
+    source = write_source(tmp_path / "symptoms.json", [{"id": 1}])
+    snapshot_path = tmp_path / "kb.snapshot"
+    snapshot_path.write_bytes(b"not a snapshot")
+    owner = Owner()
+    build, calls = counting_build(owner, source)
+    snapshot = KnowledgeBaseSnapshot(str(snapshot_path), [source])
+    assert snapshot.load(owner, build)["catalog"] == [{"id": 1}]
+    assert calls == [1]
+    assert snapshot_path.read_bytes().startswith(b"SYMKB")
+
+
+def test_snapshot_can_be_turned_off(monkeypatch, tmp_path):
+    monkeypatch.setenv('KNOWLEDGE_BASE_SNAPSHOT', 'off')
+    assert create_knowledge_base_snapshot([]) is None
+    monkeypatch.setenv('KNOWLEDGE_BASE_SNAPSHOT', str(tmp_path / "kb.snapshot"))
+    assert create_knowledge_base_snapshot([]).path == str(tmp_path / "kb.snapshot")
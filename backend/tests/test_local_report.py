@@ -0,0 +1,33 @@
+import pytest
+
+from app.services.assessment import AssessmentService
+from app.services.local_report import NEXT_STEPS, URGENCY_PHRASES, LocalReportEngine
+
+
+@pytest.fixture(scope='module')
+def engine():
+    return LocalReportEngine(AssessmentService())
+
+
+def test_report_is_deterministic_and_complete(engine):
+    args = ("Ana", 30, "female", ["Chest pain", "Shortness of breath"], {"chest_pain_duration": "2 hours"})
+    report = engine.build(*args)
+    assert report == engine.build(*args)
+    assert report["possible_conditions"][0] == "Acute Myocardial Infarction (Heart Attack)"
+    assert set(report["urgency_levels"].values()) <= set(URGENCY_PHRASES.values())
+    assert set(report["likelihood_percentages"]) == set(report["possible_conditions"])
+
+
+def test_most_urgent_condition_sets_the_next_steps(engine):
+    report = engine.build("Ana", 30, "female", ["Chest pain", "Shortness of breath"])
+    assert report["next_steps"] == NEXT_STEPS["immediate"]
+
+
+def test_answers_fill_the_symptom_analysis(engine):
+    report = engine.build("Ana", 30, "female", ["Chest pain", "Shortness of breath"], {"chest_pain_duration": "2 hours"})
+    assert report["symptom_analysis"][0].startswith("Chest pain: Duration: 2 hours")
+    assert report["symptom_analysis"][1] == "Shortness of breath: Reported as an additional symptom"
+
+
+def test_unknown_symptoms_give_no_report(engine):
+    assert engine.build("Ana", 30, "female", ["zzzz"]) is None
@@ -0,0 +1,86 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+
+from app.services.prefetch import ReportPrefetcher
+
+
+def test_submit_runs_outside_the_lock():
+    prefetcher = ReportPrefetcher()
+
+    def submit():
+        # Would deadlock if start() still held its lock
+        assert prefetcher.start("other", Future)
+        return Future()
+
+    assert prefetcher.start("key", submit)
+    assert prefetcher.stats()["started"] == 2
+
+
+def test_declined_submit_holds_no_job():
+    prefetcher = ReportPrefetcher()
+    assert prefetcher.start("key", lambda: None) is False
+    assert prefetcher.wait("key", timeout=0) is None
+    assert prefetcher.stats()["skipped"] == 1
+
+
+def test_sessions_share_one_job_and_the_last_release_cancels_it():
+    prefetcher = ReportPrefetcher()
+    future = Future()
+    assert prefetcher.start("key", lambda: future)
+    assert prefetcher.start("key", lambda: Future())
+    prefetcher.release("key")
+    assert not future.cancelled()
+    prefetcher.release("key")
+    assert future.cancelled()
+    assert prefetcher.stats()["shared"] == 1
+
+
+def test_no_prefetch_without_the_model(app, monkeypatch):
+    from app import routes
+
+    monkeypatch.setattr(routes.ai_service, 'use_model', lambda: False)
+    monkeypatch.setattr(routes.ai_service, 'prefetch_assessment', lambda *a, **k: 1 / 0)
+    session = {"gathered_info": {"age": 40}, "symptoms": ["cough"], "symptom_details": {}}
+    routes.prefetch_report(session)
+    assert "prefetch_key" not in session
+
+
+def test_background_admission_leaves_half_the_slots():
+    from app.services.resilience import AIMDLimiter, CircuitBreaker, ModelGuard, RetryBudget
+
+    guard = ModelGuard(CircuitBreaker(), RetryBudget(), AIMDLimiter(initial=4))
+    assert guard.admit(background=True)
+    assert guard.admit(background=True)
+    assert not guard.admit(background=True)
+    assert guard.admit() and guard.admit()
+    assert not guard.admit()
+    assert guard.limiter.stats()["rejected"] == 1
+
+
+def test_wait_returns_the_job_result():
+    prefetcher = ReportPrefetcher()
+    future = Future()
+    assert prefetcher.start("key", lambda: future)
+    threading.Timer(0.05, future.set_result, ({"summary": "ready"},)).start()
+    assert prefetcher.wait("key", timeout=5) == {"summary": "ready"}
+    assert asyncio.run(prefetcher.wait_async("key", timeout=5)) == {"summary": "ready"}
+
+
+def test_report_is_served_from_the_prefetch_before_it_reaches_the_cache(app, monkeypatch):
+    from app import routes
+
+    prefetcher = ReportPrefetcher()
+    monkeypatch.setattr(routes, 'prefetcher', prefetcher)
+    monkeypatch.setattr(routes.ai_service, 'generate_assessment', lambda *a, **k: 1 / 0)
+    monkeypatch.setattr(routes.ai_service, 'generate_assessment_async', lambda *a, **k: 1 / 0)
+    args = {"age": 41, "biological_sex": "female", "symptoms": ["prefetched cough"], "answers": {}}
+    future = Future()
+    # The job is done but its cache callback has not run
+    future.set_result({"summary": "Assessment for the patient: a cough", "is_fallback": False})
+    assert prefetcher.start(routes._report_cache_key(**args), lambda: future)
+
+    report = routes.generate_report(name="Ada", **args)
+    assert report["summary"] == "Assessment for Ada: a cough"
+    report = asyncio.run(routes.generate_report_async(name="Bo", **args))
+    assert report["summary"] == "Assessment for Bo: a cough"
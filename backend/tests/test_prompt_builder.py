@@ -0,0 +1,92 @@
+from app.services.prompt_builder import PromptBuilder, estimate_tokens
+
+
+def rendered(name):
+    from app.services.metrics import registry
+
+    for line in registry.render().splitlines():
+        if line.startswith(name + " "):
+            return float(line.split()[1])
+    return 0.0
+
+
+def test_each_prompt_size_is_observed(app):
+    from app.services.ai import AIService
+
+    service = AIService(prompt_builder=PromptBuilder())
+    count, total = rendered("gemini_prompt_tokens_count"), rendered("gemini_prompt_tokens_sum")
+    prompt, _ = service._build_prompt("the patient", 30, "female", ["cough"], {"duration": "3 days"})
+
+    assert rendered("gemini_prompt_tokens_count") == count + 1
+    assert rendered("gemini_prompt_tokens_sum") == total + estimate_tokens(prompt)
+
+
+class RedFlags:
+    def red_flag_findings(self, findings):
+        return [f for f in findings if f.lower() == "chest pain"]
+
+
+ANSWERS = {
+    "name": "Ana",
+    "age": 30,
+    "symptom_details": {"associated": "chest pain", "duration": "more than 3 days, worse every evening after dinner"},
+    "medications": "Ibuprofen 400mg twice a day",
+    "allergies": "None",
+    "lifestyle_factors": {"smoking": "About twenty cigarettes a day for the last fifteen years or so"}
+}
+CANDIDATES = [{"name": "Influenza", "likelihood": 60, "matched_symptoms": ["cough", "fever"]}]
+
+
+def build(token_budget, answers=ANSWERS, candidates=CANDIDATES):
+    builder = PromptBuilder(RedFlags(), token_budget=token_budget)
+    prompt, _ = builder.build("Ana", 30, "female", ["cough", "chest pain"], answers, candidates, "FORMAT", "2024-01-01")
+    return prompt
+
+
+def body_lines(prompt):
+    return [line for line in prompt.splitlines() if line.startswith("- ")]
+
+
+def test_full_budget_keeps_every_informative_answer_in_section_order():
+    prompt = build(10000)
+    assert "RED-FLAG SYMPTOMS (weigh these first): chest pain" in prompt
+    assert body_lines(prompt) == [
+        "- associated: chest pain",
+        "- duration: >3d, worse every evening after dinner",
+        "- medications: Ibuprofen 400mg twice a day",
+        "- smoking: About twenty cigarettes a day for the last fifteen years or so",
+        "- Influenza (60%; cough, fever)"
+    ]
+    # Header fields and empty answers are not repeated
+    assert "- name:" not in prompt and "- allergies:" not in prompt
+
+
+def test_lines_are_dropped_lowest_priority_first():
+    # The red flag comes last in the answers and is still the first line kept
+    answers = dict(ANSWERS, symptom_details={"duration": "more than 3 days, worse every evening after dinner", "associated": "chest pain"})
+    base = len(build(0, answers, None))
+    first_kept = []
+    for budget in range(base // 4, base // 4 + 200):
+        for line in body_lines(build(budget, answers, None)):
+            if line not in first_kept:
+                first_kept.append(line)
+    assert first_kept == [
+        "- associated: chest pain",
+        "- duration: >3d, worse every evening after dinner",
+        "- medications: Ibuprofen 400mg twice a day",
+        "- smoking: About twenty cigarettes a day for the last fifteen years or so"
+    ]
+
+
+def test_differential_is_dropped_before_history():
+    answers = {"medications": "Ibuprofen 400mg twice a day"}
+    with_history = build(10000, answers, None)
+    prompt = build(len(with_history) // 4 + 5, answers)
+    assert body_lines(prompt) == ["- medications: Ibuprofen 400mg twice a day"]
+
+
+def test_header_symptoms_and_format_survive_any_budget():
+    prompt = build(0)
+    assert body_lines(prompt) == []
+    assert "SYMPTOMS: cough, chest pain" in prompt
+    assert "FORMAT" in prompt
@@ -0,0 +1,56 @@
+import fnmatch
+
+from app.services.cache import AssessmentCache, RedisCacheBackend
+from app.services.session_store import RedisSessionStore
+
+
+class FakeRedis:
+    """The GET/SET/EXPIRE/DEL/SCAN subset the backends use; KEYS is refused"""
+
+    def __init__(self):
+        self.data = {}
+        self.deletes = []
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value.encode('utf-8') if isinstance(value, str) else value
+
+    def expire(self, key, seconds):
+        pass
+
+    def delete(self, *keys):
+        self.deletes.append(len(keys))
+        for key in keys:
+            self.data.pop(key, None)
+
+    def scan_iter(self, match=None, count=None):
+        return iter([key for key in list(self.data) if fnmatch.fnmatchcase(key, match)])
+
+    def keys(self, pattern):
+        raise AssertionError("KEYS walks the whole keyspace")
+
+
+def test_cache_clear_scans_its_prefix_in_batches():
+    client = FakeRedis()
+    backend = RedisCacheBackend(client)
+    for i in range(1200):
+        backend.set(f"assessment:{i}", {"i": i})
+    client.set("other:key", "kept")
+
+    backend.clear()
+
+    assert list(client.data) == ["other:key"]
+    assert client.deletes == [500, 500, 200]
+
+
+def test_redis_stores_report_no_size():
+    cache = AssessmentCache(RedisCacheBackend(FakeRedis()))
+    cache.set("a", {"summary": "x"})
+    assert cache.stats()["size"] is None
+
+    sessions = RedisSessionStore(FakeRedis())
+    sessions.save("s1", {"symptoms": []})
+    assert sessions.size() is None
+    assert len(sessions) == 1
@@ -0,0 +1,67 @@
+import time
+
+from app.services.reloader import KnowledgeBaseReloader
+
+
+class Version:
+    def __init__(self, number):
+        self.number = number
+
+
+def counting_factory(fail_on=()):
+    built = []
+
+    def factory():
+        number = len(built) + 1
+        built.append(number)
+        if number in fail_on:
+            raise ValueError("bad data")
+        return Version(number)
+    return factory
+
+
+def test_reload_swaps_the_version_and_runs_callbacks():
+    reloader = KnowledgeBaseReloader(counting_factory(), [], interval=0)
+    seen = []
+    reloader.on_reload(lambda service: seen.append(service.number))
+    assert reloader.number == 1
+    assert reloader.reload()
+    assert reloader.number == 2
+    assert seen == [2]
+    assert reloader.stats()["version"] == 2
+
+
+def test_failed_build_keeps_the_old_version():
+    reloader = KnowledgeBaseReloader(counting_factory(fail_on=(2,)), [], interval=0)
+    assert not reloader.reload()
+    assert reloader.number == 1
+    assert reloader.stats()["failures"] == 1
+    assert reloader.reload()
+    assert reloader.number == 3
+
+
+def test_pinned_request_finishes_on_its_version():
+    reloader = KnowledgeBaseReloader(counting_factory(), [], interval=0)
+    token = reloader.pin()
+    reloader.reload()
+    assert reloader.current().number == 1
+    reloader.unpin(token)
+    assert reloader.current().number == 2
+
+
+def test_watcher_reloads_once_the_files_settle(tmp_path):
+    path = tmp_path / "symptoms.json"
+    path.write_text("[]")
+    reloader = KnowledgeBaseReloader(counting_factory(), [str(path)], interval=0.02)
+    try:
+        path.write_text('[{"id": 1}]')
+        deadline = time.monotonic() + 5
+        while reloader.number == 1 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert reloader.number == 2
+        # Nothing changed since: no further reloads
+        time.sleep(0.1)
+        assert reloader.number == 2
+    finally:
+        reloader.close()
+    assert not reloader.stats()["watching"]
@@ -0,0 +1,61 @@
+import json
+
+from app.services.cache import AssessmentCache, MemoryCacheBackend
+
+
+def test_report_key_follows_the_knowledge_base(app, monkeypatch):
+    from app import routes
+
+    args = (34, "female", ["headache"], {"headache_duration": "days"})
+    key = routes._report_cache_key(*args)
+    assert routes._report_cache_key(*args) == key
+
+    monkeypatch.setattr(routes.assessment_service.current(), 'fingerprint', 'another-version')
+    assert routes._report_cache_key(*args) != key
+
+
+def test_clear_keeps_the_counters():
+    cache = AssessmentCache(MemoryCacheBackend())
+    cache.set("a", {"summary": "x"})
+    cache.get("a")
+    cache.get("b")
+    cache.clear()
+
+    assert cache.get("a") is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["size"]) == (1, 2, 0)
+
+
+def test_report_key_uses_the_exact_age(app):
+    from app import routes
+
+    assert routes._report_cache_key(31, "male", ["cough"], {}) != routes._report_cache_key(39, "male", ["cough"], {})
+    assert routes._report_cache_key("31", "male", ["cough"], {}) == routes._report_cache_key(31, "male", ["cough"], {})
+
+
+def test_shared_reports_never_carry_another_patients_name(app, monkeypatch):
+    from app import routes
+
+    requested = []
+
+    def generate_assessment(name, age, biological_sex, symptoms, answers, timeout=None, candidates=None):
+        requested.append(name)
+        # A name the model was given could turn up in any section
+        return {
+            "summary": f"Assessment for {name}: tension-type headache is likely.",
+            "symptom_analysis": [f"Headache reported by {name}"],
+            "possible_conditions": ["Tension headache"],
+            "next_steps": [f"{name} should rest"],
+            "report_date": "today",
+            "report_id": "HA-1"
+        }
+
+    monkeypatch.setattr(routes.ai_service, 'generate_assessment', generate_assessment)
+    answers = {"headache_trigger": "privacy test"}
+    first = routes.generate_report("Zelda", 34, "female", ["headache"], answers)
+    second = routes.generate_report("Yuri", 34, "female", ["headache"], answers)
+
+    assert requested == [routes.REPORT_SUBJECT]
+    assert first["summary"].startswith("Assessment for Zelda:")
+    assert second["summary"].startswith("Assessment for Yuri:")
+    assert "Zelda" not in json.dumps(second)
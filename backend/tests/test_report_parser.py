@@ -0,0 +1,70 @@
+import json
+import random
+
+import pytest
+
+from app.services.report_parser import IncrementalReportParser
+
+REPORT = {
+    "summary": "Fever and a \"dry\" cough for three days, {not} an [object].",
+    "symptom_analysis": ["Fever: 38.5°C", "Cough, dry\\unproductive"],
+    "possible_conditions": [
+        {
+            "name": "Influenza",
+            "likelihood": 60,
+            "urgency": "soon",
+            "explanation": "Fever with cough: typical of flu.",
+            "supporting_symptoms": ["Fever", "Cough"]
+        }
+    ],
+    "warning_signs": [],
+    "next_steps": "Rest and drink fluids.",
+    "self_care": ["Rest"],
+    "prevention": ["Yearly flu vaccine"]
+}
+
+
+def feed_in_chunks(text, sizes):
+    parser = IncrementalReportParser()
+    completed = []
+    pos = 0
+    for size in sizes:
+        completed.extend(key for key, _ in parser.feed(text[pos:pos + size]))
+        pos += size
+    completed.extend(key for key, _ in parser.feed(text[pos:]))
+    return parser, completed
+
+
+@pytest.mark.parametrize("indent", [None, 2])
+def test_any_chunk_boundary_gives_the_same_members_in_order(indent):
+    text = "```json\n" + json.dumps(REPORT, indent=indent) + "\n```"
+    rng = random.Random(0)
+    splits = [[1] * len(text)] + [[rng.randint(1, 12) for _ in range(len(text))] for _ in range(20)]
+    for sizes in splits:
+        parser, completed = feed_in_chunks(text, sizes)
+        assert parser.close() == REPORT
+        assert completed == list(REPORT)
+
+
+def test_only_the_member_in_progress_is_kept():
+    parser = IncrementalReportParser()
+    parser.feed('{"summary": "' + "x" * 1000 + '", "next_steps": "Rest')
+    assert parser.values["summary"] == "x" * 1000
+    assert len(parser._text) < 20
+    parser.feed('", "self_care": []}')
+    assert parser.close()["next_steps"] == "Rest"
+
+
+def test_error_offset_counts_from_the_start_of_the_stream():
+    parser = IncrementalReportParser()
+    parser.feed('{"summary": "' + "x" * 100 + '", ')
+    with pytest.raises(ValueError, match="at offset 116"):
+        parser.feed('  oops')
+    assert parser.values == {"summary": "x" * 100}
+
+
+def test_unclosed_report_raises_on_close():
+    parser = IncrementalReportParser()
+    parser.feed('{"summary": "Fever"')
+    with pytest.raises(ValueError):
+        parser.close()
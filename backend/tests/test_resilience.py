@@ -0,0 +1,212 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.services.resilience import AIMDLimiter, CircuitBreaker, ModelGuard, RetryBudget
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+def test_breaker_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30, clock=clock)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+    assert breaker.stats()["rejected"] == 1
+
+
+def test_breaker_lets_one_probe_through_after_the_reset_timeout(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30, clock=clock)
+    breaker.record_failure()
+    clock.advance(29.9)
+    assert breaker.state == CircuitBreaker.OPEN
+
+    clock.advance(0.1)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()
+
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.allow()
+
+
+def test_failed_probe_reopens_the_breaker(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30, clock=clock)
+    breaker.record_failure()
+    clock.advance(30)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN and breaker.stats()["opened"] == 2
+
+    clock.advance(29)
+    assert not breaker.allow()
+
+
+def test_retry_budget_caps_retries_to_its_ratio(clock):
+    budget = RetryBudget(ratio=0.25, min_per_second=0.0, max_tokens=2.0, clock=clock)
+    assert budget.withdraw() and budget.withdraw()
+    assert not budget.withdraw()
+
+    # Four requests earn one retry
+    for _ in range(3):
+        budget.deposit()
+    assert not budget.withdraw()
+    budget.deposit()
+    assert budget.withdraw()
+    assert budget.stats()["exhausted"] == 2 and budget.stats()["retries"] == 3
+
+
+def test_retry_budget_refills_over_time_up_to_its_ceiling(clock):
+    budget = RetryBudget(ratio=0.1, min_per_second=1.0, max_tokens=3.0, clock=clock)
+    for _ in range(3):
+        assert budget.withdraw()
+    assert not budget.withdraw()
+
+    clock.advance(1)
+    assert budget.withdraw()
+    clock.advance(60)
+    assert budget.stats()["tokens"] == 3.0
+
+
+def test_aimd_increases_additively_and_halves_on_failure():
+    limiter = AIMDLimiter(initial=4, min_limit=1, max_limit=64, backoff=0.5)
+    for _ in range(4):
+        assert limiter.try_acquire()
+    assert not limiter.try_acquire()
+    assert limiter.stats()["rejected"] == 1
+
+    # Each success adds 1/limit: the fifth success at about 4 lifts it to 5
+    for _ in range(4):
+        limiter.release(True)
+    assert limiter.limit == 4
+    limiter.try_acquire()
+    limiter.release(True)
+    assert limiter.limit == 5
+
+    limiter.try_acquire()
+    limiter.release(False)
+    assert limiter.limit == 2
+    for _ in range(5):
+        limiter.try_acquire()
+        limiter.release(False)
+    assert limiter.limit == 1
+    assert limiter.stats()["in_flight"] == 0
+
+
+def test_slow_success_counts_as_a_failure(clock):
+    breaker = CircuitBreaker(failure_threshold=1, clock=clock)
+    limiter = AIMDLimiter(initial=8, max_limit=8)
+    guard = ModelGuard(breaker, RetryBudget(clock=clock), limiter, latency_target=5, clock=clock)
+
+    def slow_call():
+        clock.advance(6)
+        return "late"
+
+    assert guard.admit()
+    assert guard.call(slow_call) == "late"
+    assert breaker.state == CircuitBreaker.OPEN
+    assert limiter.limit == 4
+
+
+def test_call_retries_within_the_budget(clock, monkeypatch):
+    monkeypatch.setattr('app.services.resilience.backoff_delay', lambda attempt: 0)
+    budget = RetryBudget(ratio=0.1, min_per_second=0.0, max_tokens=1.0, clock=clock)
+    guard = ModelGuard(CircuitBreaker(failure_threshold=10, clock=clock), budget, AIMDLimiter(), max_retries=3, clock=clock)
+    attempts = []
+
+    def failing():
+        attempts.append(1)
+        raise RuntimeError("503")
+
+    assert guard.admit()
+    with pytest.raises(RuntimeError):
+        guard.call(failing)
+    # One retry was left in the budget
+    assert len(attempts) == 2
+    assert guard.limiter.stats()["in_flight"] == 0
+
+
+def test_abandon_returns_the_slot_and_the_probe(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30, clock=clock)
+    guard = ModelGuard(breaker, RetryBudget(clock=clock), AIMDLimiter(initial=2, max_limit=2), clock=clock)
+    breaker.record_failure()
+    clock.advance(30)
+
+    assert guard.admit()
+    assert not guard.admit()
+    guard.abandon()
+    assert guard.limiter.stats()["in_flight"] == 0
+    # The probe that never ran can be taken again
+    assert guard.admit()
+
+
+def test_cancelled_job_abandons_its_slot(app):
+    from app.services.ai import AIService
+
+    service = AIService()
+    release = threading.Event()
+
+    class Model:
+        def generate_content(self, prompt, generation_config=None):
+            release.wait(5)
+            raise RuntimeError("stub")
+
+    service.model = Model()
+    service.mode = 'llm'
+    service._executor = ThreadPoolExecutor(max_workers=1)
+    running = service.submit_assessment("the patient", 30, "female", ["cough"], {})
+    queued = service.submit_assessment("the patient", 30, "female", ["cough"], {})
+    assert service.guard.limiter.stats()["in_flight"] == 2
+
+    assert queued.cancel()
+    assert service.guard.limiter.stats()["in_flight"] == 1
+    release.set()
+    running.result(timeout=5)
+    assert service.guard.limiter.stats()["in_flight"] == 0
+
+
+def test_timed_out_async_call_keeps_its_slot_until_the_thread_returns(clock):
+    guard = ModelGuard(CircuitBreaker(clock=clock), RetryBudget(clock=clock), AIMDLimiter(), clock=clock)
+    release = threading.Event()
+    finished = threading.Event()
+
+    def slow_call():
+        release.wait(5)
+        finished.set()
+        return "late"
+
+    async def call_with_deadline():
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(guard.call_async(slow_call, executor), 0.05)
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        assert guard.admit()
+        asyncio.run(call_with_deadline())
+        # The deadline passed but the model thread is still busy
+        assert guard.limiter.stats()["in_flight"] == 1
+        release.set()
+        assert finished.wait(5)
+    assert guard.limiter.stats()["in_flight"] == 0
@@ -0,0 +1,114 @@
+import json
+import os
+import re
+
+import pytest
+
+from app.services.canonical import similarity_score
+from app.services.search_index import SymptomSearchIndex
+
+SYMPTOMS_PATH = os.path.join(os.path.dirname(__file__), '..', 'app', 'data', 'symptoms.json')
+
+
+def naive_search(symptoms, query):
+    """The linear scan search_symptoms did before the index, as the reference for its ranking"""
+    def normalize(text):
+        return re.sub(r'[^\w\s]', '', text.lower()).strip()
+
+    normalized_query = normalize(query)
+    query_words = set(normalized_query.split())
+    exact, contains, synonyms, similar = [], [], [], []
+    overlaps, similarities = {}, {}
+    for symptom in symptoms:
+        name = normalize(symptom['name'])
+        if normalized_query == name:
+            exact.append(symptom)
+        elif normalized_query in name:
+            contains.append(symptom)
+        elif any(normalized_query in normalize(s) or normalize(s) in normalized_query for s in symptom.get('synonyms', [])):
+            synonyms.append(symptom)
+        elif query_words & set(name.split()):
+            words = set(name.split())
+            overlaps[symptom['id']] = len(query_words & words) / max(len(query_words), len(words))
+            contains.append(symptom)
+        else:
+            similarity = similarity_score(normalized_query, name)
+            if similarity > 0.7:
+                similarities[symptom['id']] = similarity
+                similar.append(symptom)
+    contains.sort(key=lambda s: overlaps.get(s['id'], 0), reverse=True)
+    similar.sort(key=lambda s: similarities.get(s['id'], 0), reverse=True)
+
+    results, seen = [], set()
+    for symptom in exact + contains + synonyms + similar:
+        if symptom['id'] not in seen:
+            seen.add(symptom['id'])
+            results.append(symptom)
+    return results[:15]
+
+
+@pytest.fixture(scope='module')
+def symptoms():
+    with open(SYMPTOMS_PATH) as f:
+        return json.load(f)
+
+
+@pytest.fixture(scope='module')
+def index(symptoms):
+    return SymptomSearchIndex(symptoms)
+
+
+def replay_queries(symptoms):
+    """Names, synonyms, their words and prefixes, typos and sentences around synonyms"""
+    queries = {'', 'a', 'pa', 'xyz', 'tummy ache', 'head ache', 'coughing blood'}
+    for symptom in symptoms:
+        name = symptom['name']
+        queries.update([name, name[:3], name[:5], name[:-1], name[1:], name.upper() + '!'])
+        queries.update(name.split())
+        if len(name) > 5:
+            queries.update([name[:2] + name[3:], name[:3] + name[4] + name[3] + name[5:]])
+        for synonym in symptom.get('synonyms', []):
+            queries.update([synonym, synonym[:4], synonym[:-2], f"my {synonym} is bad"])
+    return sorted(queries)
+
+
+def ids(results):
+    return [s['id'] for s in results]
+
+
+def test_index_keeps_the_naive_ranking_and_only_appends(symptoms, index):
+    # The prefix and trigram tiers may add results after the naive ones, never reorder them
+    for query in replay_queries(symptoms):
+        expected = ids(naive_search(symptoms, query))
+        actual = ids(index.search(query))
+        assert actual[:len(expected)] == expected, query
+
+
+def test_exact_name_ranks_first(index):
+    assert index.search('headache')[0]['name'] == 'Headache'
+    assert index.search('  Headache!  ')[0]['name'] == 'Headache'
+
+
+def test_synonym_match_ranks_after_name_matches(index):
+    results = index.search('pain')
+    tiers = ['pain' in s['name'].lower() for s in results]
+    # Every name containing the query comes before the synonym-only matches
+    assert tiers == sorted(tiers, reverse=True)
+    assert not all(tiers)
+
+
+def test_partially_typed_words_match_by_prefix(index):
+    assert [s['name'] for s in index.search('short brea')] == ['Shortness of breath']
+
+
+def test_misspelling_matches_by_trigrams(index):
+    assert [s['name'] for s in index.search('nausia')] == ['Nausea']
+
+
+def test_trigram_score_is_per_name_or_synonym(index):
+    # Grams shared with several synonyms of one symptom do not add up
+    assert [s['name'] for s in index.search('Constipation')] == ['Constipation']
+
+
+def test_empty_query_returns_the_catalog_head(symptoms, index):
+    assert ids(index.search('')) == ids(symptoms[:15])
@@ -0,0 +1,49 @@
+import pytest
+
+from app.services.session_store import MemorySessionStore, SQLiteSessionStore, SessionStore
+
+
+def test_a_store_must_implement_the_whole_interface():
+    class Partial(SessionStore):
+        def get(self, session_id):
+            return None
+
+    with pytest.raises(TypeError):
+        SessionStore()
+    with pytest.raises(TypeError):
+        Partial()
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return MemorySessionStore(max_sessions=2)
+    return SQLiteSessionStore(str(tmp_path / "sessions.db"))
+
+
+def test_sessions_round_trip(store):
+    session = {"current_state": "age", "symptoms": ["Cough"], "gathered_info": {"name": "Ada" * 400}}
+    store.save("a", session)
+    assert store.get("a") == session
+    assert "a" in store and "b" not in store
+    assert len(store) == store.size() == 1
+
+    store.delete("a")
+    store.delete("unknown")
+    assert store.get("a") is None and len(store) == 0
+
+
+def test_memory_store_evicts_the_least_recently_used():
+    store = MemorySessionStore(max_sessions=2)
+    store.save("a", {})
+    store.save("b", {})
+    store.get("a")
+    store.save("c", {})
+    assert "a" in store and "c" in store and "b" not in store
+
+
+def test_expired_sessions_are_gone(tmp_path):
+    for store in (MemorySessionStore(ttl=-1), SQLiteSessionStore(str(tmp_path / "sessions.db"), ttl=-1)):
+        store.save("a", {})
+        assert store.get("a") is None
+        assert len(store) == 0
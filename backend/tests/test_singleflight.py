@@ -0,0 +1,183 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.services.singleflight import SingleFlight
+
+
+def wait_until(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out waiting"
+        time.sleep(0.001)
+
+
+def fallback(reason):
+    return ("fallback", reason)
+
+
+class Flight:
+    """A leader held in flight until release(), with waiters started on threads"""
+
+    def __init__(self, flight, key="key", fn=None):
+        self.flight = flight
+        self.key = key
+        self.release = threading.Event()
+        self.calls = 0
+        self.results = {}
+        self._threads = []
+
+        def work():
+            self.calls += 1
+            self.release.wait(5)
+            return fn() if fn is not None else {"report": "shared"}
+
+        self._work = work
+        self._start("leader")
+        wait_until(lambda: flight.stats()["in_flight"] == 1)
+
+    def _start(self, name, timeout=5):
+        def run():
+            try:
+                self.results[name] = self.flight.do(self.key, self._work, fallback, timeout=timeout)
+            except Exception as e:
+                self.results[name] = e
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        self._threads.append(thread)
+
+    def join_waiters(self, count, timeout=5):
+        shared = self.flight.stats()["shared"]
+        for i in range(count):
+            self._start(f"waiter-{i}", timeout)
+        wait_until(lambda: self.flight.stats()["shared"] + self.flight.stats()["shed"] >= shared + count)
+
+    def finish(self):
+        self.release.set()
+        for thread in self._threads:
+            thread.join(5)
+        return self.results
+
+
+def test_concurrent_identical_calls_run_once():
+    flight = SingleFlight()
+    held = Flight(flight)
+    held.join_waiters(5)
+    results = held.finish()
+
+    assert held.calls == 1
+    assert len(results) == 6
+    assert all(result is results["leader"] for result in results.values())
+    assert flight.stats() == {"in_flight": 0, "leaders": 1, "shared": 5, "shed": 0, "timed_out": 0}
+
+
+def test_different_keys_do_not_coalesce():
+    flight = SingleFlight()
+    assert flight.do("a", lambda: 1, fallback) == 1
+    assert flight.do("b", lambda: 2, fallback) == 2
+    assert flight.do("a", lambda: 3, fallback) == 3
+    assert flight.stats()["leaders"] == 3
+
+
+def test_waiters_beyond_max_waiters_get_the_fallback():
+    flight = SingleFlight(max_waiters=2)
+    held = Flight(flight)
+    held.join_waiters(3)
+    results = held.finish()
+
+    assert sorted(str(r) for r in results.values()).count(str(("fallback", "shed"))) == 1
+    assert flight.stats()["shared"] == 2 and flight.stats()["shed"] == 1
+
+
+def test_leader_error_reaches_every_waiter():
+    def fail():
+        raise RuntimeError("model unavailable")
+
+    flight = SingleFlight()
+    held = Flight(flight, fn=fail)
+    held.join_waiters(3)
+    results = held.finish()
+
+    assert isinstance(results.pop("leader"), RuntimeError)
+    assert list(results.values()) == [("fallback", "error")] * 3
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_waiter_times_out_while_the_leader_finishes():
+    flight = SingleFlight()
+    held = Flight(flight)
+    held.join_waiters(1, timeout=0.01)
+    wait_until(lambda: flight.stats()["timed_out"] == 1)
+    results = held.finish()
+
+    assert results["waiter-0"] == ("fallback", "timeout")
+    assert results["leader"] == {"report": "shared"}
+
+
+def test_do_async_shares_one_call_between_coroutines():
+    flight = SingleFlight()
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"report": "shared"}
+
+    async def main():
+        return await asyncio.gather(*[flight.do_async("key", work, fallback, timeout=5) for _ in range(5)])
+
+    results = asyncio.run(main())
+    assert len(calls) == 1
+    assert all(result is results[0] for result in results)
+    assert flight.stats()["shared"] == 4
+
+
+def test_do_async_error_and_cancelled_leader_fall_back_for_waiters():
+    flight = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.05)
+        raise RuntimeError("model unavailable")
+
+    async def hang():
+        await asyncio.sleep(10)
+
+    async def main():
+        failed = await asyncio.gather(
+            flight.do_async("a", fail, fallback), flight.do_async("a", fail, fallback), return_exceptions=True
+        )
+        leader = asyncio.ensure_future(flight.do_async("b", hang, fallback))
+        await asyncio.sleep(0.01)
+        waiter = asyncio.ensure_future(flight.do_async("b", hang, fallback, timeout=5))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        return failed, await waiter
+
+    failed, after_cancel = asyncio.run(main())
+    assert isinstance(failed[0], RuntimeError) and failed[1] == ("fallback", "error")
+    assert after_cancel == ("fallback", "error")
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_sync_caller_can_wait_on_an_async_leader():
+    flight = SingleFlight()
+    started = threading.Event()
+    result = {}
+
+    async def work():
+        started.set()
+        await asyncio.sleep(0.1)
+        return "shared"
+
+    def sync_waiter():
+        started.wait(5)
+        result["sync"] = flight.do("key", lambda: pytest.fail("ran twice"), fallback, timeout=5)
+
+    thread = threading.Thread(target=sync_waiter)
+    thread.start()
+    result["async"] = asyncio.run(flight.do_async("key", work, fallback))
+    thread.join(5)
+    assert result == {"async": "shared", "sync": "shared"}
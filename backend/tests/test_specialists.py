@@ -0,0 +1,74 @@
+import json
+import random
+
+import pytest
+
+from app.services.specialists import DEFAULT_PATH, SpecialistMatcher
+
+
+def naive_recommend(rules, descriptions, symptoms, limit=3):
+    """Every symptom against every key in both directions, as before the matcher was compiled"""
+    scores = {}
+    for symptom in symptoms:
+        symptom_lower = symptom.lower()
+        for key, specialists in rules.items():
+            if key in symptom_lower or symptom_lower in key:
+                for specialist in specialists:
+                    scores[specialist] = scores.get(specialist, 0) + 1
+    ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+    return [
+        {"name": name, "description": descriptions.get(name, "Medical specialist"), "relevance_score": score}
+        for name, score in ranked
+    ]
+
+
+@pytest.fixture(scope='module')
+def data():
+    with open(DEFAULT_PATH) as f:
+        return json.load(f)
+
+
+def symptom_lists(keys, count, seed=7):
+    rng = random.Random(seed)
+    words = ["severe", "mild", "left", "chronic", "sudden", "xyz", "pain", "and", " "]
+
+    def symptom():
+        key = rng.choice(keys)
+        kind = rng.randrange(6)
+        if kind == 0:
+            return key
+        if kind == 1:
+            # A fragment, which matches every key containing it
+            start = rng.randrange(len(key))
+            return key[start:rng.randrange(start + 1, len(key) + 1)]
+        if kind == 2:
+            return f"{rng.choice(words)} {key} {rng.choice(words)}".upper()
+        if kind == 3:
+            return f"{key} with {rng.choice(keys)}"
+        if kind == 4:
+            return rng.choice(words)
+        return ""
+
+    for _ in range(count):
+        yield [symptom() for _ in range(rng.randrange(0, 5))]
+
+
+def test_recommend_matches_the_naive_scan(data):
+    rules, descriptions = data["rules"], data["descriptions"]
+    matcher = SpecialistMatcher(rules, descriptions)
+    for symptoms in symptom_lists(list(rules), 3000):
+        for limit in (3, 10):
+            assert matcher.recommend(symptoms, limit) == naive_recommend(rules, descriptions, symptoms, limit), symptoms
+
+
+def test_overlapping_keys_match_like_the_naive_scan():
+    rules = {
+        "pain": ["Primary Care Physician"],
+        "back pain": ["Orthopedic Surgeon", "Primary Care Physician"],
+        "lower back pain": ["Physical Therapist"],
+        "a": ["Generalist"],
+        "ain": ["Neurologist"]
+    }
+    matcher = SpecialistMatcher(rules)
+    for symptoms in (["lower back pain"], ["pain"], ["in"], ["Back Pain", "rain"], ["b"], [""], []):
+        assert matcher.recommend(symptoms, 10) == naive_recommend(rules, {}, symptoms, 10), symptoms
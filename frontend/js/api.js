@@ -69,4 +69,29 @@ class ApiService {
             throw error;
         }
     }
+
+    streamAssessment(onSection, onReport) {
+        if (!this.sessionId) {
+            throw new Error('No active session. Please start an assessment first.');
+        }
+
+        const source = new EventSource(`${this.baseUrl}/api/assessment/stream?session_id=${encodeURIComponent(this.sessionId)}`);
+
+        source.addEventListener('section', (event) => {
+            const payload = JSON.parse(event.data);
+            onSection(payload.section, payload.data);
+        });
+
+        source.addEventListener('report', (event) => {
+            source.close();
+            onReport(JSON.parse(event.data).data);
+        });
+
+        source.onerror = (error) => {
+            console.error('Error streaming assessment:', error);
+            source.close();
+        };
+
+        return source;
+    }
 }
@@ -41,11 +41,15 @@ def api_info():
         "version": "1.0.0",
         "endpoints": {
             "health_check": "/api/health",
+            "metrics": "/metrics",
             "process_input": "/api/assessment/next",
             "quick_assessment": "/api/assessment/quick",
+            "stream_assessment": "/api/assessment/stream",
+            "batch_assessment": "/api/assessment/batch",
             "search_symptoms": "/api/symptoms/search",
             "start_assessment": "/api/assessment/start",
-            "start_new": "/api/assessment/start_new"
+            "start_new": "/api/assessment/start_new",
+            "saved_assessment": "/api/assessments/<assessment_id>"
         }
     })
 